@@ -6,6 +6,7 @@ from datetime import datetime
 from enum import Enum
 from typing import List, Optional
 
+from hopeit.aws.s3 import PresignedRequest, UploadPart, UploadSession
 from hopeit.dataobjects import dataclass, dataobject, field
 
 
@@ -61,3 +62,41 @@ class SomethingNotFound:
 
     path: str
     id: str
+
+
+@dataobject
+@dataclass
+class UploadRequest:
+    """Request to upload a large file in parts"""
+
+    file_name: str
+    size: int
+    content_type: Optional[str] = None
+
+
+@dataobject
+@dataclass
+class UploadResume:
+    """Request to resume an interrupted upload"""
+
+    session: UploadSession
+    size: int
+
+
+@dataobject
+@dataclass
+class UploadPlan:
+    """Upload session and presigned requests to upload missing parts"""
+
+    session: UploadSession
+    part_size: int
+    requests: List[PresignedRequest] = field(default_factory=list)
+
+
+@dataobject
+@dataclass
+class UploadCompletion:
+    """Upload session to complete, with parts recorded by the client"""
+
+    session: UploadSession
+    parts: Optional[List[UploadPart]] = None
@@ -0,0 +1,44 @@
+"""
+AWS Example: Abort Upload Session
+--------------------------------------------------------------------
+Aborts a multipart upload session, removing parts already uploaded.
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings, UploadSession
+
+object_storage: Optional[ObjectStorage] = None
+logger, extra = app_extra_logger()
+
+__steps__ = ["abort_session"]
+
+__api__ = event_api(
+    summary="AWS Example: Abort Upload Session",
+    payload=(UploadSession, "upload session to abort"),
+    responses={
+        200: (str, "location of the aborted upload"),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def abort_session(payload: UploadSession, context: EventContext) -> str:
+    """
+    Aborts the upload session
+    """
+    assert object_storage
+    logger.info(context, "abort_session", extra=extra(location=payload.location))
+    await object_storage.abort_upload(payload)
+    return payload.location
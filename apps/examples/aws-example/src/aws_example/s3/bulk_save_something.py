@@ -0,0 +1,100 @@
+"""
+AWS Example: Bulk Save Something
+--------------------------------------------------------------------
+Creates and saves Something objects from an uploaded NDJSON file with one
+SomethingParams object per line. The file is parsed while it is received and
+objects are saved concurrently, so memory usage doesn't depend on file size.
+Results are summarized as counts, reporting up to MAX_ERRORS lines that failed.
+"""
+
+from typing import List, Optional, Union
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext, PreprocessHook
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3.streaming import IngestResult, store_ndjson
+from hopeit.dataobjects import BinaryAttachment, dataclass, dataobject, field
+
+from ..model import Something, SomethingParams, User
+
+object_storage: Optional[ObjectStorage] = None
+CHUNK_SIZE = 64 * 1024
+CONCURRENCY = 16
+MAX_ERRORS = 100
+logger, extra = app_extra_logger()
+
+
+@dataobject
+@dataclass
+class BulkSaveSummary:
+    """Number of saved objects and first MAX_ERRORS lines that failed"""
+
+    saved: int = 0
+    failed: int = 0
+    errors: List[IngestResult] = field(default_factory=list)
+
+
+__steps__ = ["summarize"]
+
+__api__ = event_api(
+    summary="AWS Example: Bulk Save Something",
+    description="Upload NDJSON file with one `SomethingParams` per line using Multipart form",
+    fields=[("items", BinaryAttachment)],
+    responses={
+        200: (BulkSaveSummary, "number of saved objects and lines that failed"),
+        400: (str, "Missing or invalid fields"),
+    },
+)
+
+
+async def __init_event__(context: EventContext) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+def create_something(payload: SomethingParams) -> Something:
+    return Something(id=payload.id, user=User(id=payload.user, name=payload.user))
+
+
+# pylint: disable=invalid-name
+async def __preprocess__(
+    payload: None, context: EventContext, request: PreprocessHook
+) -> Union[BulkSaveSummary, str]:
+    assert object_storage
+    summary = BulkSaveSummary()
+    async for file_hook in request.files():
+        if file_hook.name != "items":
+            continue
+        logger.info(context, "Saving items...", extra=extra(file_name=file_hook.file_name))
+        async for result in store_ndjson(
+            object_storage,
+            file_hook.read_chunks(chunk_size=CHUNK_SIZE),
+            SomethingParams,
+            key=lambda something: something.id,
+            transform=create_something,
+            concurrency=CONCURRENCY,
+        ):
+            if result.error is None:
+                summary.saved += 1
+                continue
+            summary.failed += 1
+            if len(summary.errors) < MAX_ERRORS:
+                summary.errors.append(result)
+    args = await request.parsed_args()
+    if "items" not in args:
+        request.status = 400
+        return "Missing required fields"
+    return summary
+
+
+async def summarize(payload: BulkSaveSummary, context: EventContext) -> BulkSaveSummary:
+    """
+    Returns number of saved objects and lines that failed
+    """
+    logger.info(context, "Saved items", extra=extra(count=payload.saved, errors=payload.failed))
+    return payload
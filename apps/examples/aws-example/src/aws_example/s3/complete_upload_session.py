@@ -0,0 +1,49 @@
+"""
+AWS Example: Complete Upload Session
+--------------------------------------------------------------------
+Completes a multipart upload session once every part was uploaded, storing the file.
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+
+from ..model import UploadCompletion
+
+object_storage: Optional[ObjectStorage] = None
+logger, extra = app_extra_logger()
+
+__steps__ = ["complete_session"]
+
+__api__ = event_api(
+    summary="AWS Example: Complete Upload Session",
+    payload=(
+        UploadCompletion,
+        "upload session and optionally uploaded parts recorded by the client, "
+        "by default every uploaded part is joined",
+    ),
+    responses={
+        200: (str, "path where file is saved"),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def complete_session(payload: UploadCompletion, context: EventContext) -> str:
+    """
+    Joins uploaded parts into the stored file
+    """
+    assert object_storage
+    logger.info(context, "complete_session", extra=extra(location=payload.session.location))
+    return await object_storage.complete_upload(payload.session, payload.parts)
@@ -0,0 +1,72 @@
+"""
+AWS Example: Create Upload Session
+--------------------------------------------------------------------
+Creates a multipart upload session for a large file, returning a presigned request for
+each part, so the client uploads parts in parallel directly to S3.
+"""
+
+from typing import List, Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings, UploadPart, UploadSession
+
+from ..model import UploadPlan, UploadRequest
+
+object_storage: Optional[ObjectStorage] = None
+PART_SIZE = 16 * 1024 * 1024
+EXPIRES_IN = 3600
+logger, extra = app_extra_logger()
+
+__steps__ = ["create_session"]
+
+__api__ = event_api(
+    summary="AWS Example: Create Upload Session",
+    payload=(UploadRequest, "file name, size and content type of the file to upload"),
+    responses={
+        200: (
+            UploadPlan,
+            "Upload session and a presigned `PUT` request for each part of `part_size` bytes",
+        ),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def create_session(payload: UploadRequest, context: EventContext) -> UploadPlan:
+    """
+    Creates the upload session and presigns requests to upload every part
+    """
+    assert object_storage
+    session = await object_storage.create_upload(
+        payload.file_name, content_type=payload.content_type
+    )
+    logger.info(context, "create_session", extra=extra(location=session.location))
+    return presign_parts(object_storage, session, payload.size, [])
+
+
+def presign_parts(
+    object_storage: ObjectStorage, session: UploadSession, size: int, uploaded: List[UploadPart]
+) -> UploadPlan:
+    """
+    Presigns requests to upload parts of a file of `size` bytes not in `uploaded`
+    """
+    done = {part.part_number for part in uploaded}
+    return UploadPlan(
+        session=session,
+        part_size=PART_SIZE,
+        requests=[
+            object_storage.presign_upload_part(session, part_number, expires_in=EXPIRES_IN)
+            for part_number in range(1, max(1, -(-size // PART_SIZE)) + 1)
+            if part_number not in done
+        ],
+    )
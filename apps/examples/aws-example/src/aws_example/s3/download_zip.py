@@ -0,0 +1,94 @@
+"""
+AWS Example: Download Zip
+-------------------------------------------
+Download many S3 files as a zip archive.
+The PostprocessHook streams the archive while it is created using `stream_zip`,
+prefetching files concurrently, so archives are never buffered in memory.
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext, PostprocessHook
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3.archive import ZIP_CONTENT_TYPE, stream_zip
+from hopeit.dataobjects import BinaryDownload, dataclass
+
+object_storage: Optional[ObjectStorage] = None
+logger, extra = app_extra_logger()
+
+__steps__ = ["prepare_archive"]
+
+
+@dataclass
+class ZipArchive(BinaryDownload):
+    file_name: str
+    wildcard: str
+    recursive: bool = False
+    content_type: str = ZIP_CONTENT_TYPE
+
+
+__api__ = event_api(
+    query_args=[
+        (
+            "wildcard",
+            str,
+            "Wildcard to select files to archive prefixed by partition folder "
+            "in format YYYY/MM/DD/HH/*",
+        ),
+        ("recursive", Optional[bool], "Include files in nested partition folders"),
+        ("file_name", Optional[str], "expected return file name, default `files.zip`"),
+    ],
+    responses={
+        200: (ZipArchive, "Return a zip archive"),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def prepare_archive(
+    payload: None,
+    context: EventContext,
+    *,
+    wildcard: str,
+    recursive: Optional[str] = None,
+    file_name: Optional[str] = None,
+) -> ZipArchive:
+    """
+    Prepare archive to be streamed, query args are received as strings
+    """
+    return ZipArchive(
+        file_name=file_name or "files.zip",
+        wildcard=wildcard,
+        recursive=(recursive or "").lower() == "true",
+    )
+
+
+async def __postprocess__(
+    archive: ZipArchive, context: EventContext, response: PostprocessHook
+) -> ZipArchive:
+    """
+    Stream zip archive of files matching wildcard
+    """
+    assert object_storage
+    count = await stream_zip(
+        object_storage,
+        archive.wildcard,
+        context,
+        response,
+        file_name=archive.file_name,
+        recursive=archive.recursive,
+    )
+    logger.info(
+        context, "Zip archive streamed", extra=extra(wildcard=archive.wildcard, files=count)
+    )
+    return archive
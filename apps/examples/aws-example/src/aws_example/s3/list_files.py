@@ -4,17 +4,18 @@ AWS Example: List Files
 Lists all available Something objects
 """
 
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from hopeit.app.api import event_api
-from hopeit.app.context import EventContext
+from hopeit.app.context import EventContext, PostprocessHook
 from hopeit.app.logger import app_extra_logger
-from hopeit.aws.s3 import ItemLocator, ObjectStorage
+from hopeit.aws.s3 import ItemLocator, ListPage, ObjectStorage
 
 object_storage: Optional[ObjectStorage] = None
+PAGE_SIZE = 1000
 logger, extra = app_extra_logger()
 
-__steps__ = ["load_all"]
+__steps__ = ["load_page"]
 
 __api__ = event_api(
     summary="AWS Example: List Files",
@@ -24,10 +25,17 @@ __api__ = event_api(
             Optional[str],
             "Wildcard to filter objects by name prefixed "
             "by partition folder in format YYYY/MM/DD/HH/*",
-        )
+        ),
+        ("page_size", Optional[int], "Max number of items to return, default 1000"),
+        ("page_token", Optional[str], "`X-Next-Page-Token` header returned with previous page"),
     ],
     responses={
-        200: (List[ItemLocator], "list of ItemLocators"),
+        200: (
+            List[ItemLocator],
+            "list of ItemLocators, `X-Next-Page-Token` header is returned "
+            "when more items are available",
+        ),
+        400: (str, "Invalid page_size or page_token"),
     },
 )
 
@@ -40,12 +48,37 @@ async def __init_event__(context) -> None:
         ).connect()
 
 
-async def load_all(payload: None, context: EventContext, wildcard: str = "*") -> List[ItemLocator]:
+async def load_page(
+    payload: None,
+    context: EventContext,
+    wildcard: str = "*",
+    page_size: Optional[str] = None,
+    page_token: Optional[str] = None,
+) -> Union[ListPage, str]:
     """
-    Load objects that match the given wildcard
+    Load a page of files that match the given wildcard
     """
     assert object_storage
-    logger.info(context, "load_all", extra=extra(path=object_storage.bucket))
-    items: List[ItemLocator] = await object_storage.list_files(wildcard)
+    logger.info(context, "load_page", extra=extra(path=object_storage.bucket))
+    try:
+        if page_size is not None and not page_size.isdigit():
+            raise ValueError(f"Invalid page_size: {page_size}. Expected a positive number.")
+        return await object_storage.list_files_page(
+            wildcard,
+            page_size=int(page_size or PAGE_SIZE),
+            continuation_token=page_token,
+        )
+    except ValueError as e:
+        logger.warning(context, "invalid page request", extra=extra(error=str(e)))
+        return str(e)
+
 
-    return items
+async def __postprocess__(
+    payload: Union[ListPage, str], context: EventContext, response: PostprocessHook
+) -> Union[List[ItemLocator], str]:
+    if isinstance(payload, str):
+        response.status = 400
+        return payload
+    if payload.next_token:
+        response.set_header("X-Next-Page-Token", payload.next_token)
+    return payload.items
@@ -1,21 +1,26 @@
 """
 AWS Example: List Objects
 --------------------------------------------------------------------
-Lists all available Something objects
+Lists all available Something objects.
+Objects are retrieved concurrently and streamed as NDJSON, one object per line,
+as soon as they are available using `PostprocessHook.prepare_stream_response`.
 """
 
-from typing import List, Optional
+from typing import List, Optional, Union
 
 from aws_example.model import Something
 from hopeit.app.api import event_api
-from hopeit.app.context import EventContext
+from hopeit.app.context import EventContext, PostprocessHook
 from hopeit.app.logger import app_extra_logger
-from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3 import ListPage, ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3.streaming import stream_ndjson
 
 object_storage: Optional[ObjectStorage] = None
+PAGE_SIZE = 1000
+CONCURRENCY = 16
 logger, extra = app_extra_logger()
 
-__steps__ = ["load_all"]
+__steps__ = ["load_page"]
 
 __api__ = event_api(
     summary="AWS Example: List Objects",
@@ -25,10 +30,17 @@ __api__ = event_api(
             Optional[str],
             "Wildcard to filter objects by name prefixed "
             "by partition folder in format YYYY/MM/DD/HH/*",
-        )
+        ),
+        ("page_size", Optional[int], "Max number of objects to return, default 1000"),
+        ("page_token", Optional[str], "`X-Next-Page-Token` header returned with previous page"),
     ],
     responses={
-        200: (List[Something], "list of Something objects"),
+        200: (
+            List[Something],
+            "Something objects streamed as NDJSON (`application/x-ndjson`), one per line, "
+            "`X-Next-Page-Token` header is returned when more objects are available",
+        ),
+        400: (str, "Invalid page_size or page_token"),
     },
 )
 
@@ -42,20 +54,53 @@ async def __init_event__(context) -> None:
         object_storage = await ObjectStorage.with_settings(settings).connect()
 
 
-async def load_all(payload: None, context: EventContext, wildcard: str = "*") -> List[Something]:
+async def load_page(
+    payload: None,
+    context: EventContext,
+    wildcard: str = "*",
+    page_size: Optional[str] = None,
+    page_token: Optional[str] = None,
+) -> Union[ListPage, str]:
     """
-    Load objects that match the given wildcard
+    Lists a page of objects that match the given wildcard
     """
     assert object_storage
 
-    logger.info(context, "load_all", extra=extra(path=object_storage.bucket))
-    items: List[Something] = []
-    for item_loc in await object_storage.list_objects(wildcard, recursive=True):
-        something = await object_storage.get(
-            key=item_loc.item_id,
-            datatype=Something,
-            partition_key=item_loc.partition_key,
+    logger.info(context, "load_page", extra=extra(path=object_storage.bucket))
+    try:
+        if page_size is not None and not page_size.isdigit():
+            raise ValueError(f"Invalid page_size: {page_size}. Expected a positive number.")
+        return await object_storage.list_objects_page(
+            wildcard,
+            page_size=int(page_size or PAGE_SIZE),
+            continuation_token=page_token,
+            recursive=True,
         )
-        if something is not None:
-            items.append(something)
-    return items
+    except ValueError as e:
+        logger.warning(context, "invalid page request", extra=extra(error=str(e)))
+        return str(e)
+
+
+async def __postprocess__(
+    payload: Union[ListPage, str], context: EventContext, response: PostprocessHook
+) -> Union[ListPage, str]:
+    """
+    Streams listed objects as NDJSON
+    """
+    assert object_storage
+    if isinstance(payload, str):
+        response.status = 400
+        return payload
+    if payload.next_token:
+        response.set_header("X-Next-Page-Token", payload.next_token)
+    count = await stream_ndjson(
+        object_storage,
+        payload.items,
+        Something,
+        context,
+        response,
+        file_name="objects.ndjson",
+        concurrency=CONCURRENCY,
+    )
+    logger.info(context, "streamed objects", extra=extra(count=count))
+    return payload
@@ -0,0 +1,67 @@
+"""
+AWS Example: Presigned Download File
+--------------------------------------------------------------------
+Redirects to a presigned S3 URL, so the client downloads the file directly from S3
+without transferring content through this app.
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext, PostprocessHook
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings, PresignedRequest
+
+object_storage: Optional[ObjectStorage] = None
+EXPIRES_IN = 300
+logger, extra = app_extra_logger()
+
+__steps__ = ["presign_download"]
+
+__api__ = event_api(
+    summary="AWS Example: Presigned Download File",
+    query_args=[
+        ("file_name", str, "file name to download"),
+        ("partition_key", Optional[str], "Partition folder in `YYYY/MM/DD/HH` format"),
+    ],
+    responses={
+        307: (str, "Redirect to presigned download URL, also returned in `Location` header"),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def presign_download(
+    payload: None,
+    context: EventContext,
+    *,
+    file_name: str,
+    partition_key: Optional[str] = None,
+) -> PresignedRequest:
+    """
+    Signs a download request for the file, valid for 5 minutes
+    """
+    assert object_storage
+    logger.info(context, "presign_download", extra=extra(file_name=file_name))
+    return object_storage.presign_get(
+        file_name,
+        partition_key=partition_key,
+        expires_in=EXPIRES_IN,
+        content_disposition=f'attachment; filename="{file_name}"',
+    )
+
+
+async def __postprocess__(
+    request: PresignedRequest, context: EventContext, response: PostprocessHook
+) -> str:
+    response.set_status(307)
+    response.set_header("Location", request.url)
+    return request.url
@@ -0,0 +1,57 @@
+"""
+AWS Example: Presigned Upload File
+--------------------------------------------------------------------
+Returns a presigned S3 PUT request, so the client uploads the file directly to S3
+without transferring content through this app.
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings, PresignedRequest
+
+object_storage: Optional[ObjectStorage] = None
+EXPIRES_IN = 300
+logger, extra = app_extra_logger()
+
+__steps__ = ["presign_upload"]
+
+__api__ = event_api(
+    summary="AWS Example: Presigned Upload File",
+    query_args=[
+        ("file_name", str, "file name to upload"),
+        ("content_type", Optional[str], "content type of the file, signed with the request"),
+    ],
+    responses={
+        200: (
+            PresignedRequest,
+            "Presigned request: send `PUT` to `url` with `headers` and file content",
+        ),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def presign_upload(
+    payload: None,
+    context: EventContext,
+    *,
+    file_name: str,
+    content_type: Optional[str] = None,
+) -> PresignedRequest:
+    """
+    Signs an upload request for the file into current partition, valid for 5 minutes
+    """
+    assert object_storage
+    logger.info(context, "presign_upload", extra=extra(file_name=file_name))
+    return object_storage.presign_put(file_name, expires_in=EXPIRES_IN, content_type=content_type)
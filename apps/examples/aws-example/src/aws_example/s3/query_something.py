@@ -23,7 +23,12 @@ __api__ = event_api(
     summary="AWS Example: Query Something",
     query_args=[
         ("item_id", str, "Item Id to read"),
-        ("partition_key", str, "Partition folder in `YYYY/MM/DD/HH` format"),
+        (
+            "partition_key",
+            Optional[str],
+            "Partition folder in `YYYY/MM/DD/HH` format, "
+            "if not provided partition is resolved using item index",
+        ),
     ],
     responses={
         200: (Something, "Something object returned when found"),
@@ -46,7 +51,7 @@ async def load(
     context: EventContext,
     *,
     item_id: str,
-    partition_key: str,
+    partition_key: Optional[str] = None,
 ) -> Union[Something, SomethingNotFound]:
     """
     Loads json file from filesystem as `Something` instance
@@ -54,6 +59,7 @@ async def load(
     :param payload: unused
     :param context: EventContext
     :param item_id: str, item id to load
+    :param partition_key: Optional[str], partition folder, resolved using index if not provided
     :return: Loaded `Something` object or SomethingNotFound if not found or validation fails
 
     """
@@ -69,7 +75,7 @@ async def load(
             "item not found",
             extra=extra(something_id=item_id, path=object_storage.bucket),
         )
-        return SomethingNotFound(str(partition_key), item_id)
+        return SomethingNotFound(partition_key or "", item_id)
     return something
 
 
@@ -0,0 +1,44 @@
+"""
+AWS Example: Rebuild Index
+--------------------------------------------------------------------
+Rebuilds item id to partition index for existing Something objects
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+
+object_storage: Optional[ObjectStorage] = None
+logger, extra = app_extra_logger()
+
+__steps__ = ["rebuild_index"]
+
+__api__ = event_api(
+    summary="AWS Example: Rebuild Index",
+    responses={
+        200: (int, "number of indexed objects"),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def rebuild_index(payload: None, context: EventContext) -> int:
+    """
+    Indexes all stored objects so they can be queried without `partition_key`
+    """
+    assert object_storage
+    logger.info(context, "rebuild_index", extra=extra(path=object_storage.bucket))
+    count = await object_storage.rebuild_index()
+    logger.info(context, "index rebuilt", extra=extra(path=object_storage.bucket, count=count))
+    return count
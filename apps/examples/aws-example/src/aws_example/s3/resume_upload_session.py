@@ -0,0 +1,52 @@
+"""
+AWS Example: Resume Upload Session
+--------------------------------------------------------------------
+Resumes an interrupted multipart upload session, returning presigned requests only
+for parts not uploaded yet.
+"""
+
+from typing import Optional
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+
+from ..model import UploadPlan, UploadResume
+from .create_upload_session import presign_parts
+
+object_storage: Optional[ObjectStorage] = None
+logger, extra = app_extra_logger()
+
+__steps__ = ["resume_session"]
+
+__api__ = event_api(
+    summary="AWS Example: Resume Upload Session",
+    payload=(UploadResume, "upload session and size of the file being uploaded"),
+    responses={
+        200: (UploadPlan, "Upload session and presigned `PUT` requests for missing parts"),
+    },
+)
+
+
+async def __init_event__(context) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+async def resume_session(payload: UploadResume, context: EventContext) -> UploadPlan:
+    """
+    Lists uploaded parts and presigns requests to upload the missing ones
+    """
+    assert object_storage
+    uploaded = await object_storage.list_upload_parts(payload.session)
+    logger.info(
+        context,
+        "resume_session",
+        extra=extra(location=payload.session.location, uploaded=len(uploaded)),
+    )
+    return presign_parts(object_storage, payload.session, payload.size, uploaded)
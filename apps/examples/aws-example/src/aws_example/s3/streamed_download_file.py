@@ -61,28 +61,34 @@ async def get_streamed_data(
 
 async def __postprocess__(file: SomeFile, context: EventContext, response: PostprocessHook):
     """
-    Stream S3 file:
+    Stream S3 file: `Content-Length` is taken from the same GET request that streams
+    the file content, so it always matches the content sent.
     """
     assert object_storage
-    stream_response = None
-    async for chunk, content_length in object_storage.get_file_chunked(
+    chunks = object_storage.get_file_chunked(
         file_name=file.file_name, partition_key=file.partition_key
-    ):
-        if stream_response is None:
-            if chunk is None:
-                response.status = 404
-                msg = (
-                    f"{file.partition_key}/{file.file_name} not found"
-                    if file.partition_key
-                    else f"{file.file_name} not found"
-                )
-                return msg
-            stream_response = await response.prepare_stream_response(
-                context,
-                content_disposition=f'attachment; filename="{file.file_name}"',
-                content_type=file.content_type,
-                content_length=content_length,
-            )
+    )
+    try:
+        chunk, content_length = await chunks.__anext__()
+    except StopAsyncIteration:  # empty file
+        chunk, content_length = b"", 0
+    if chunk is None:
+        response.status = 404
+        return (
+            f"{file.partition_key}/{file.file_name} not found"
+            if file.partition_key
+            else f"{file.file_name} not found"
+        )
+    stream_response = await response.prepare_stream_response(
+        context,
+        content_disposition=f'attachment; filename="{file.file_name}"',
+        content_type=file.content_type,
+        content_length=content_length,
+    )
+    if chunk:
         await stream_response.write(chunk)
+    async for chunk, _ in chunks:
+        if chunk is not None:
+            await stream_response.write(chunk)
 
     return file
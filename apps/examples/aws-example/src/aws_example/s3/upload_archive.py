@@ -0,0 +1,97 @@
+"""
+AWS Example: Upload Archive
+--------------------------------------------------------------------
+Stores files contained in an uploaded tar or tar.gz archive. The archive is unpacked
+while it is received and files are stored concurrently, so the archive is never kept
+in memory or on disk. Results are summarized as counts, reporting up to MAX_ERRORS
+files that failed.
+"""
+
+from typing import List, Optional, Union
+
+from hopeit.app.api import event_api
+from hopeit.app.context import EventContext, PreprocessHook
+from hopeit.app.logger import app_extra_logger
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3.archive import ExtractResult, store_archive
+from hopeit.dataobjects import BinaryAttachment, dataclass, dataobject, field
+
+object_storage: Optional[ObjectStorage] = None
+CHUNK_SIZE = 64 * 1024
+CONCURRENCY = 8
+MAX_ERRORS = 100
+logger, extra = app_extra_logger()
+
+
+@dataobject
+@dataclass
+class UploadArchiveSummary:
+    """Number of stored files and first MAX_ERRORS files that failed"""
+
+    stored: int = 0
+    size: int = 0
+    failed: int = 0
+    errors: List[ExtractResult] = field(default_factory=list)
+
+
+__steps__ = ["summarize"]
+
+__api__ = event_api(
+    summary="AWS Example: Upload Archive",
+    description="Upload tar or tar.gz archive using Multipart form, storing contained files",
+    fields=[("archive", BinaryAttachment)],
+    responses={
+        200: (UploadArchiveSummary, "number of stored files and files that failed"),
+        400: (str, "Missing or invalid fields"),
+    },
+)
+
+
+async def __init_event__(context: EventContext) -> None:
+    global object_storage
+    if object_storage is None:
+        settings: ObjectStorageSettings = context.settings(
+            key="object_storage", datatype=ObjectStorageSettings
+        )
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+
+
+# pylint: disable=invalid-name
+async def __preprocess__(
+    payload: None, context: EventContext, request: PreprocessHook
+) -> Union[UploadArchiveSummary, str]:
+    assert object_storage
+    summary = UploadArchiveSummary()
+    async for file_hook in request.files():
+        if file_hook.name != "archive":
+            continue
+        logger.info(context, "Unpacking archive...", extra=extra(file_name=file_hook.file_name))
+        try:
+            async for result in store_archive(
+                object_storage,
+                file_hook.read_chunks(chunk_size=CHUNK_SIZE),
+                concurrency=CONCURRENCY,
+            ):
+                if result.error is None:
+                    summary.stored += 1
+                    summary.size += result.size
+                    continue
+                summary.failed += 1
+                if len(summary.errors) < MAX_ERRORS:
+                    summary.errors.append(result)
+        except ValueError as e:
+            request.status = 400
+            return str(e)
+    args = await request.parsed_args()
+    if "archive" not in args:
+        request.status = 400
+        return "Missing required fields"
+    return summary
+
+
+async def summarize(payload: UploadArchiveSummary, context: EventContext) -> UploadArchiveSummary:
+    """
+    Returns number of stored files and files that failed
+    """
+    logger.info(context, "Stored files", extra=extra(count=payload.stored, errors=payload.failed))
+    return payload
@@ -0,0 +1,68 @@
+"""
+aws-example tests
+"""
+
+import uuid
+
+import pytest
+from aws_example.model import Something
+from aws_example.s3.bulk_save_something import BulkSaveSummary
+from hopeit.aws.s3 import ObjectStorage
+from hopeit.aws.s3.streaming import IngestResult
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+@pytest.mark.asyncio
+async def test_bulk_save_something(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.bulk_save_something"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    test_id = str(uuid.uuid4())
+    lines = [f'{{"id": "{test_id}-{i}", "user": "u{i}"}}' for i in range(40)]
+    lines.insert(10, "")
+    lines.insert(20, '{"id": "invalid"}')
+    upload = {"items": ("\n".join(lines) + "\n").encode()}
+
+    summary = await execute_event(
+        app_config=app_config,
+        event_name="s3.bulk_save_something",
+        payload=None,
+        fields={"items": "items.ndjson"},
+        upload=upload,
+        preprocess=True,
+    )
+
+    assert isinstance(summary, BulkSaveSummary)
+    assert summary.saved == 40 and summary.failed == 1
+    assert [result.line for result in summary.errors] == [21]
+    assert all(isinstance(result, IngestResult) for result in summary.errors)
+
+    context = create_test_context(app_config, "s3.bulk_save_something")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    for i in range(40):
+        key = f"{test_id}-{i}"
+        item = await storage.locate(key)
+        assert item is not None
+        something = await storage.get(key=key, datatype=Something, partition_key=item.partition_key)
+        assert something is not None
+        assert something.user.id == something.user.name
+        await storage.delete(key, partition_key=item.partition_key)
+
+
+@pytest.mark.asyncio
+async def test_bulk_save_something_missing_field(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.bulk_save_something without items"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    result, _, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.bulk_save_something",
+        payload=None,
+        fields={},
+        preprocess=True,
+        postprocess=True,
+    )
+
+    assert result == "Missing required fields"
+    assert response.status == 400
@@ -0,0 +1,53 @@
+"""
+aws-example tests
+"""
+
+import io
+import zipfile
+from datetime import datetime, timezone
+
+import pytest
+from aws_example.s3.download_zip import ZipArchive
+from hopeit.aws.s3 import ObjectStorage
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+@pytest.mark.asyncio
+async def test_download_zip(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.download_zip"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    context = create_test_context(app_config, "s3.download_zip")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+
+    ts = datetime(2020, 5, 1, 10, tzinfo=timezone.utc)
+    files = {f"zipped{i}.txt": f"data{i}".encode() * 1024 for i in range(3)}
+    for file_name, data in files.items():
+        location = await storage.store_file(
+            file_name=file_name, value=data, partition_values={"ts": ts}
+        )
+    partition_key = storage.partition_key(location)
+    assert partition_key == "2020/05/01/10"
+
+    result, pp_result, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.download_zip",
+        payload=None,
+        postprocess=True,
+        wildcard=f"{partition_key}/zipped*",
+        file_name="zipped.zip",
+    )
+
+    assert result == ZipArchive(file_name="zipped.zip", wildcard=f"{partition_key}/zipped*")
+    assert pp_result == result
+    assert response.headers == {
+        "Content-Disposition": 'attachment; filename="zipped.zip"',
+        "Content-Type": "application/zip",
+    }
+    with zipfile.ZipFile(io.BytesIO(response.stream_response.resp.data)) as archive:
+        assert archive.namelist() == [f"{partition_key}/{file_name}" for file_name in files]
+        for file_name, data in files.items():
+            assert archive.read(f"{partition_key}/{file_name}") == data
+
+    await storage.delete_files(*files.keys(), partition_key=partition_key)
@@ -6,7 +6,7 @@ import uuid
 
 import pytest
 from hopeit.app.config import AppConfig
-from hopeit.aws.s3 import ItemLocator, ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3 import ItemLocator, ListPage, ObjectStorage, ObjectStorageSettings
 from hopeit.testing.apps import create_test_context, execute_event
 from moto.moto_server.threaded_moto_server import ThreadedMotoServer
 
@@ -36,14 +36,76 @@ async def test_list_files(moto_server: ThreadedMotoServer, app_config: AppConfig
 
     test_id, partition_key = await sample_file_id(app_config)
 
-    results = await execute_event(
+    _, results, response = await execute_event(
         app_config=app_config,
         event_name="s3.list_files",
         payload=None,
+        postprocess=True,
         wildcard=f"{partition_key}/{test_id}*",
     )
 
     assert len(results) == 2
+    assert "X-Next-Page-Token" not in response.headers
     assert all(result.item_id.startswith(test_id) for result in results)
     assert all(result.partition_key.startswith(partition_key) for result in results)
     assert all(isinstance(result, ItemLocator) for result in results)
+
+
+@pytest.mark.asyncio
+async def test_list_files_paginated(moto_server: ThreadedMotoServer, app_config: AppConfig):
+    """Test s3.list_files using page_size and page_token"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    test_id, partition_key = await sample_file_id(app_config)
+
+    page, results, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.list_files",
+        payload=None,
+        postprocess=True,
+        wildcard=f"{partition_key}/{test_id}*",
+        page_size="1",
+    )
+    assert isinstance(page, ListPage)
+    assert results == [ItemLocator(item_id=test_id + "a", partition_key=partition_key)]
+    page_token = response.headers["X-Next-Page-Token"]
+
+    _, results, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.list_files",
+        payload=None,
+        postprocess=True,
+        wildcard=f"{partition_key}/{test_id}*",
+        page_size="1",
+        page_token=page_token,
+    )
+    assert results == [ItemLocator(item_id=test_id + "b", partition_key=partition_key)]
+    assert "X-Next-Page-Token" not in response.headers
+
+
+@pytest.mark.parametrize(
+    "query,message",
+    [
+        ({"page_size": "abc"}, "Invalid page_size: abc. Expected a positive number."),
+        ({"page_size": "-1"}, "Invalid page_size: -1. Expected a positive number."),
+        ({"page_size": "0"}, "Invalid page_size: 0. Expected a positive number."),
+        ({"page_token": "not-a-token"}, "Invalid page token: not-a-token"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_list_files_invalid_page(
+    moto_server: ThreadedMotoServer, app_config: AppConfig, query, message
+):
+    """Test s3.list_files with invalid page_size or page_token"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    result, _, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.list_files",
+        payload=None,
+        postprocess=True,
+        **query,
+    )
+
+    assert result == message
+    assert response.status == 400
@@ -3,11 +3,12 @@ aws-example tests
 """
 
 import uuid
+from typing import List
 
 import pytest
 from aws_example.model import Something
 from hopeit.app.config import AppConfig
-from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3 import ListPage, ObjectStorage, ObjectStorageSettings
 from hopeit.dataobjects.payload import Payload
 from hopeit.testing.apps import create_test_context, execute_event
 from moto.moto_server.threaded_moto_server import ThreadedMotoServer
@@ -43,6 +44,12 @@ async def sample_file_id(app_config: AppConfig):
     return test_id
 
 
+def streamed_objects(response) -> List[Something]:
+    """Parses NDJSON streamed response"""
+    lines = response.stream_response.resp.data.decode().splitlines()
+    return [Payload.from_json(line, datatype=Something) for line in lines]
+
+
 @pytest.mark.asyncio
 async def test_list_objects(moto_server: ThreadedMotoServer, app_config: AppConfig):
     """Test s3.list_objects"""
@@ -50,13 +57,79 @@ async def test_list_objects(moto_server: ThreadedMotoServer, app_config: AppConf
 
     test_id = await sample_file_id(app_config)
 
-    results = await execute_event(
+    page, _, response = await execute_event(
         app_config=app_config,
         event_name="s3.list_objects",
         payload=None,
+        postprocess=True,
         wildcard=f"2020/05/01/00/{test_id}*",
     )
 
-    assert len(results) == 2
+    assert len(page.items) == 2
+    assert response.content_type == "application/x-ndjson"
+    assert response.headers["Content-Disposition"] == 'inline; filename="objects.ndjson"'
+    results = streamed_objects(response)
+    assert [result.id for result in results] == [test_id + "a", test_id + "b"]
     assert all(result.id.startswith(test_id) for result in results)
     assert all(isinstance(result, Something) for result in results)
+    assert "X-Next-Page-Token" not in response.headers
+
+
+@pytest.mark.asyncio
+async def test_list_objects_paginated(moto_server: ThreadedMotoServer, app_config: AppConfig):
+    """Test s3.list_objects using page_size and page_token"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    test_id = await sample_file_id(app_config)
+
+    page, _, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.list_objects",
+        payload=None,
+        postprocess=True,
+        wildcard=f"2020/05/01/00/{test_id}*",
+        page_size="1",
+    )
+    assert isinstance(page, ListPage)
+    assert [result.id for result in streamed_objects(response)] == [test_id + "a"]
+    page_token = response.headers["X-Next-Page-Token"]
+
+    _, _, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.list_objects",
+        payload=None,
+        postprocess=True,
+        wildcard=f"2020/05/01/00/{test_id}*",
+        page_size="1",
+        page_token=page_token,
+    )
+    assert [result.id for result in streamed_objects(response)] == [test_id + "b"]
+    assert "X-Next-Page-Token" not in response.headers
+
+
+@pytest.mark.parametrize(
+    "query,message",
+    [
+        ({"page_size": "abc"}, "Invalid page_size: abc. Expected a positive number."),
+        ({"page_size": "-1"}, "Invalid page_size: -1. Expected a positive number."),
+        ({"page_size": "0"}, "Invalid page_size: 0. Expected a positive number."),
+        ({"page_token": "not-a-token"}, "Invalid page token: not-a-token"),
+    ],
+)
+@pytest.mark.asyncio
+async def test_list_objects_invalid_page(
+    moto_server: ThreadedMotoServer, app_config: AppConfig, query, message
+):
+    """Test s3.list_objects with invalid page_size or page_token"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    result, _, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.list_objects",
+        payload=None,
+        postprocess=True,
+        **query,
+    )
+
+    assert result == message
+    assert response.status == 400
@@ -0,0 +1,44 @@
+"""
+aws-example tests
+"""
+
+import aiohttp
+import pytest
+from hopeit.aws.s3 import ObjectStorage, PresignedRequest
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+@pytest.mark.asyncio
+async def test_presigned_download_file(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.presigned_download_file"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    context = create_test_context(app_config, "s3.presigned_download_file")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    file_path = await storage.store_file(file_name="presigned-download.txt", value=b"data")
+    partition_key = storage.partition_key(file_path)
+
+    result, pp_result, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.presigned_download_file",
+        payload=None,
+        postprocess=True,
+        file_name="presigned-download.txt",
+        partition_key=partition_key,
+    )
+
+    assert isinstance(result, PresignedRequest)
+    assert result.location == file_path
+    assert response.status == 307
+    assert response.headers == {"Location": result.url}
+    assert pp_result == result.url
+    async with aiohttp.ClientSession() as client:
+        async with client.get(result.url) as download:
+            assert download.status == 200
+            assert download.headers["Content-Disposition"] == (
+                'attachment; filename="presigned-download.txt"'
+            )
+            assert await download.read() == b"data"
+
+    await storage.delete_files("presigned-download.txt", partition_key=partition_key)
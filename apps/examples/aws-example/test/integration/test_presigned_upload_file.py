@@ -0,0 +1,36 @@
+"""
+aws-example tests
+"""
+
+import aiohttp
+import pytest
+from hopeit.aws.s3 import ObjectStorage, PresignedRequest
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+@pytest.mark.asyncio
+async def test_presigned_upload_file(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.presigned_upload_file"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    result = await execute_event(
+        app_config=app_config,
+        event_name="s3.presigned_upload_file",
+        payload=None,
+        file_name="presigned-upload.txt",
+        content_type="text/plain",
+    )
+
+    assert isinstance(result, PresignedRequest)
+    assert result.method == "PUT"
+    assert result.headers == {"Content-Type": "text/plain"}
+    async with aiohttp.ClientSession() as client:
+        async with client.put(result.url, data=b"data", headers=result.headers) as response:
+            assert response.status == 200
+
+    context = create_test_context(app_config, "s3.presigned_upload_file")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    partition_key = storage.partition_key(result.location)
+    assert await storage.get_file("presigned-upload.txt", partition_key=partition_key) == b"data"
+    await storage.delete_files("presigned-upload.txt", partition_key=partition_key)
@@ -52,6 +52,27 @@ async def test_query_item(moto_server: ThreadedMotoServer, app_config: AppConfig
     assert result.id == test_id[0]
 
 
+@pytest.mark.asyncio
+async def test_query_item_without_partition_key(
+    moto_server: ThreadedMotoServer, app_config: AppConfig
+):
+    """Test s3.query_something resolving partition from index"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    test_id = await sample_file_id(app_config)
+
+    result, pp_result, _ = await execute_event(
+        app_config=app_config,
+        event_name="s3.query_something",
+        payload=None,
+        postprocess=True,
+        item_id=test_id[0],
+    )
+    assert isinstance(result, Something)
+    assert result == pp_result
+    assert result.id == test_id[0]
+
+
 @pytest.mark.asyncio
 async def test_query_item_not_found(
     moto_server: ThreadedMotoServer,
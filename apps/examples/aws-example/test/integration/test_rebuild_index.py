@@ -0,0 +1,65 @@
+"""
+aws-example tests
+"""
+
+import uuid
+
+import pytest
+from aws_example.model import Something, SomethingNotFound
+from hopeit.app.config import AppConfig
+from hopeit.aws.s3 import ObjectStorage, ObjectStorageSettings
+from hopeit.dataobjects import copy_payload
+from hopeit.dataobjects.payload import Payload
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+async def sample_unindexed_file_id(app_config: AppConfig) -> str:
+    """Creates sample_file without updating index"""
+    test_id = str(uuid.uuid4())
+    json_str = (
+        '{"id": "'
+        + test_id
+        + '", "user": {"id": "u1", "name": "test_user"}, '
+        + '"status": {"ts": "2020-05-01T00:00:00Z", "type": "NEW"}, "history": []}'
+    )
+    context = create_test_context(app_config, "s3.rebuild_index")
+    settings = copy_payload(context.settings(key="object_storage", datatype=ObjectStorageSettings))
+    settings.index = None
+    storage = await ObjectStorage.with_settings(settings).connect()
+
+    ret = await storage.store(key=test_id, value=Payload.from_json(json_str, datatype=Something))
+    assert ret == f"2020/05/01/00/{test_id}.json"
+    return test_id
+
+
+@pytest.mark.asyncio
+async def test_rebuild_index(moto_server: ThreadedMotoServer, app_config: AppConfig):
+    """Test s3.rebuild_index"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    test_id = await sample_unindexed_file_id(app_config)
+
+    result = await execute_event(
+        app_config=app_config,
+        event_name="s3.query_something",
+        payload=None,
+        item_id=test_id,
+    )
+    assert result == SomethingNotFound(path="", id=test_id)
+
+    count = await execute_event(
+        app_config=app_config,
+        event_name="s3.rebuild_index",
+        payload=None,
+    )
+    assert count >= 1
+
+    result = await execute_event(
+        app_config=app_config,
+        event_name="s3.query_something",
+        payload=None,
+        item_id=test_id,
+    )
+    assert isinstance(result, Something)
+    assert result.id == test_id
@@ -58,6 +58,33 @@ async def test_streamed_download_file(moto_server: ThreadedMotoServer, app_confi
     assert response.content_type == "application/octet-stream"
 
 
+@pytest.mark.asyncio
+async def test_streamed_download_empty_file(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.streamed_download_file with an empty file"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    file_name = "emptyfile"
+    context = create_test_context(app_config, "s3.streamed_download_file")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    partition_key = storage.partition_key(
+        await storage.store_file(file_name=file_name, value=io.BytesIO(b""))
+    )
+
+    _, pp_result, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.streamed_download_file",
+        payload=None,
+        postprocess=True,
+        file_name=file_name,
+        partition_key=partition_key,
+    )
+
+    assert pp_result.file_name == file_name
+    assert response.headers["Content-Length"] == "0"
+    assert response.stream_response.resp.data == b""
+    await storage.delete_files(file_name, partition_key=partition_key)
+
+
 @pytest.mark.asyncio
 async def test_streamed_download_none(moto_server: ThreadedMotoServer, app_config):
     """Test s3.streamed_download_file"""
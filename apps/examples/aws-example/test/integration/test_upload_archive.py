@@ -0,0 +1,99 @@
+"""
+aws-example tests
+"""
+
+import io
+import tarfile
+import uuid
+
+import pytest
+from aws_example.s3.upload_archive import UploadArchiveSummary
+from hopeit.aws.s3 import ObjectStorage
+from hopeit.aws.s3.archive import ExtractResult
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+@pytest.mark.asyncio
+async def test_upload_archive(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.upload_archive"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    test_id = str(uuid.uuid4())
+    files = {f"docs/{test_id}-{i}.txt": f"data{i}".encode() * 100 for i in range(10)}
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w:gz") as archive:
+        for name, data in files.items():
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+
+    summary = await execute_event(
+        app_config=app_config,
+        event_name="s3.upload_archive",
+        payload=None,
+        fields={"archive": "docs.tar.gz"},
+        upload={"archive": buffer.getvalue()},
+        preprocess=True,
+    )
+
+    assert summary == UploadArchiveSummary(
+        stored=len(files), size=sum(len(data) for data in files.values())
+    )
+
+    context = create_test_context(app_config, "s3.upload_archive")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    items = [item for item in await storage.list_files(recursive=True) if test_id in item.item_id]
+    assert sorted(item.item_id for item in items) == sorted(
+        name.rsplit("/", 1)[-1] for name in files
+    )
+    for item in items:
+        data = files[f"docs/{item.item_id}"]
+        assert await storage.get_file(item.item_id, partition_key=item.partition_key) == data
+        await storage.delete_files(item.item_id, partition_key=item.partition_key)
+
+
+@pytest.mark.asyncio
+async def test_upload_archive_errors(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.upload_archive with files that can't be stored"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w") as archive:
+        info = tarfile.TarInfo("docs/truncated.txt")
+        info.size = 1000
+        archive.addfile(info, io.BytesIO(b"x" * 1000))
+    truncated = buffer.getvalue()[:700]
+
+    summary = await execute_event(
+        app_config=app_config,
+        event_name="s3.upload_archive",
+        payload=None,
+        fields={"archive": "docs.tar"},
+        upload={"archive": truncated},
+        preprocess=True,
+    )
+
+    assert summary == UploadArchiveSummary(
+        failed=1,
+        errors=[ExtractResult("docs/truncated.txt", 1000, error="Unexpected end of archive")],
+    )
+
+
+@pytest.mark.asyncio
+async def test_upload_archive_invalid(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.upload_archive with invalid archive"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    result, _, response = await execute_event(
+        app_config=app_config,
+        event_name="s3.upload_archive",
+        payload=None,
+        fields={"archive": "docs.tar"},
+        upload={"archive": b"not a tar archive" * 100},
+        preprocess=True,
+        postprocess=True,
+    )
+
+    assert result.startswith("Invalid tar header")
+    assert response.status == 400
@@ -0,0 +1,84 @@
+"""
+aws-example tests
+"""
+
+import aiohttp
+import pytest
+from aws_example.model import UploadCompletion, UploadPlan, UploadRequest, UploadResume
+from aws_example.s3.create_upload_session import PART_SIZE
+from botocore.exceptions import ClientError
+from hopeit.aws.s3 import ObjectStorage, PresignedRequest
+from hopeit.testing.apps import create_test_context, execute_event
+from moto.moto_server.threaded_moto_server import ThreadedMotoServer
+
+
+async def upload(request: PresignedRequest, data: bytes) -> None:
+    async with aiohttp.ClientSession() as client:
+        async with client.put(request.url, data=data) as response:
+            assert response.status == 200
+
+
+@pytest.mark.asyncio
+async def test_upload_session(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.create_upload_session, s3.resume_upload_session, s3.complete_upload_session"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    data = b"x" * PART_SIZE + b"y" * 10
+    plan = await execute_event(
+        app_config=app_config,
+        event_name="s3.create_upload_session",
+        payload=UploadRequest(file_name="large-upload.bin", size=len(data)),
+    )
+    assert isinstance(plan, UploadPlan)
+    assert plan.part_size == PART_SIZE
+    assert len(plan.requests) == 2
+
+    # Only last part is uploaded before interruption
+    await upload(plan.requests[1], data[PART_SIZE:])
+
+    resumed = await execute_event(
+        app_config=app_config,
+        event_name="s3.resume_upload_session",
+        payload=UploadResume(session=plan.session, size=len(data)),
+    )
+    assert isinstance(resumed, UploadPlan)
+    assert len(resumed.requests) == 1
+    await upload(resumed.requests[0], data[:PART_SIZE])
+
+    location = await execute_event(
+        app_config=app_config,
+        event_name="s3.complete_upload_session",
+        payload=UploadCompletion(session=plan.session),
+    )
+    assert location == plan.session.location
+
+    context = create_test_context(app_config, "s3.complete_upload_session")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    partition_key = storage.partition_key(location)
+    assert await storage.get_file("large-upload.bin", partition_key=partition_key) == data
+    await storage.delete_files("large-upload.bin", partition_key=partition_key)
+
+
+@pytest.mark.asyncio
+async def test_abort_upload_session(moto_server: ThreadedMotoServer, app_config):
+    """Test s3.abort_upload_session"""
+    await execute_event(app_config=app_config, event_name="s3.init", payload=None)
+
+    plan = await execute_event(
+        app_config=app_config,
+        event_name="s3.create_upload_session",
+        payload=UploadRequest(file_name="aborted-upload.bin", size=10),
+    )
+    await upload(plan.requests[0], b"y" * 10)
+
+    location = await execute_event(
+        app_config=app_config,
+        event_name="s3.abort_upload_session",
+        payload=plan.session,
+    )
+    assert location == plan.session.location
+
+    context = create_test_context(app_config, "s3.abort_upload_session")
+    storage = await ObjectStorage.with_settings(context.settings.extras["object_storage"]).connect()
+    with pytest.raises(ClientError):
+        await storage.list_upload_parts(plan.session)
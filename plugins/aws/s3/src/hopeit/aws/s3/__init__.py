@@ -4,11 +4,55 @@ Hopeit AWS S3 ObjectStorage API
 
 __version__ = "0.3.0rc0"
 
+from hopeit.aws.s3.changefeed import FeedCheckpoint
+from hopeit.aws.s3.dedup import BlobInfo, DedupSettings, DedupStats
+from hopeit.aws.s3.index import IndexSettings
+from hopeit.aws.s3.listing import CompactListing, ListPage
+from hopeit.aws.s3.manifest import ManifestCheck, ManifestSettings
 from hopeit.aws.s3.object_storage import (
     ConnectionConfig,
     ItemLocator,
+    ItemStat,
     ObjectStorage,
     ObjectStorageSettings,
+    PreconditionFailed,
+    PresignedRequest,
 )
+from hopeit.aws.s3.partition import PartitionSettings
+from hopeit.aws.s3.retention import PurgeResult
+from hopeit.aws.s3.segments import SegmentInfo, SegmentSettings
+from hopeit.aws.s3.spool import SpoolSettings
+from hopeit.aws.s3.sync import SyncResult
+from hopeit.aws.s3.throttling import ThrottlingSettings
+from hopeit.aws.s3.uploads import UploadPart, UploadSession, UploadSettings
+from hopeit.aws.s3.writebehind import WriteBehindSettings
 
-__all__ = ["ConnectionConfig", "ItemLocator", "ObjectStorage", "ObjectStorageSettings"]
+__all__ = [
+    "BlobInfo",
+    "CompactListing",
+    "ConnectionConfig",
+    "DedupSettings",
+    "DedupStats",
+    "FeedCheckpoint",
+    "IndexSettings",
+    "ItemLocator",
+    "ItemStat",
+    "ListPage",
+    "ManifestCheck",
+    "ManifestSettings",
+    "ObjectStorage",
+    "ObjectStorageSettings",
+    "PartitionSettings",
+    "PreconditionFailed",
+    "PresignedRequest",
+    "PurgeResult",
+    "SegmentInfo",
+    "SegmentSettings",
+    "SpoolSettings",
+    "SyncResult",
+    "ThrottlingSettings",
+    "UploadPart",
+    "UploadSession",
+    "UploadSettings",
+    "WriteBehindSettings",
+]
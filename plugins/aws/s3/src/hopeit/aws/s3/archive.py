@@ -0,0 +1,501 @@
+"""
+Archive helpers: stream many stored files as a zip archive without buffering the archive,
+prefetching member data from S3 concurrently with bounded read-ahead, and store files
+unpacked from an uploaded tar stream as it is received.
+"""
+
+import asyncio
+import io
+import posixpath
+import tarfile
+import zipfile
+import zlib
+from collections import deque
+from contextlib import aclosing
+from datetime import datetime, timezone
+from typing import (
+    Any,
+    AsyncGenerator,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Deque,
+    Dict,
+    Optional,
+    Tuple,
+    Union,
+)
+
+from hopeit.app.context import EventContext, PostprocessHook
+from hopeit.dataobjects import dataclass, dataobject
+
+from .listing import ItemLocator
+from .object_storage import ObjectStorage
+from .streaming import ItemLocators, _iter_items, _map_bounded, prepare_chunked_response
+
+__all__ = [
+    "ZIP_CONTENT_TYPE",
+    "ExtractResult",
+    "zip_files",
+    "stream_zip",
+    "store_archive",
+]
+
+ZIP_CONTENT_TYPE = "application/zip"
+CHUNK_SIZE = 256 * 1024
+MAX_BUFFER_SIZE = 8 * 1024 * 1024
+GZIP_MAGIC = b"\x1f\x8b"
+TAR_ENCODING = "utf-8"
+
+_END = object()
+
+
+@dataobject
+@dataclass
+class ExtractResult:
+    """
+    Result of storing one file unpacked from an archive.
+
+    :field member, str: member name in the archive.
+    :field size, int: member size in bytes.
+    :field location, Optional[str]: location where the file was stored, None on errors.
+    :field error, Optional[str]: reason why the member could not be stored.
+    """
+
+    member: str
+    size: int
+    location: Optional[str] = None
+    error: Optional[str] = None
+
+
+class _ZipOutput(io.RawIOBase):
+    """
+    Non-seekable file-like object collecting bytes written by `zipfile.ZipFile`
+    until they are drained, so members are written using data descriptors.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._chunks: list = []
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: Any) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+
+async def _list_files(
+    object_storage: ObjectStorage, wildcard: str, recursive: bool
+) -> AsyncIterator[ItemLocator]:
+    page_token: Optional[str] = None
+    while True:
+        page = await object_storage.list_files_page(
+            wildcard, continuation_token=page_token, recursive=recursive
+        )
+        for item in page.items:
+            yield item
+        if page.next_token is None:
+            return
+        page_token = page.next_token
+
+
+async def _prefetch(
+    object_storage: ObjectStorage, item: ItemLocator, chunk_size: int, queue: asyncio.Queue
+) -> None:
+    """
+    Downloads file `item` into `queue`, blocking when `queue` is full. Puts None if the file
+    was not found, or the error raised, and `_END` when done.
+    """
+    try:
+        async for chunk, _ in object_storage.get_file_chunked(
+            item.item_id, partition_key=item.partition_key, chunk_size=chunk_size
+        ):
+            await queue.put(chunk)
+    except Exception as e:  # pylint: disable=broad-except
+        await queue.put(e)
+    await queue.put(_END)
+
+
+def _member_info(item: ItemLocator, compression: int) -> zipfile.ZipInfo:
+    name = f"{item.partition_key}/{item.item_id}" if item.partition_key else item.item_id
+    ts = item.last_modified or datetime.now(tz=timezone.utc)
+    info = zipfile.ZipInfo(name, date_time=ts.timetuple()[:6])
+    info.compress_type = compression
+    info.file_size = item.size or 0
+    return info
+
+
+async def _zip_members(
+    object_storage: ObjectStorage,
+    items: ItemLocators,
+    concurrency: int,
+    read_ahead: int,
+    chunk_size: int,
+    compression: int,
+) -> AsyncGenerator[Tuple[bytes, int], None]:
+    """
+    Yields zip archive data as it is written, together with the number of members added.
+    Prefetch tasks still running are cancelled when the generator is closed.
+    """
+    if concurrency < 1 or read_ahead < 1:
+        raise ValueError("concurrency and read_ahead must be positive numbers")
+    output = _ZipOutput()
+    prefetching: Deque[Tuple[ItemLocator, asyncio.Queue, asyncio.Task]] = deque()
+    pending_items = _iter_items(items)
+    listed_all = False
+    current: Optional[asyncio.Task] = None
+    count = 0
+
+    async def prefetch_next() -> None:
+        nonlocal listed_all
+        while not listed_all and len(prefetching) < concurrency:
+            try:
+                item = await pending_items.__anext__()
+            except StopAsyncIteration:
+                listed_all = True
+                return
+            queue: asyncio.Queue = asyncio.Queue(read_ahead)
+            task = asyncio.create_task(_prefetch(object_storage, item, chunk_size, queue))
+            prefetching.append((item, queue, task))
+
+    try:
+        with zipfile.ZipFile(output, mode="w", compression=compression) as archive:
+            await prefetch_next()
+            while prefetching:
+                item, queue, current = prefetching.popleft()
+                await prefetch_next()
+                chunk = await queue.get()
+                if chunk is None:
+                    continue  # file was deleted after listing
+                with archive.open(
+                    _member_info(item, compression), mode="w", force_zip64=item.size is None
+                ) as member:
+                    while chunk is not _END:
+                        if isinstance(chunk, Exception):
+                            raise chunk
+                        member.write(chunk)
+                        data = output.drain()
+                        if data:
+                            yield data, count
+                        chunk = await queue.get()
+                count += 1
+        yield output.drain(), count
+    finally:
+        if current is not None:
+            current.cancel()
+        for _, _, task in prefetching:
+            task.cancel()
+
+
+async def zip_files(
+    object_storage: ObjectStorage,
+    items: Union[str, ItemLocators],
+    *,
+    recursive: bool = False,
+    concurrency: int = 8,
+    read_ahead: int = 4,
+    chunk_size: int = CHUNK_SIZE,
+    compression: int = zipfile.ZIP_STORED,
+) -> AsyncIterator[bytes]:
+    """
+    Creates a zip archive of files located by `items`, yielding archive data as it is written.
+    Files are downloaded in order, while up to `concurrency` following files are prefetched,
+    buffering up to `read_ahead` chunks each, so memory usage doesn't depend on the archive
+    size. Archive members are named by file location, i.e. "2020/05/01/file.txt". Files not
+    found are skipped.
+
+    :param object_storage, ObjectStorage: storage to retrieve files from.
+    :param items: wildcard to list files, i.e. "2020/05/01/*", or `ItemLocator`s,
+        or an async iterable of them.
+    :param recursive, bool: if True, wildcard listing is recursive.
+    :param concurrency, int: max number of files downloaded concurrently.
+    :param read_ahead, int: max number of chunks buffered for each file.
+    :param chunk_size, int: size in bytes of downloaded chunks.
+    :param compression, int: `zipfile.ZIP_STORED` (default) or `zipfile.ZIP_DEFLATED`.
+    :yields: zip archive data.
+    """
+    if isinstance(items, str):
+        items = _list_files(object_storage, items, recursive)
+    async with aclosing(
+        _zip_members(object_storage, items, concurrency, read_ahead, chunk_size, compression)
+    ) as members:
+        async for data, _ in members:
+            yield data
+
+
+async def stream_zip(
+    object_storage: ObjectStorage,
+    items: Union[str, ItemLocators],
+    context: EventContext,
+    response: PostprocessHook,
+    *,
+    file_name: str = "files.zip",
+    recursive: bool = False,
+    concurrency: int = 8,
+    read_ahead: int = 4,
+    chunk_size: int = CHUNK_SIZE,
+    compression: int = zipfile.ZIP_STORED,
+) -> int:
+    """
+    Streams a zip archive of files located by `items` using
+    `PostprocessHook.prepare_stream_response`, created on the fly with `zip_files`.
+    To be used in `__postprocess__` event methods.
+
+    :param object_storage, ObjectStorage: storage to retrieve files from.
+    :param items: wildcard to list files, or `ItemLocator`s, or an async iterable of them.
+    :param context, EventContext: event context
+    :param response, PostprocessHook: response hook from `__postprocess__`
+    :param file_name, str: file name for Content-Disposition header
+    :param recursive, bool: if True, wildcard listing is recursive.
+    :param concurrency, int: max number of files downloaded concurrently.
+    :param read_ahead, int: max number of chunks buffered for each file.
+    :param chunk_size, int: size in bytes of downloaded chunks.
+    :param compression, int: `zipfile.ZIP_STORED` (default) or `zipfile.ZIP_DEFLATED`.
+    :return: number of archived files
+    """
+    if isinstance(items, str):
+        items = _list_files(object_storage, items, recursive)
+    stream_response = await prepare_chunked_response(
+        context,
+        response,
+        content_disposition=f'attachment; filename="{file_name}"',
+        content_type=ZIP_CONTENT_TYPE,
+    )
+    count = 0
+    async with aclosing(
+        _zip_members(object_storage, items, concurrency, read_ahead, chunk_size, compression)
+    ) as members:
+        async for data, count in members:
+            if data:
+                await stream_response.write(data)
+    return count
+
+
+class _StreamReader:
+    """
+    Reads bytes from an async iterable of chunks, keeping track of the position in the stream.
+    """
+
+    def __init__(self, chunks: AsyncIterable[bytes]):
+        self._chunks = chunks.__aiter__()
+        self._buffer = b""
+        self._offset = 0
+        self.position = 0
+
+    async def read(self, size: int) -> bytes:
+        """
+        Returns `size` bytes, or less only if the stream ends.
+        """
+        parts = []
+        remaining = size
+        while remaining > 0:
+            if self._offset >= len(self._buffer):
+                try:
+                    self._buffer = await self._chunks.__anext__()
+                except StopAsyncIteration:
+                    break
+                self._offset = 0
+            part = self._buffer[self._offset : self._offset + remaining]
+            self._offset += len(part)
+            remaining -= len(part)
+            parts.append(part)
+        data = b"".join(parts)
+        self.position += len(data)
+        return data
+
+    async def skip(self, size: int) -> None:
+        while size > 0:
+            data = await self.read(min(size, CHUNK_SIZE))
+            if not data:
+                return
+            size -= len(data)
+
+
+class _MemberReader:
+    """
+    File-like object reading the data of a tar member from the stream, so large members
+    are uploaded without buffering them.
+    """
+
+    def __init__(self, reader: _StreamReader, size: int):
+        self._reader = reader
+        self._remaining = size
+
+    async def read(self, size: int = -1) -> bytes:
+        if size < 0 or size > self._remaining:
+            size = self._remaining
+        data = await self._reader.read(size)
+        self._remaining -= len(data)
+        if len(data) < size:
+            raise EOFError("Unexpected end of archive")
+        return data
+
+
+async def _decompress(chunks: AsyncIterable[bytes]) -> AsyncIterator[bytes]:
+    """
+    Yields `chunks` decompressed if they are gzip compressed, i.e. `.tar.gz`, otherwise as is.
+    Decompressed chunks are at most `CHUNK_SIZE` bytes.
+    """
+    decompressor: Any = None
+    started = False
+    async for chunk in chunks:
+        if not started and chunk:
+            started = True
+            if chunk.startswith(GZIP_MAGIC):
+                decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        if decompressor is None:
+            yield chunk
+            continue
+        data = decompressor.decompress(chunk, CHUNK_SIZE)
+        while data:
+            yield data
+            data = decompressor.decompress(decompressor.unconsumed_tail, CHUNK_SIZE)
+    if decompressor is not None:
+        data = decompressor.flush()
+        if data:
+            yield data
+
+
+def _padded(size: int) -> int:
+    return -(-size // tarfile.BLOCKSIZE) * tarfile.BLOCKSIZE
+
+
+def _parse_pax(data: bytes) -> Dict[str, str]:
+    """
+    Parses pax extended header records, formatted as "<length> <keyword>=<value>" lines.
+    """
+    headers: Dict[str, str] = {}
+    pos = 0
+    try:
+        while pos < len(data) and data[pos] != 0:
+            space = data.index(b" ", pos)
+            length = int(data[pos:space])
+            keyword, _, value = data[space + 1 : pos + length - 1].partition(b"=")
+            headers[keyword.decode(TAR_ENCODING)] = value.decode(TAR_ENCODING, "surrogateescape")
+            pos += length
+    except ValueError as e:
+        raise ValueError(f"Invalid pax header: {e}") from e
+    return headers
+
+
+async def _read_tar(reader: _StreamReader) -> AsyncIterator[tarfile.TarInfo]:
+    """
+    Yields headers of members of a tar stream read from `reader`, supporting ustar,
+    GNU long names and pax formats. Member data can be read from `reader` before resuming
+    iteration, data not read is skipped.
+    """
+    long_name: Optional[str] = None
+    pax: Dict[str, str] = {}
+    while True:
+        offset = reader.position
+        header = await reader.read(tarfile.BLOCKSIZE)
+        if len(header) < tarfile.BLOCKSIZE or header == tarfile.NUL * tarfile.BLOCKSIZE:
+            return
+        try:
+            info = tarfile.TarInfo.frombuf(header, TAR_ENCODING, "surrogateescape")
+        except tarfile.HeaderError as e:
+            raise ValueError(f"Invalid tar header at offset {offset}: {e}") from e
+        if info.type in (tarfile.XHDTYPE, tarfile.XGLTYPE, tarfile.SOLARIS_XHDTYPE):
+            data = await reader.read(_padded(info.size))
+            if info.type != tarfile.XGLTYPE:
+                pax = _parse_pax(data[: info.size])
+            continue
+        if info.type in (tarfile.GNUTYPE_LONGNAME, tarfile.GNUTYPE_LONGLINK):
+            data = await reader.read(_padded(info.size))
+            if info.type == tarfile.GNUTYPE_LONGNAME:
+                long_name = (
+                    data[: info.size].split(b"\0", 1)[0].decode(TAR_ENCODING, "surrogateescape")
+                )
+            continue
+        info.name = pax.get("path", long_name or info.name)
+        info.size = int(pax.get("size", info.size))
+        long_name, pax = None, {}
+        end = reader.position + _padded(info.size)
+        yield info
+        await reader.skip(end - reader.position)
+
+
+async def store_archive(
+    object_storage: ObjectStorage,
+    chunks: AsyncIterable[bytes],
+    *,
+    partition_values: Optional[Dict[str, Any]] = None,
+    file_name: Optional[Callable[[str], Optional[str]]] = None,
+    concurrency: int = 8,
+    max_buffer_size: int = MAX_BUFFER_SIZE,
+) -> AsyncIterator[ExtractResult]:
+    """
+    Unpacks a tar archive, optionally gzip compressed, from `chunks` of bytes as they are
+    received, i.e. `PreprocessFileHook.read_chunks`, storing each file using `store_file`.
+    Files up to `max_buffer_size` bytes are buffered and stored concurrently, running up to
+    `concurrency` requests at the same time, while larger files are streamed to S3 pausing
+    reading of the archive, so memory usage doesn't depend on archive size.
+    Directories, links and other special members are skipped.
+
+    :param object_storage, ObjectStorage: storage where files are saved.
+    :param chunks: async iterable of bytes of a tar or tar.gz archive.
+    :param partition_values, Optional[Dict[str, Any]]: values used by partition strategy
+        for every file, by default date partitions use current time.
+    :param file_name: optional function returning the file name to store a member, given its
+        name in the archive, or None to skip it. By default the base name of the member is
+        used, so members with the same name in different folders overwrite each other.
+    :param concurrency, int: max number of files stored concurrently.
+    :param max_buffer_size, int: max size in bytes of files buffered in memory.
+    :yields: `ExtractResult` for each stored file, in the same order as in the archive.
+    :raises ValueError: if the stream is not a valid tar archive.
+    """
+    reader = _StreamReader(_decompress(chunks))
+    name_for = file_name or posixpath.basename
+
+    async def store(
+        member: Union[ExtractResult, Tuple[tarfile.TarInfo, str, bytes]],
+    ) -> ExtractResult:
+        if isinstance(member, ExtractResult):
+            return member
+        info, name, data = member
+        try:
+            location = await object_storage.store_file(
+                file_name=name, value=data, partition_values=partition_values
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            return ExtractResult(info.name, info.size, error=f"{type(e).__name__}: {e}")
+        return ExtractResult(info.name, info.size, location=location)
+
+    async def members() -> AsyncIterator[Union[ExtractResult, Tuple[tarfile.TarInfo, str, bytes]]]:
+        async for info in _read_tar(reader):
+            if not info.isreg():
+                continue
+            name = name_for(info.name)
+            if name is None:
+                continue
+            if name in ("", ".", "..") or "/" in name:
+                yield ExtractResult(info.name, info.size, error=f"Invalid file name: {name!r}")
+            elif info.size > max_buffer_size:
+                yield await store_streamed(info, name)
+            else:
+                data = await reader.read(info.size)
+                if len(data) < info.size:
+                    yield ExtractResult(info.name, info.size, error="Unexpected end of archive")
+                else:
+                    yield info, name, data
+
+    async def store_streamed(info: tarfile.TarInfo, name: str) -> ExtractResult:
+        try:
+            location = await object_storage.store_file(
+                file_name=name,
+                value=_MemberReader(reader, info.size),
+                partition_values=partition_values,
+            )
+        except Exception as e:  # pylint: disable=broad-except
+            return ExtractResult(info.name, info.size, error=f"{type(e).__name__}: {e}")
+        return ExtractResult(info.name, info.size, location=location)
+
+    async for result in _map_bounded(store, members(), concurrency, ordered=True):
+        yield result
@@ -0,0 +1,82 @@
+"""
+Change feed: finds items stored in the newest date partitions listing only keys after the last
+key seen in each partition, the partition high-water mark, using ListObjectsV2 `StartAfter`.
+
+Partitions polled are the ones covering the time from `lookback` ago to now, so the feed
+rolls over to new date partitions automatically, while items stored late into the previous
+partition are still found during `lookback`. Marks of partitions older than that are dropped.
+
+Keys are listed in lexicographic order, so items must be stored with keys increasing in
+arrival order within a partition, i.e. time-ordered ids: items stored with keys lower
+than the mark of their partition are not found.
+"""
+
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+from hopeit.dataobjects import dataclass, dataobject, field
+
+from .partition import CompositePartition, DatePartition, PartitionStrategy
+from .retention import date_period
+
+__all__ = ["FeedCheckpoint", "feed_partitions"]
+
+FEEDS_FOLDER = "feeds/"
+
+
+@dataobject
+@dataclass
+class FeedCheckpoint:
+    """
+    Change feed position.
+
+    :field marks, Dict[str, str]: last key seen by partition folder, including shard folder
+        when sharding is enabled, i.e. {"2020/05/01/": "2020/05/01/item9.json"}.
+    :field updated, Optional[datetime]: time of the last poll that found new items.
+    """
+
+    marks: Dict[str, str] = field(default_factory=dict)
+    updated: Optional[datetime] = None
+
+
+def feed_partitions(
+    strategy: Optional[PartitionStrategy],
+    partition_values: Dict[str, Any],
+    start: datetime,
+    end: datetime,
+) -> List[str]:
+    """
+    Returns partition folders, with trailing "/", of items stored from `start` to `end`,
+    in date order. Partition values other than date are taken from `partition_values`.
+
+    :raises ValueError: if `strategy` has no date partition, its date format is not supported,
+        or `partition_values` are not enough to determine the partition folders.
+    """
+    error = "Change feed requires a date partition in ObjectStorageSettings"
+    if strategy is None:
+        raise ValueError(error)
+    strategies = strategy.strategies if isinstance(strategy, CompositePartition) else [strategy]
+    offset = 0
+    date_strategy: Optional[DatePartition] = None
+    for part_strategy in strategies:
+        if isinstance(part_strategy, DatePartition):
+            date_strategy = part_strategy
+            break
+        offset += part_strategy.n_components
+    if date_strategy is None:
+        raise ValueError(error)
+
+    partitions: List[str] = []
+    ts = start
+    while True:
+        prefix = strategy.partition_prefix({**partition_values, "ts": ts})
+        if prefix is None or prefix.count("/") != strategy.n_components:
+            raise ValueError("Change feed requires `partition_values` for non-date partitions")
+        partitions.append(prefix)
+        comps = prefix.split("/")[offset : offset + date_strategy.n_components]
+        period = date_period(date_strategy.dateformat, comps)
+        if period is None:
+            raise ValueError(f"Unsupported dateformat for change feed: {date_strategy.dateformat}")
+        if period[1] > end:
+            return partitions
+        ts = period[1]
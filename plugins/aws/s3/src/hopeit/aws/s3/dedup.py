@@ -0,0 +1,126 @@
+"""
+Content-hash deduplication: skips uploads of objects whose content didn't change,
+and content-addressed storage of files (blobs) stored once under their hash.
+
+Stored objects carry the sha256 of their content as `x-amz-meta-content-sha256` metadata.
+Hashes of stored objects are cached locally, otherwise they are fetched with a HEAD request.
+Objects stored without metadata are compared using their ETag, that is the md5 of the content
+for objects uploaded in a single part.
+
+Blobs are stored in the reserved metadata folder, i.e. `prefix/.hopeit/cas/3f/<sha256>`.
+"""
+
+import hashlib
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from hopeit.dataobjects import dataclass, dataobject
+
+from .index import METADATA_FOLDER
+
+__all__ = ["DedupSettings", "DedupStats", "BlobInfo", "ContentHashCache", "content_hash"]
+
+CAS_FOLDER = "cas/"
+HASH_METADATA = "content-sha256"
+
+
+@dataobject
+@dataclass
+class DedupSettings:
+    """
+    Content-hash deduplication settings.
+
+    :field cache_size, int: max number of object content hashes cached locally.
+    :field check_remote, bool: if True, objects whose hash is not cached are checked with
+        a HEAD request before uploading. If False, only cached hashes are compared.
+    """
+
+    cache_size: int = 10000
+    check_remote: bool = True
+
+
+@dataobject
+@dataclass
+class DedupStats:
+    """
+    Deduplication counters since the `ObjectStorage` instance was created.
+
+    :field checked, int: number of writes compared with the stored content.
+    :field skipped, int: number of writes skipped because content didn't change.
+    :field skipped_bytes, int: size in bytes of skipped writes.
+    :field uploaded, int: number of writes uploaded because content changed or was not found.
+    """
+
+    checked: int = 0
+    skipped: int = 0
+    skipped_bytes: int = 0
+    uploaded: int = 0
+
+
+@dataobject
+@dataclass
+class BlobInfo:
+    """
+    Content-addressed blob.
+
+    :field content_hash, str: sha256 hex digest of the content, to retrieve the blob.
+    :field location, str: blob location in the bucket, relative to prefix.
+    :field size, int: size in bytes.
+    :field stored, bool: False if the blob already existed and upload was skipped.
+    """
+
+    content_hash: str
+    location: str
+    size: int
+    stored: bool
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Returns sha256 hex digest of `data`.
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def blob_key(prefix: Optional[str], digest: str) -> str:
+    """
+    Returns bucket key of the blob with `digest`, spread across folders by its first byte.
+    """
+    return f"{prefix or ''}{METADATA_FOLDER}{CAS_FOLDER}{digest[:2]}/{digest}"
+
+
+def matches(head: Dict[str, Any], digest: str, data: bytes) -> bool:
+    """
+    Returns whether `head_object` response `head` is from an object with the same content
+    as `data`, using hash metadata or single part ETag.
+    """
+    stored = head.get("Metadata", {}).get(HASH_METADATA)
+    if stored is not None:
+        return stored == digest
+    etag = head.get("ETag", "").strip('"')
+    return "-" not in etag and etag == hashlib.md5(data, usedforsecurity=False).hexdigest()
+
+
+class ContentHashCache:
+    """
+    LRU cache of content hashes by bucket key.
+    """
+
+    def __init__(self, cache_size: int):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[str]:
+        digest = self._cache.get(key)
+        if digest is not None:
+            self._cache.move_to_end(key)
+        return digest
+
+    def put(self, key: str, digest: str) -> None:
+        self._cache[key] = digest
+        self._cache.move_to_end(key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def evict(self, key: str) -> None:
+        self._cache.pop(key, None)
@@ -0,0 +1,80 @@
+"""
+Item index: resolves item ids to the partition where they are stored, so objects
+can be retrieved without knowing their `partition_key`.
+
+Index entries are small objects stored in the bucket under the reserved metadata folder,
+i.e. `prefix/.hopeit/index/3f/item_id`, whose content is the partition key of the item.
+Resolved entries are cached locally.
+"""
+
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import quote
+
+from hopeit.dataobjects import dataclass, dataobject
+
+from .partition import get_shard_key
+
+__all__ = ["IndexSettings", "ItemIndex", "METADATA_FOLDER"]
+
+METADATA_FOLDER = ".hopeit/"
+INDEX_FOLDER = "index/"
+INDEX_SHARDS = 256
+
+
+@dataobject
+@dataclass
+class IndexSettings:
+    """
+    Item index settings.
+
+    :field cache_size, int: max number of item ids whose partition is cached locally.
+    :field rebuild_concurrency, int: max number of index entries written concurrently
+        when rebuilding the index.
+    """
+
+    cache_size: int = 10000
+    rebuild_concurrency: int = 32
+
+
+class ItemIndex:
+    """
+    Builds index entry keys and keeps a local LRU cache of resolved partition keys.
+    Reading and writing entries is done by `ObjectStorage`.
+    """
+
+    def __init__(self, prefix: Optional[str], settings: IndexSettings):
+        self.settings = settings
+        self.base = f"{prefix or ''}{METADATA_FOLDER}{INDEX_FOLDER}"
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+
+    def index_key(self, item_id: str) -> str:
+        """
+        Returns bucket key of the index entry for `item_id`, spread across hashed folders.
+        """
+        return f"{self.base}{get_shard_key(item_id, INDEX_SHARDS)}{quote(item_id, safe='')}"
+
+    def cached(self, item_id: str) -> Optional[str]:
+        """
+        Returns cached partition key for `item_id`, "" for items stored without partition,
+        or None if not cached.
+        """
+        partition_key = self._cache.get(item_id)
+        if partition_key is not None:
+            self._cache.move_to_end(item_id)
+        return partition_key
+
+    def update(self, item_id: str, partition_key: str) -> None:
+        """
+        Caches `partition_key` for `item_id`.
+        """
+        self._cache[item_id] = partition_key
+        self._cache.move_to_end(item_id)
+        if len(self._cache) > self.settings.cache_size:
+            self._cache.popitem(last=False)
+
+    def evict(self, item_id: str) -> None:
+        """
+        Removes `item_id` from local cache.
+        """
+        self._cache.pop(item_id, None)
@@ -0,0 +1,301 @@
+"""
+Compact listing results: stores listed keys and metadata in shared buffers and arrays
+instead of one `ItemLocator` per key, to list millions of keys with bounded memory.
+"""
+
+import base64
+import binascii
+import dataclasses
+import json
+from array import array
+from collections.abc import Sequence
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union, overload
+
+from hopeit.dataobjects import dataclass, dataobject
+
+from .manifest import ListedObject
+
+__all__ = [
+    "ItemLocator",
+    "ListPage",
+    "CompactListing",
+    "CompactListingBuilder",
+    "encode_page_token",
+    "decode_page_token",
+]
+
+PAGE_TOKEN_VERSION = 1
+
+
+@dataobject
+@dataclass
+class ItemLocator:
+    """
+    Location of a stored object or file.
+
+    :field item_id, str: object key or file name.
+    :field partition_key, Optional[str]: partition where the item is stored.
+    :field size, Optional[int]: size in bytes, when returned by listings.
+    :field etag, Optional[str]: S3 ETag, when returned by listings.
+    :field last_modified, Optional[datetime]: last modified time, when returned by listings.
+
+    Only `item_id` and `partition_key` are compared to check if two locators are equal.
+    """
+
+    item_id: str
+    partition_key: Optional[str] = None
+    size: Optional[int] = dataclasses.field(default=None, compare=False)
+    etag: Optional[str] = dataclasses.field(default=None, compare=False)
+    last_modified: Optional[datetime] = dataclasses.field(default=None, compare=False)
+
+
+@dataobject
+@dataclass
+class ListPage:
+    """
+    A page of listed items.
+
+    :field items, List[ItemLocator]: listed items.
+    :field next_token, Optional[str]: opaque token to retrieve next page,
+        None if there are no more items.
+    """
+
+    items: List[ItemLocator]
+    next_token: Optional[str] = None
+
+
+def encode_page_token(last_key: str) -> str:
+    """
+    Returns an opaque url-safe token to continue listing after `last_key`.
+    """
+    data = json.dumps({"v": PAGE_TOKEN_VERSION, "after": last_key}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+
+def decode_page_token(token: str) -> str:
+    """
+    Returns the key encoded in a token created with `encode_page_token`.
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        if data["v"] == PAGE_TOKEN_VERSION:
+            return str(data["after"])
+    except (binascii.Error, ValueError, TypeError, KeyError) as e:
+        raise ValueError(f"Invalid page token: {token}") from e
+    raise ValueError(f"Invalid page token: {token}")
+
+
+class CompactListing(Sequence):
+    """
+    Read-only sequence of listed items, converted to `ItemLocator` on access.
+
+    Item ids and etags are kept in single string buffers indexed by offset arrays,
+    partition keys are interned, and sizes and last modified times are kept in arrays.
+    """
+
+    def __init__(
+        self,
+        item_ids: str,
+        id_offsets: array,
+        partitions: List[Optional[str]],
+        partition_idx: array,
+        etags: str,
+        etag_offsets: array,
+        sizes: array,
+        last_modified: array,
+    ):
+        self._item_ids = item_ids
+        self._id_offsets = id_offsets
+        self._partitions = partitions
+        self._partition_idx = partition_idx
+        self._etags = etags
+        self._etag_offsets = etag_offsets
+        self._sizes = sizes
+        self._last_modified = last_modified
+
+    def __len__(self) -> int:
+        return len(self._sizes)
+
+    @overload
+    def __getitem__(self, index: int) -> ItemLocator: ...
+
+    @overload
+    def __getitem__(self, index: slice) -> "CompactListing": ...
+
+    def __getitem__(self, index: Union[int, slice]) -> Union[ItemLocator, "CompactListing"]:
+        if isinstance(index, slice):
+            return self._take(range(*index.indices(len(self))))
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("CompactListing index out of range")
+        return ItemLocator(
+            item_id=self.item_id(index),
+            partition_key=self.partition_key(index),
+            size=self._sizes[index],
+            etag=self._etags[self._etag_offsets[index] : self._etag_offsets[index + 1]],
+            last_modified=datetime.fromtimestamp(self._last_modified[index], tz=timezone.utc),
+        )
+
+    def __iter__(self) -> Iterator[ItemLocator]:
+        for i in range(len(self)):
+            yield self[i]  # type: ignore[misc]
+
+    def item_id(self, index: int) -> str:
+        """
+        Returns item id at `index` without creating an `ItemLocator`.
+        """
+        return self._item_ids[self._id_offsets[index] : self._id_offsets[index + 1]]
+
+    def partition_key(self, index: int) -> Optional[str]:
+        """
+        Returns partition key at `index` without creating an `ItemLocator`.
+        """
+        return self._partitions[self._partition_idx[index]]
+
+    def item_ids(self) -> Iterator[str]:
+        """
+        Iterates over item ids.
+        """
+        offsets = self._id_offsets
+        for i in range(len(self)):
+            yield self._item_ids[offsets[i] : offsets[i + 1]]
+
+    @property
+    def total_size(self) -> int:
+        """
+        Sum of listed items sizes in bytes.
+        """
+        return sum(self._sizes)
+
+    def sorted(self, by: str = "location", reverse: bool = False) -> "CompactListing":
+        """
+        Returns a new listing sorted by "location" (partition key and item id),
+        "size" or "last_modified".
+        """
+        sort_keys: Dict[str, Callable[[int], Any]] = {
+            "location": lambda i: (self.partition_key(i) or "", self.item_id(i)),
+            "size": lambda i: self._sizes[i],
+            "last_modified": lambda i: self._last_modified[i],
+        }
+        if by not in sort_keys:
+            raise ValueError(f"Invalid sort key: {by}. Expected one of: {', '.join(sort_keys)}")
+        return self._take(sorted(range(len(self)), key=sort_keys[by], reverse=reverse))
+
+    def to_list(self) -> List[ItemLocator]:
+        """
+        Converts listing to a list of `ItemLocator`.
+        """
+        return list(self)
+
+    def _take(self, indices: Iterable[int]) -> "CompactListing":
+        builder = CompactListingBuilder()
+        for i in indices:
+            builder._append(
+                self.item_id(i),
+                self.partition_key(i),
+                self._etags[self._etag_offsets[i] : self._etag_offsets[i + 1]],
+                self._sizes[i],
+                self._last_modified[i],
+            )
+        return builder.build()
+
+
+class CompactListingBuilder:
+    """
+    Builds a `CompactListing` from pages of `ListedObject`.
+
+    :param split, Optional[Callable]: splits listed keys into partition key and item path,
+        usually `PartitionStrategy.split`. None when storage is not partitioned.
+    :param suffix, Optional[str]: suffix to remove from item ids, i.e. ".json" for objects.
+    """
+
+    def __init__(
+        self,
+        split: Optional[Callable[[str], Tuple[str, str]]] = None,
+        suffix: Optional[str] = None,
+    ):
+        self._split = split
+        self._suffix_len = len(suffix) if suffix else 0
+        self._id_chunks: List[str] = []
+        self._id_offsets = array("Q", [0])
+        self._etag_chunks: List[str] = []
+        self._etag_offsets = array("Q", [0])
+        self._partitions: List[Optional[str]] = []
+        self._partition_lookup: Dict[Optional[str], int] = {}
+        self._partition_idx = array("I")
+        self._sizes = array("q")
+        self._last_modified = array("d")
+
+    def add_page(self, objects: List[ListedObject]) -> None:
+        """
+        Parses a page of listed objects in a single pass and appends them to the listing.
+        """
+        if not objects:
+            return
+        split, suffix_len = self._split, self._suffix_len
+        item_ids = []
+        partition_idx = []
+        id_offsets = []
+        etag_offsets = []
+        id_offset, etag_offset = self._id_offsets[-1], self._etag_offsets[-1]
+        for obj in objects:
+            partition_key: Optional[str] = None
+            item_id = obj.key
+            if split is not None:
+                partition_key, item_id = split(obj.key)
+            if suffix_len:
+                item_id = item_id[:-suffix_len]
+            item_ids.append(item_id)
+            partition_idx.append(self._intern(partition_key))
+            id_offset += len(item_id)
+            id_offsets.append(id_offset)
+            etag_offset += len(obj.etag)
+            etag_offsets.append(etag_offset)
+        self._id_chunks.append("".join(item_ids))
+        self._etag_chunks.append("".join(obj.etag for obj in objects))
+        self._id_offsets.extend(id_offsets)
+        self._etag_offsets.extend(etag_offsets)
+        self._partition_idx.extend(partition_idx)
+        self._sizes.extend(obj.size for obj in objects)
+        self._last_modified.extend(obj.last_modified for obj in objects)
+
+    def build(self) -> CompactListing:
+        """
+        Returns the listing built so far.
+        """
+        return CompactListing(
+            item_ids="".join(self._id_chunks),
+            id_offsets=self._id_offsets,
+            partitions=self._partitions,
+            partition_idx=self._partition_idx,
+            etags="".join(self._etag_chunks),
+            etag_offsets=self._etag_offsets,
+            sizes=self._sizes,
+            last_modified=self._last_modified,
+        )
+
+    def _append(
+        self,
+        item_id: str,
+        partition_key: Optional[str],
+        etag: str,
+        size: int,
+        last_modified: float,
+    ) -> None:
+        self._id_chunks.append(item_id)
+        self._id_offsets.append(self._id_offsets[-1] + len(item_id))
+        self._etag_chunks.append(etag)
+        self._etag_offsets.append(self._etag_offsets[-1] + len(etag))
+        self._partition_idx.append(self._intern(partition_key))
+        self._sizes.append(size)
+        self._last_modified.append(last_modified)
+
+    def _intern(self, partition_key: Optional[str]) -> int:
+        idx = self._partition_lookup.get(partition_key)
+        if idx is None:
+            idx = len(self._partitions)
+            self._partitions.append(partition_key)
+            self._partition_lookup[partition_key] = idx
+        return idx
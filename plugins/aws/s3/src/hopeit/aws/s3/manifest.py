@@ -0,0 +1,129 @@
+"""
+Partition manifests: compact snapshots of the objects stored in sealed partitions,
+so listings can read them instead of listing keys from S3.
+
+A manifest is a gzip compressed file stored under the reserved metadata folder,
+i.e. `prefix/.hopeit/manifests/2020/05/01.gz`, containing a json header line followed
+by one json array line `[key, size, etag, last_modified]` per object in the partition.
+"""
+
+import gzip
+import json
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from hopeit.dataobjects import dataclass, dataobject, field
+
+__all__ = [
+    "ManifestSettings",
+    "ManifestCheck",
+    "ListedObject",
+    "ManifestCache",
+    "encode_manifest",
+    "decode_manifest",
+]
+
+MANIFESTS_FOLDER = "manifests/"
+MANIFEST_SUFFIX = ".gz"
+MANIFEST_VERSION = 1
+
+
+class ListedObject(NamedTuple):
+    """
+    Object metadata as returned by listings: `key` relative to storage prefix and shard,
+    `size` in bytes, `etag` and `last_modified` as a POSIX timestamp.
+    """
+
+    key: str
+    size: int
+    etag: str
+    last_modified: float
+
+
+@dataobject
+@dataclass
+class ManifestSettings:
+    """
+    Partition manifests settings.
+
+    :field cache_size, int: max number of manifests kept in memory, so sealed partitions
+        listed repeatedly are read from S3 only once.
+    """
+
+    cache_size: int = 64
+
+
+@dataobject
+@dataclass
+class ManifestCheck:
+    """
+    Result of comparing a partition manifest against objects currently stored in the partition.
+
+    :field partition_key, str: checked partition.
+    :field missing, List[str]: keys in the manifest not found in the partition.
+    :field unexpected, List[str]: keys in the partition not found in the manifest.
+    :field modified, List[str]: keys whose size or etag differs from the manifest.
+    """
+
+    partition_key: str
+    missing: List[str] = field(default_factory=list)
+    unexpected: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+
+    @property
+    def consistent(self) -> bool:
+        return not (self.missing or self.unexpected or self.modified)
+
+
+def encode_manifest(partition_key: str, objects: Iterable[ListedObject]) -> bytes:
+    """
+    Returns gzip compressed manifest for `partition_key` listing `objects`.
+    """
+    objects = list(objects)
+    header = {
+        "version": MANIFEST_VERSION,
+        "partition_key": partition_key,
+        "count": len(objects),
+        "sealed_at": datetime.now(tz=timezone.utc).isoformat(),
+    }
+    lines = [json.dumps(header)]
+    lines.extend(json.dumps(list(obj), separators=(",", ":")) for obj in objects)
+    return gzip.compress(("\n".join(lines) + "\n").encode())
+
+
+def decode_manifest(data: bytes) -> Tuple[Dict[str, Any], List[ListedObject]]:
+    """
+    Returns header and objects listed in a manifest created with `encode_manifest`.
+    """
+    lines = gzip.decompress(data).decode().splitlines()
+    header = json.loads(lines[0])
+    if header.get("version") != MANIFEST_VERSION:
+        raise ValueError(f"Unsupported manifest version: {header.get('version')}")
+    return header, [ListedObject(*json.loads(line)) for line in lines[1:] if line]
+
+
+class ManifestCache:
+    """
+    LRU cache of decoded manifests, validated by the ETag of the manifest object.
+    """
+
+    def __init__(self, cache_size: int):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, Tuple[str, List[ListedObject]]]" = OrderedDict()
+
+    def get(self, manifest_key: str, etag: str) -> Optional[List[ListedObject]]:
+        cached = self._cache.get(manifest_key)
+        if cached is None or cached[0] != etag:
+            return None
+        self._cache.move_to_end(manifest_key)
+        return cached[1]
+
+    def put(self, manifest_key: str, etag: str, objects: List[ListedObject]) -> None:
+        self._cache[manifest_key] = (etag, objects)
+        self._cache.move_to_end(manifest_key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def evict(self, manifest_key: str) -> None:
+        self._cache.pop(manifest_key, None)
@@ -0,0 +1,334 @@
+"""
+Partition re-layout: migrates objects and files stored using the layout of a source
+`ObjectStorage` (prefix, partitioning and shards) to the layout of a target one.
+
+Source keys are listed page by page and their new location is computed by the target
+partition strategy, using partition values parsed from the source partition: dates from
+"date" partitions, or last modified time when it falls in the same partition, and values
+from "field" partitions. Last modified time is used when the source has no date partition.
+Items are copied server-side in parallel, copies are verified comparing sizes, and
+originals are optionally deleted in batches.
+
+Progress is saved to a checkpoint file after each page, so an interrupted migration
+resumes listing after the last completed page. From command line::
+
+    python -m hopeit.aws.s3.migration --source old-settings.json --target new-settings.json \\
+        --checkpoint migration.json --concurrency 64 --delete
+
+where settings files contain `ObjectStorageSettings` as json.
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import unquote
+
+from hopeit.dataobjects import dataclass, dataobject, field
+from hopeit.dataobjects.payload import Payload
+
+from .listing import ItemLocator
+from .object_storage import SUFFIX, ObjectStorage, ObjectStorageSettings
+from .partition import CompositePartition, DatePartition, FieldPartition, PartitionStrategy
+
+__all__ = ["MigrationCheckpoint", "migrate", "source_partition_values", "main"]
+
+MAX_ERRORS = 100
+
+PartitionValues = Callable[[ItemLocator, Dict[str, Any]], Dict[str, Any]]
+
+
+@dataobject
+@dataclass
+class MigrationCheckpoint:
+    """
+    Migration progress, saved after each listed page.
+
+    :field next_token, Optional[str]: continuation token of the next page to migrate.
+    :field done, bool: True when every page was migrated.
+    :field listed, int: number of listed items.
+    :field copied, int: number of items copied and verified.
+    :field skipped, int: number of items not in the source layout or already in place.
+    :field failed, int: number of items that could not be copied or verified.
+    :field deleted, int: number of originals deleted.
+    :field errors, List[str]: last errors, up to 100.
+    """
+
+    next_token: Optional[str] = None
+    done: bool = False
+    listed: int = 0
+    copied: int = 0
+    skipped: int = 0
+    failed: int = 0
+    deleted: int = 0
+    errors: List[str] = field(default_factory=list)
+
+
+def source_partition_values(
+    strategy: Optional[PartitionStrategy], item: ItemLocator
+) -> Optional[Dict[str, Any]]:
+    """
+    Returns partition values parsed from the partition key of `item` listed using `strategy`,
+    or None if the item is not stored in that layout.
+    """
+    if "/" in item.item_id or not item.item_id:
+        return None
+    values: Dict[str, Any] = {}
+    if strategy is None:
+        return None if item.partition_key else values
+    strategies = strategy.strategies if isinstance(strategy, CompositePartition) else [strategy]
+    comps = (item.partition_key or "").split("/")
+    if len(comps) != strategy.n_components:
+        return None
+    for part_strategy in strategies:
+        part, comps = (
+            "/".join(comps[: part_strategy.n_components]),
+            comps[part_strategy.n_components :],
+        )
+        if isinstance(part_strategy, DatePartition):
+            try:
+                ts = datetime.strptime(part, part_strategy.dateformat).replace(tzinfo=timezone.utc)
+            except ValueError:
+                return None
+            # Last modified time is more precise when consistent with the partition
+            modified = item.last_modified
+            if modified is not None and part_strategy.partition_key("", None, {"ts": modified}) == (
+                part + "/"
+            ):
+                ts = modified
+            values["ts"] = ts
+        elif isinstance(part_strategy, FieldPartition):
+            values[part_strategy.field] = unquote(part)
+    return values
+
+
+async def migrate(
+    source: ObjectStorage,
+    target: ObjectStorage,
+    *,
+    checkpoint_path: Optional[str] = None,
+    delete: bool = False,
+    concurrency: int = 32,
+    page_size: int = 1000,
+    partition_values: Optional[PartitionValues] = None,
+    on_page: Optional[Callable[[MigrationCheckpoint], None]] = None,
+) -> MigrationCheckpoint:
+    """
+    Migrates every object and file of `source` to the layout of `target`.
+
+    :param source: connected `ObjectStorage` using the current layout.
+    :param target: connected `ObjectStorage` using the new layout, reachable using
+        `source` connection.
+    :param checkpoint_path, Optional[str]: local file to save progress to and resume from.
+    :param delete, bool: if True, originals are deleted after their copy is verified.
+    :param concurrency, int: max number of items copied at the same time.
+    :param page_size, int: number of items listed, copied and checkpointed at once.
+    :param partition_values: optional function receiving each listed item and the partition
+        values parsed from its source partition, returning values for the target partition.
+    :param on_page: optional callback receiving progress after each page.
+    :return: `MigrationCheckpoint` with migration counters.
+    """
+    checkpoint = _load_checkpoint(checkpoint_path)
+    stale_index = source._index if _stale_index(source, target) else None
+    while not checkpoint.done:
+        page = await source.list_files_page(
+            recursive=True, page_size=page_size, continuation_token=checkpoint.next_token
+        )
+        checkpoint.listed += len(page.items)
+        objects, files = _plan(source, target, page.items, partition_values, checkpoint)
+        migrated: List[str] = []
+        indexed: Dict[str, str] = {}
+        for items, is_files in ((objects, False), (files, True)):
+            if items:
+                verified = await _copy_verified(
+                    source, target, items, is_files, concurrency, checkpoint
+                )
+                migrated.extend(_key(source, src, is_files) for src in verified)
+                if stale_index is not None and not is_files:
+                    indexed.update((_key(source, src, False), src.item_id) for src in verified)
+        if delete and migrated:
+            failed = await source._delete_keys(migrated)
+            checkpoint.deleted += len(migrated) - len(failed)
+            for key in failed:
+                _add_error(checkpoint, f"Delete failed: {key}")
+                indexed.pop(key, None)
+            if stale_index is not None and indexed:
+                for item_id in indexed.values():
+                    stale_index.evict(item_id)
+                await source._delete_keys([stale_index.index_key(i) for i in indexed.values()])
+        checkpoint.next_token = page.next_token
+        checkpoint.done = page.next_token is None
+        _save_checkpoint(checkpoint_path, checkpoint)
+        if on_page is not None:
+            on_page(checkpoint)
+    return checkpoint
+
+
+def _plan(
+    source: ObjectStorage,
+    target: ObjectStorage,
+    items: Sequence[ItemLocator],
+    partition_values: Optional[PartitionValues],
+    checkpoint: MigrationCheckpoint,
+) -> Tuple[List[Tuple[ItemLocator, ItemLocator]], List[Tuple[ItemLocator, ItemLocator]]]:
+    """
+    Computes target location of listed `items`, split in objects and files.
+    """
+    objects: List[Tuple[ItemLocator, ItemLocator]] = []
+    files: List[Tuple[ItemLocator, ItemLocator]] = []
+    for item in items:
+        values = source_partition_values(source.partition_strategy, item)
+        if values is None:
+            checkpoint.skipped += 1
+            continue
+        is_object = item.item_id.endswith(SUFFIX)
+        key = item.item_id[: -len(SUFFIX)] if is_object else item.item_id
+        values.setdefault("ts", item.last_modified)
+        try:
+            if partition_values is not None:
+                values = partition_values(item, values)
+            partition_key = (
+                target.partition_strategy.partition_key(key, None, values).rstrip("/")
+                if target.partition_strategy
+                else None
+            )
+        except (ValueError, KeyError, AttributeError) as e:
+            checkpoint.failed += 1
+            _add_error(checkpoint, f"{_location(item)}: {type(e).__name__}: {e}")
+            continue
+        src = ItemLocator(item_id=key, partition_key=item.partition_key, size=item.size)
+        dst = ItemLocator(item_id=key, partition_key=partition_key or None)
+        if source.bucket == target.bucket and _key(source, src, not is_object) == _key(
+            target, dst, not is_object
+        ):
+            checkpoint.skipped += 1
+            continue
+        (objects if is_object else files).append((src, dst))
+    return objects, files
+
+
+async def _copy_verified(
+    source: ObjectStorage,
+    target: ObjectStorage,
+    items: List[Tuple[ItemLocator, ItemLocator]],
+    files: bool,
+    concurrency: int,
+    checkpoint: MigrationCheckpoint,
+) -> List[ItemLocator]:
+    """
+    Copies `items` and verifies copies size.
+
+    :return: source locations of verified copies.
+    """
+    results = await source._copy_many(items, files, target, concurrency, return_exceptions=True)
+    copied = [
+        (src, dst)
+        for (src, dst), result in zip(items, results)
+        if result is not None and not isinstance(result, BaseException)
+    ]
+    for (src, _), result in zip(items, results):
+        if result is None:
+            checkpoint.skipped += 1
+        elif isinstance(result, BaseException):
+            checkpoint.failed += 1
+            _add_error(checkpoint, f"{src.item_id}: {type(result).__name__}: {result}")
+    stats = await target.stat_many([dst for _, dst in copied], files=files, concurrency=concurrency)
+    verified: List[ItemLocator] = []
+    for (src, dst), stat in zip(copied, stats):
+        if stat is None or stat.size != src.size:
+            checkpoint.failed += 1
+            _add_error(checkpoint, f"{src.item_id}: Copy verification failed: {dst}")
+            continue
+        checkpoint.copied += 1
+        verified.append(src)
+    return verified
+
+
+def _stale_index(source: ObjectStorage, target: ObjectStorage) -> bool:
+    """
+    Returns whether source index entries are left stale when originals are deleted, that is
+    when source uses an index not shared with target. Shared entries are updated on copy.
+    """
+    return source._index is not None and (source.bucket, source.prefix) != (
+        target.bucket,
+        target.prefix,
+    )
+
+
+def _key(storage: ObjectStorage, item: ItemLocator, files: bool) -> str:
+    return storage._build_key(item.partition_key, item.item_id + ("" if files else SUFFIX))
+
+
+def _location(item: ItemLocator) -> str:
+    return f"{item.partition_key}/{item.item_id}" if item.partition_key else item.item_id
+
+
+def _add_error(checkpoint: MigrationCheckpoint, error: str) -> None:
+    checkpoint.errors = [*checkpoint.errors, error][-MAX_ERRORS:]
+
+
+def _load_checkpoint(path: Optional[str]) -> MigrationCheckpoint:
+    if path is None or not os.path.exists(path):
+        return MigrationCheckpoint()
+    with open(path, encoding="utf-8") as f:
+        return Payload.from_json(f.read(), MigrationCheckpoint)
+
+
+def _save_checkpoint(path: Optional[str], checkpoint: MigrationCheckpoint) -> None:
+    """
+    Saves `checkpoint` replacing `path` atomically, so it is never left partially written.
+    """
+    if path is None:
+        return
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        f.write(Payload.to_json(checkpoint))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def _load_settings(path: str) -> ObjectStorageSettings:
+    with open(path, encoding="utf-8") as f:
+        return Payload.from_json(f.read(), ObjectStorageSettings)
+
+
+async def _run(args: argparse.Namespace) -> MigrationCheckpoint:
+    source = await ObjectStorage.with_settings(_load_settings(args.source)).connect()
+    target = await ObjectStorage.with_settings(_load_settings(args.target)).connect()
+    return await migrate(
+        source,
+        target,
+        checkpoint_path=args.checkpoint,
+        delete=args.delete,
+        concurrency=args.concurrency,
+        page_size=args.page_size,
+        on_page=lambda checkpoint: print(Payload.to_json(checkpoint), file=sys.stderr),
+    )
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Command line entry point: runs a migration and prints progress after each page.
+
+    :return: exit code, 1 if any item failed.
+    """
+    parser = argparse.ArgumentParser(
+        prog="hopeit-s3-migrate",
+        description="Migrates objects and files to a new prefix or partition layout.",
+    )
+    parser.add_argument("--source", required=True, help="json file with source settings")
+    parser.add_argument("--target", required=True, help="json file with target settings")
+    parser.add_argument("--checkpoint", required=True, help="file to save and resume progress")
+    parser.add_argument("--delete", action="store_true", help="delete originals after copy")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--page-size", type=int, default=1000)
+    checkpoint = asyncio.run(_run(parser.parse_args(argv)))
+    print(Payload.to_json(checkpoint))
+    return 1 if checkpoint.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
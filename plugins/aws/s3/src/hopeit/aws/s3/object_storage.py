@@ -3,37 +3,148 @@ Storage/persistence asynchronous stores and gets files from object storage.
 
 """
 
+import asyncio
+import bisect
 import fnmatch
+import hashlib
+import heapq
+import inspect
+import itertools
 import os
+import time
+from contextlib import nullcontext
+from copy import copy
+from datetime import datetime, timedelta, timezone
+from functools import partial
 from io import BytesIO
 from pathlib import Path
+from tempfile import SpooledTemporaryFile
 from typing import (
     IO,
     Any,
+    AsyncContextManager,
     AsyncGenerator,
     AsyncIterator,
+    Awaitable,
+    Callable,
     Dict,
     Generic,
     List,
     Optional,
+    Sequence,
     Tuple,
     Type,
     Union,
 )
 
 from aioboto3 import Session  # type: ignore
+from botocore.config import Config
 from botocore.exceptions import ClientError
-from hopeit.dataobjects import DataObject, dataclass, dataobject
+from botocore.session import get_session as get_botocore_session
+from hopeit.dataobjects import DataObject, dataclass, dataobject, field
 from hopeit.dataobjects.payload import Payload
 
-from .partition import get_file_partition_key, get_partition_key
+from .changefeed import FEEDS_FOLDER, FeedCheckpoint, feed_partitions
+from .dedup import (
+    HASH_METADATA,
+    BlobInfo,
+    ContentHashCache,
+    DedupSettings,
+    DedupStats,
+    blob_key,
+    content_hash,
+    matches,
+)
+from .index import METADATA_FOLDER, IndexSettings, ItemIndex
+from .listing import (
+    CompactListing,
+    CompactListingBuilder,
+    ItemLocator,
+    ListPage,
+    decode_page_token,
+    encode_page_token,
+)
+from .manifest import (
+    MANIFEST_SUFFIX,
+    MANIFESTS_FOLDER,
+    ListedObject,
+    ManifestCache,
+    ManifestCheck,
+    ManifestSettings,
+    decode_manifest,
+    encode_manifest,
+)
+from .partition import (
+    PartitionSettings,
+    PartitionStrategy,
+    build_partition_strategy,
+    get_shard_key,
+    get_shard_keys,
+)
+from .retention import PurgeResult, has_date_partition, partition_expired
+from .segments import (
+    SEGMENT_SUFFIX,
+    SEGMENT_TAIL_SIZE,
+    SegmentIndex,
+    SegmentIndexCache,
+    SegmentInfo,
+    SegmentSettings,
+    SegmentWriter,
+    decode_footer,
+    decode_index,
+    decode_record,
+    encode_record,
+    encode_segment,
+    new_segment_id,
+)
+from .spool import Spool, SpoolSettings, get_spool
+from .sync import (
+    TEMP_SUFFIX,
+    SyncResult,
+    ThreadedFile,
+    download_unchanged,
+    etag_md5,
+    file_md5,
+    item_location,
+    local_files,
+    local_path,
+    set_mtime,
+    upload_unchanged,
+)
+from .throttling import RateLimiter, ThrottlingSettings, get_rate_limiter
+from .uploads import MAX_PARTS, UploadPart, UploadSession, UploadSettings
+from .writebehind import PendingWrite, WriteBehindBuffer, WriteBehindSettings
 
 SUFFIX = ".json"
 S3 = "s3"
-
-__all__ = ["ObjectStorage", "ObjectStorageSettings", "ConnectionConfig"]
+RETRY_MODES = ("legacy", "standard", "adaptive")
+LISTING_PAGE_SIZE = 1000
+DELETE_BATCH_SIZE = 1000
+MULTIPART_COPY_THRESHOLD = 5 * 1024 * 1024 * 1024
+MULTIPART_COPY_PART_SIZE = 512 * 1024 * 1024
+
+__all__ = [
+    "ObjectStorage",
+    "ObjectStorageSettings",
+    "ConnectionConfig",
+    "ItemStat",
+    "PreconditionFailed",
+    "PresignedRequest",
+]
 
 SUFFIX = ".json"
+PRECONDITION_ERRORS = ("PreconditionFailed", "ConditionalRequestConflict", "NoSuchKey", "404")
+
+
+class PreconditionFailed(Exception):
+    """
+    Raised by conditional writes when `if_match` or `if_none_match` conditions are not met,
+    i.e. the object was modified, deleted or already exists.
+    """
+
+    def __init__(self, key: str):
+        super().__init__(f"Precondition failed: {key}")
+        self.key = key
 
 
 @dataobject
@@ -56,6 +167,15 @@ class ConnectionConfig:
         * path/to/cert/bundle.pem - A filename of the CA cert bundle to
             uses. You can specify this argument if you want to use a
             different CA cert bundle than the one used by botocore.
+
+    :field retry_mode, Optional[str]: botocore retry mode: "legacy", "standard" or "adaptive".
+        "standard" and "adaptive" modes retry throttling errors (i.e. `SlowDown`/503) using
+        exponential backoff with jitter, "adaptive" also rate limits requests client-side.
+        When `ObjectStorageSettings.throttling` is enabled, every throttled attempt retried
+        by botocore also reduces the client-side rate for the bucket and key prefix.
+        By default botocore configured retry mode is used.
+    :field max_attempts, Optional[int]: Maximum number of attempts for a request,
+        including the initial one. By default botocore configured value is used.
     """
 
     aws_access_key_id: Optional[str] = None
@@ -65,6 +185,8 @@ class ConnectionConfig:
     use_ssl: Union[bool, str] = True
     region_name: Optional[str] = None
     verify: Union[bool, str] = True
+    retry_mode: Optional[str] = None
+    max_attempts: Optional[int] = None
 
     def __post_init__(self):
         if isinstance(self.use_ssl, str):
@@ -74,6 +196,10 @@ class ConnectionConfig:
                 self.verify = True
             elif self.verify.lower() == "false":
                 self.verify = False
+        if self.retry_mode is not None and self.retry_mode not in RETRY_MODES:
+            raise ValueError(
+                f"Invalid retry_mode: {self.retry_mode}. Expected one of: {', '.join(RETRY_MODES)}"
+            )
 
 
 @dataobject
@@ -88,19 +214,101 @@ class ObjectStorageSettings:
         to partition saved files to different subfolders based on event_ts(). i.e. "%Y/%m/%d"
         will store each files in a folder `/year/month/day/`
     :field connection_config, `ConnectionConfig`: Connection configuration for S3 client.
+    :field throttling, Optional[ThrottlingSettings]: Enables client-side rate limiting of requests
+        per bucket and per key prefix, backing off automatically when S3 throttles requests.
+    :field shards, int: Number of hash-derived shard directories to spread keys across, placed
+        after `prefix` and before the partition folder, i.e. `prefix/0a/2020/05/01/key.json`.
+        S3 request limits apply per prefix, so sharding raises the write throughput available for
+        a single partition. Shard directories are handled transparently: locations returned by
+        `store`, `partition_key` arguments and listed `ItemLocator`s don't include them.
+        Default 0 disables sharding. Changing this value requires migrating existing data.
+    :field partitioning, List[`PartitionSettings`]: Partition strategies to use instead of
+        `partition_dateformat`: "date", "field" (i.e. by tenant) or "hash" partitions. When more
+        than one is specified, partitions are nested in the given order.
+    :field index, Optional[IndexSettings]: Enables an index of item ids to the partition where
+        they are stored, maintained on `store` and `delete`, so objects can be retrieved without
+        providing `partition_key`. Use `ObjectStorage.rebuild_index` to index existing data.
+    :field manifests, Optional[ManifestSettings]: Enables partition manifests: partitions sealed
+        using `ObjectStorage.seal_partition` are listed reading their manifest instead of
+        listing keys from S3.
+    :field segments, Optional[SegmentSettings]: Enables segment files: many small objects packed
+        into a single compressed object per partition with an embedded offset index, using
+        `ObjectStorage.segment_writer` or `store_segment`. Items are read using ranged GETs.
+    :field write_behind, Optional[WriteBehindSettings]: Enables write-behind: `store` and
+        `store_file` queue writes in memory and return immediately, while pending writes are
+        stored in the background. Use `ObjectStorage.flush` or `close` on shutdown.
+    :field spool, Optional[SpoolSettings]: Enables a durable local spool: `store` and
+        `store_file` append writes to a local journal and return immediately, while pending
+        writes are uploaded in the background with retries. Pending writes survive restarts.
+        Cannot be combined with `write_behind`.
+    :field dedup, Optional[DedupSettings]: Enables content-hash deduplication: `store` and
+        `store_file` skip uploading objects whose content didn't change. Also required to store
+        content-addressed files with `store_blob`.
+    :field uploads, Optional[UploadSettings]: Enables expiration of multipart upload sessions
+        created with `ObjectStorage.create_upload`: sessions not completed after `ttl` seconds
+        are aborted, so their parts are not stored anymore.
     """
 
     bucket: str
     connection_config: ConnectionConfig
     prefix: Optional[str] = None
     partition_dateformat: Optional[str] = None
+    throttling: Optional[ThrottlingSettings] = None
+    shards: int = 0
+    partitioning: List[PartitionSettings] = field(default_factory=list)
+    index: Optional[IndexSettings] = None
+    manifests: Optional[ManifestSettings] = None
+    segments: Optional[SegmentSettings] = None
+    write_behind: Optional[WriteBehindSettings] = None
+    spool: Optional[SpoolSettings] = None
+    dedup: Optional[DedupSettings] = None
+    uploads: Optional[UploadSettings] = None
 
 
 @dataobject
 @dataclass
-class ItemLocator:
+class ItemStat:
+    """
+    Metadata of a stored object or file, retrieved without downloading its content.
+
+    :field item_id, str: object key or file name.
+    :field partition_key, Optional[str]: partition where the item is stored.
+    :field size, int: size in bytes.
+    :field etag, Optional[str]: S3 ETag, None for writes pending in write-behind or spool.
+    :field last_modified, Optional[datetime]: last modified time, None for pending writes.
+    :field content_type, Optional[str]: content type set when the item was stored.
+    :field metadata, Dict[str, str]: user-defined object metadata.
+    """
+
     item_id: str
-    partition_key: Optional[str] = None
+    partition_key: Optional[str]
+    size: int
+    etag: Optional[str] = None
+    last_modified: Optional[datetime] = None
+    content_type: Optional[str] = None
+    metadata: Dict[str, str] = field(default_factory=dict)
+
+
+@dataobject
+@dataclass
+class PresignedRequest:
+    """
+    Presigned request, to transfer a file directly between a client and S3.
+
+    :field method, str: HTTP method to use: "GET", "PUT" or "POST".
+    :field url, str: presigned URL.
+    :field location, str: file location, relative to prefix, as returned by `store_file`.
+    :field expires_at, datetime: time after which the request is rejected by S3.
+    :field headers, Dict[str, str]: headers signed with the URL, that must be sent as given.
+    :field fields, Dict[str, str]: form fields to send before the file in POST uploads.
+    """
+
+    method: str
+    url: str
+    location: str
+    expires_at: datetime
+    headers: Dict[str, str] = field(default_factory=dict)
+    fields: Dict[str, str] = field(default_factory=dict)
 
 
 class ObjectStorage(Generic[DataObject]):
@@ -113,6 +321,16 @@ class ObjectStorage(Generic[DataObject]):
         bucket: str,
         prefix: Optional[str] = None,
         partition_dateformat: Optional[str] = None,
+        throttling: Optional[ThrottlingSettings] = None,
+        shards: int = 0,
+        partition_strategy: Optional[PartitionStrategy] = None,
+        index: Optional[IndexSettings] = None,
+        manifests: Optional[ManifestSettings] = None,
+        segments: Optional[SegmentSettings] = None,
+        write_behind: Optional[WriteBehindSettings] = None,
+        spool: Optional[SpoolSettings] = None,
+        dedup: Optional[DedupSettings] = None,
+        uploads: Optional[UploadSettings] = None,
     ):
         """
         Initialize ObjectStorage with the bucket name and optional partition_dateformat
@@ -121,13 +339,58 @@ class ObjectStorage(Generic[DataObject]):
         :param prefix, Optional[str]: Prefix to be used for every element (object or file) stored in the S3 bucket.
         :param partition_dateformat, Optional[str]: Optional format string for partitioning
             dates in the S3 bucket.
+        :param throttling, Optional[ThrottlingSettings]: Optional client-side rate limiting
+            settings.
+        :param shards, int: Number of hash-derived shard directories to spread keys across,
+            0 to disable sharding.
+        :param partition_strategy, Optional[PartitionStrategy]: Optional partition strategy,
+            takes precedence over `partition_dateformat`.
+        :param index, Optional[IndexSettings]: Optional item id to partition index settings.
+        :param manifests, Optional[ManifestSettings]: Optional partition manifests settings.
+        :param segments, Optional[SegmentSettings]: Optional segment files settings.
+        :param write_behind, Optional[WriteBehindSettings]: Optional write-behind settings.
+        :param spool, Optional[SpoolSettings]: Optional durable local spool settings.
+        :param dedup, Optional[DedupSettings]: Optional content-hash deduplication settings.
+        :param uploads, Optional[UploadSettings]: Optional multipart upload sessions settings.
         """
+        if write_behind and spool:
+            raise ValueError("Only one of `write_behind` or `spool` can be enabled")
         self.bucket: str = bucket
         self.prefix: Optional[str] = (prefix.rstrip("/") + "/") if prefix else None
         self.partition_dateformat: str = (partition_dateformat or "").strip("/")
+        self.partition_strategy: Optional[PartitionStrategy] = (
+            partition_strategy or build_partition_strategy(partition_dateformat, [])
+        )
+        self.shards: int = shards
+        self._index: Optional[ItemIndex] = ItemIndex(self.prefix, index) if index else None
+        self._manifests: Optional[ManifestCache] = (
+            ManifestCache(manifests.cache_size) if manifests else None
+        )
+        self._segments: Optional[SegmentSettings] = segments
+        self._segment_indexes: Optional[SegmentIndexCache] = (
+            SegmentIndexCache(segments.cache_size) if segments else None
+        )
+        self._write_behind: Optional[Union[WriteBehindBuffer, Spool]] = None
+        if write_behind:
+            self._write_behind = WriteBehindBuffer(write_behind, self._write_pending)
+        elif spool:
+            self._write_behind = get_spool(
+                spool, f"{bucket}/{self.prefix or ''}".rstrip("/"), self._write_pending
+            )
+        self._dedup: Optional[DedupSettings] = dedup
+        self._content_hashes: Optional[ContentHashCache] = (
+            ContentHashCache(dedup.cache_size) if dedup else None
+        )
+        self._dedup_stats = DedupStats()
+        self._uploads: Optional[UploadSettings] = uploads
+        self._uploads_gc_at = 0.0
         self._settings: ObjectStorageSettings
         self._conn_config: Dict[str, Any]
         self._session: Session = None
+        self._signing_client: Any = None
+        self._rate_limiter: Optional[RateLimiter] = (
+            get_rate_limiter(bucket, throttling) if throttling else None
+        )
 
     @classmethod
     def with_settings(
@@ -148,6 +411,18 @@ class ObjectStorage(Generic[DataObject]):
             bucket=settings.bucket,
             prefix=settings.prefix,
             partition_dateformat=settings.partition_dateformat,
+            throttling=settings.throttling,
+            shards=settings.shards,
+            partition_strategy=build_partition_strategy(
+                settings.partition_dateformat, settings.partitioning
+            ),
+            index=settings.index,
+            manifests=settings.manifests,
+            segments=settings.segments,
+            write_behind=settings.write_behind,
+            spool=settings.spool,
+            dedup=settings.dedup,
+            uploads=settings.uploads,
         )
         obj._settings = settings
         return obj
@@ -171,7 +446,21 @@ class ObjectStorage(Generic[DataObject]):
         self._conn_config = Payload.to_obj(  # type: ignore
             connection_config if connection_config else self._settings.connection_config
         )
+        retries = {
+            name: value
+            for name, value in (
+                ("mode", self._conn_config.pop("retry_mode", None)),
+                ("total_max_attempts", self._conn_config.pop("max_attempts", None)),
+            )
+            if value is not None
+        }
+        if retries:
+            self._conn_config["config"] = Config(retries=retries)  # type: ignore
         self._session = Session()
+        if self._rate_limiter is not None:
+            self._session.events.register("needs-retry.s3", self._rate_limiter.on_needs_retry)
+        if isinstance(self._write_behind, Spool):
+            self._write_behind.start()
         return self
 
     async def get(
@@ -186,15 +475,48 @@ class ObjectStorage(Generic[DataObject]):
 
         :param key, str
         :param datatype: dataclass implementing @dataobject (@see DataObject)
-        :param partition_key, Optional[str]: Optional partition key
+        :param partition_key, Optional[str]: Optional partition key. When index is enabled
+            and no `partition_key` is given, the partition is resolved using the index.
         :return: instance
         """
+        if partition_key is None and self._index is not None:
+            return await self._get_indexed(key, partial(self._get, key, datatype))
+        return await self._get(key, datatype, partition_key)
 
+    async def get_with_etag(
+        self,
+        key: str,
+        *,
+        datatype: Type[DataObject],
+        partition_key: Optional[str] = None,
+    ) -> Tuple[Optional[DataObject], Optional[str]]:
+        """
+        Retrieves value under specified key together with its ETag, to be updated
+        using `store(..., if_match=etag)`. Writes pending in write-behind or spool are
+        not returned, since their ETag is not known until stored.
+
+        :param key, str
+        :param datatype: dataclass implementing @dataobject (@see DataObject)
+        :param partition_key, Optional[str]: Optional partition key. When index is enabled
+            and no `partition_key` is given, the partition is resolved using the index.
+        :return: tuple of instance and ETag, or (None, None) if not found
+        """
+        if partition_key is None and self._index is not None:
+            found = await self._get_indexed(key, partial(self._get_with_etag, key, datatype))
+        else:
+            found = await self._get_with_etag(key, datatype, partition_key)
+        return found if found is not None else (None, None)
+
+    async def _get(self, key: str, datatype: Type[DataObject], partition_key: Optional[str]):
+        key = self._build_key(partition_key=partition_key, key=key + SUFFIX)
+        pending = await self._write_behind.read(key) if self._write_behind else None
+        if pending is not None:
+            return Payload.from_json(pending, datatype)
         async with self._session.client(S3, **self._conn_config) as object_storage:
-            key = self._build_key(partition_key=partition_key, key=key)
             try:
                 file_obj = BytesIO()
-                await object_storage.download_fileobj(self.bucket, key + SUFFIX, file_obj)
+                async with self._limit(key):
+                    await object_storage.download_fileobj(self.bucket, key, file_obj)
                 obj = file_obj.getvalue()
                 if len(obj):
                     return Payload.from_json(obj, datatype)
@@ -204,6 +526,143 @@ class ObjectStorage(Generic[DataObject]):
                     return None
                 raise e
 
+    async def _get_with_etag(
+        self, key: str, datatype: Type[DataObject], partition_key: Optional[str]
+    ) -> Optional[Tuple[Any, str]]:
+        key = self._build_key(partition_key=partition_key, key=key + SUFFIX)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            try:
+                async with self._limit(key):
+                    obj = await object_storage.get_object(Bucket=self.bucket, Key=key)
+                    data = await obj["Body"].read()
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "NoSuchKey":
+                    return None
+                raise e
+        return Payload.from_json(data, datatype), obj["ETag"]
+
+    async def _get_indexed(self, key: str, get: Callable[[Optional[str]], Awaitable[Any]]):
+        """
+        Calls `get` with the partition of `key` resolved by the index, refreshing
+        locally cached partition if the object is not found there.
+        """
+        assert self._index is not None
+        partition_key = self._index.cached(key)
+        if partition_key is not None:
+            value = await get(partition_key)
+            if value is not None:
+                return value
+            self._index.evict(key)
+        partition_key = await self._read_index_entry(key)
+        if partition_key is None:
+            return None
+        return await get(partition_key)
+
+    async def exists(self, key: str, *, partition_key: Optional[str] = None) -> bool:
+        """
+        Checks if object `key` exists, using a HEAD request.
+
+        :param key, str: object id
+        :param partition_key, Optional[str]: Optional partition key. When index is enabled
+            and no `partition_key` is given, the partition is resolved using the index.
+        :return: True if the object exists
+        """
+        return await self.stat(key, partition_key=partition_key) is not None
+
+    async def stat(self, key: str, *, partition_key: Optional[str] = None) -> Optional[ItemStat]:
+        """
+        Retrieves metadata of object `key` using a HEAD request, without downloading it.
+
+        :param key, str: object id
+        :param partition_key, Optional[str]: Optional partition key. When index is enabled
+            and no `partition_key` is given, the partition is resolved using the index.
+        :return: `ItemStat`, or None if not found
+        """
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            return await self._stat_item(object_storage, key, partition_key, SUFFIX)
+
+    async def stat_file(
+        self, file_name: str, *, partition_key: Optional[str] = None
+    ) -> Optional[ItemStat]:
+        """
+        Retrieves metadata of file `file_name` using a HEAD request, without downloading it.
+
+        :param file_name, str: file name
+        :param partition_key, Optional[str]: Optional partition key.
+        :return: `ItemStat`, or None if not found
+        """
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            return await self._stat(object_storage, file_name, partition_key, "")
+
+    async def stat_many(
+        self, items: Sequence[ItemLocator], *, files: bool = False, concurrency: int = 16
+    ) -> List[Optional[ItemStat]]:
+        """
+        Retrieves metadata of many objects or files, sending up to `concurrency`
+        HEAD requests at the same time.
+
+        :param items: `ItemLocator` of the items, as returned by listings.
+        :param files, bool: True if items are files, False for objects.
+        :param concurrency, int: max number of concurrent requests.
+        :return: `ItemStat`, or None if not found, for each item in the same order.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+        suffix = "" if files else SUFFIX
+
+        async def stat(object_storage: Any, item: ItemLocator) -> Optional[ItemStat]:
+            async with semaphore:
+                if files:
+                    return await self._stat(
+                        object_storage, item.item_id, item.partition_key, suffix
+                    )
+                return await self._stat_item(
+                    object_storage, item.item_id, item.partition_key, suffix
+                )
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            return list(await asyncio.gather(*(stat(object_storage, item) for item in items)))
+
+    async def locate(self, key: str) -> Optional[ItemLocator]:
+        """
+        Resolves the location of object `key` using the index.
+
+        :param key, str: object id
+        :return: `ItemLocator` for the object, or None if `key` is not indexed
+        """
+        assert self._index is not None, "Index is not enabled in ObjectStorageSettings"
+        partition_key = self._index.cached(key)
+        if partition_key is None:
+            partition_key = await self._read_index_entry(key)
+        if partition_key is None:
+            return None
+        return ItemLocator(item_id=key, partition_key=partition_key or None)
+
+    async def rebuild_index(self) -> int:
+        """
+        Rebuilds the index listing all stored objects. When the same item id is found in
+        more than one partition, the last listed partition is indexed.
+
+        :return: number of indexed items
+        """
+        assert self._index is not None, "Index is not enabled in ObjectStorageSettings"
+        partitions: Dict[str, str] = {}
+        for item in await self.list_objects(recursive=True):
+            partitions[item.item_id] = item.partition_key or ""
+        semaphore = asyncio.Semaphore(self._index.settings.rebuild_concurrency)
+
+        async def write_entry(object_storage: Any, item_id: str, partition_key: str) -> None:
+            async with semaphore:
+                await self._write_index_entry(object_storage, item_id, partition_key)
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            await asyncio.gather(
+                *(
+                    write_entry(object_storage, item_id, partition_key)
+                    for item_id, partition_key in partitions.items()
+                )
+            )
+        return len(partitions)
+
     async def get_file(
         self,
         file_name: str,
@@ -217,11 +676,14 @@ class ObjectStorage(Generic[DataObject]):
         :param partition_key, Optional[str]: Optional partition key
         :return: The contents of the requested file as bytes, or None if the file does not exist
         """
-
+        file_name = self._build_key(partition_key=partition_key, key=file_name)
+        pending = await self._write_behind.read(file_name) if self._write_behind else None
+        if pending is not None:
+            return pending
         async with self._session.client(S3, **self._conn_config) as object_storage:
-            file_name = self._build_key(partition_key=partition_key, key=file_name)
             try:
-                obj = await object_storage.get_object(Bucket=self.bucket, Key=file_name)
+                async with self._limit(file_name):
+                    obj = await object_storage.get_object(Bucket=self.bucket, Key=file_name)
                 ret = BytesIO()
                 async for chunk in obj["Body"]:
                     ret.write(chunk)
@@ -236,12 +698,15 @@ class ObjectStorage(Generic[DataObject]):
         file_name: str,
         *,
         partition_key: Optional[str] = None,
+        chunk_size: Optional[int] = None,
     ) -> AsyncIterator[Tuple[Optional[bytes], int]]:
         """
         Download an object from S3 to a file-like object
 
         :param file_name str: object id
         :param partition_key, Optional[str]: Optional partition key.
+        :param chunk_size, Optional[int]: Optional size in bytes of yielded chunks,
+            by default botocore streaming body chunk size is used.
 
         The file-like object must be in binary mode.
         This is a managed transfer which will perform a multipart download in multiple threads if necessary
@@ -249,13 +714,18 @@ class ObjectStorage(Generic[DataObject]):
             with open('filename', 'wb') as data:
                 object_storage.get_file_chunked('mykey', data)
         """
-
+        file_name = self._build_key(partition_key=partition_key, key=file_name)
+        pending = await self._write_behind.read(file_name) if self._write_behind else None
+        if pending is not None:
+            yield pending, len(pending)
+            return
         async with self._session.client(S3, **self._conn_config) as object_storage:
-            file_name = self._build_key(partition_key=partition_key, key=file_name)
             try:
-                obj = await object_storage.get_object(Bucket=self.bucket, Key=file_name)
+                async with self._limit(file_name):
+                    obj = await object_storage.get_object(Bucket=self.bucket, Key=file_name)
                 content_length = obj["ContentLength"]
-                async for chunk in obj["Body"]:
+                body = obj["Body"].iter_chunks(chunk_size) if chunk_size else obj["Body"]
+                async for chunk in body:
                     yield chunk, content_length
             except ClientError as e:
                 if e.response["Error"]["Code"] == "NoSuchKey":
@@ -263,81 +733,491 @@ class ObjectStorage(Generic[DataObject]):
                 else:
                     raise e
 
-    async def store(self, *, key: str, value: DataObject) -> str:
+    async def store(
+        self,
+        *,
+        key: str,
+        value: DataObject,
+        if_match: Optional[str] = None,
+        if_none_match: Optional[str] = None,
+    ) -> str:
         """
         Upload a @dataobject object to S3
 
         :param key: object id
         :param value: hopeit @dataobject
+        :param if_match, Optional[str]: stores the object only if its current ETag, as returned
+            by `get_with_etag`, matches this value.
+        :param if_none_match, Optional[str]: use "*" to store the object only if it doesn't exist.
+        :return: object location. With write-behind or spool enabled, the object is stored
+            in background, except for conditional writes that are always stored before returning.
+        :raise PreconditionFailed: when `if_match` or `if_none_match` conditions are not met.
         """
-        async with self._session.client(S3, **self._conn_config) as object_storage:
-            partition_key = None
-            if self.partition_dateformat:
-                partition_key = get_partition_key(value, self.partition_dateformat)
-
-            key = self._build_key(partition_key=partition_key, key=f"{key}{SUFFIX}")
-            await object_storage.upload_fileobj(
-                BytesIO(Payload.to_json(value).encode()),
-                Bucket=self.bucket,
-                Key=key,
+        partition_key = None
+        if self.partition_strategy:
+            partition_key = self.partition_strategy.partition_key(key, value, None)
+        item_key = self._build_key(partition_key=partition_key, key=f"{key}{SUFFIX}")
+        data = Payload.to_json(value).encode()
+        if if_match is not None or if_none_match is not None:
+            return await self._store_conditional(
+                key, partition_key, item_key, data, if_match, if_none_match
             )
-            return self._prune_prefix(key)
+        if self._write_behind is not None:
+            if await self._unchanged(None, item_key, data):
+                return self._prune_prefix(item_key)
+            if await self._write_behind.put(
+                PendingWrite(item_key, data, key, (partition_key or "").rstrip("/"))
+            ):
+                if self._index is not None:
+                    self._index.update(key, (partition_key or "").rstrip("/"))
+                return self._prune_prefix(item_key)
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            if self._write_behind is None and await self._unchanged(object_storage, item_key, data):
+                return self._prune_prefix(item_key)
+            async with self._limit(item_key):
+                await object_storage.upload_fileobj(
+                    BytesIO(data),
+                    Bucket=self.bucket,
+                    Key=item_key,
+                    **self._upload_args(data),
+                )
+            self._cache_hash(item_key, data)
+            if self._index is not None:
+                await self._write_index_entry(
+                    object_storage, key, (partition_key or "").rstrip("/")
+                )
+            return self._prune_prefix(item_key)
 
-    async def store_file(self, *, file_name: str, value: Union[bytes, IO[bytes], Any]) -> str:
+    async def store_file(
+        self,
+        *,
+        file_name: str,
+        value: Union[bytes, IO[bytes], Any],
+        partition_values: Optional[Dict[str, Any]] = None,
+    ) -> str:
         """
         Stores bytes or a file-like object.
 
         :param file_name, str
         :param value, Union[bytes, any]: bytes or a file-like object to store, it must
             implement the read method and must return bytes.
-        :return, str: file location
+        :param partition_values, Optional[Dict[str, Any]]: values used by partition strategy,
+            i.e. {"ts": datetime, "tenant": "acme"}. By default date partitions use current time.
+        :return, str: file location. With write-behind or spool enabled, `bytes` values are stored
+            in background, while file-like objects are always stored before returning.
         """
+        partition_key = None
+        if self.partition_strategy:
+            partition_key = self.partition_strategy.partition_key(file_name, None, partition_values)
+        key = self._build_key(partition_key=partition_key, key=file_name)
+        if self._write_behind is not None and isinstance(value, bytes):
+            if await self._unchanged(None, key, value):
+                return self._prune_prefix(key)
+            if await self._write_behind.put(PendingWrite(key, value)):
+                return self._prune_prefix(key)
+
         async with self._session.client(S3, **self._conn_config) as object_storage:
-            partition_key = None
-            if self.partition_dateformat:
-                partition_key = get_file_partition_key(self.partition_dateformat)
-            key = self._build_key(partition_key=partition_key, key=file_name)
             if isinstance(value, bytes):
-                await object_storage.upload_fileobj(
-                    BytesIO(value),
-                    Bucket=self.bucket,
-                    Key=key,
-                )
+                if self._write_behind is None and await self._unchanged(object_storage, key, value):
+                    return self._prune_prefix(key)
+                async with self._limit(key):
+                    await object_storage.upload_fileobj(
+                        BytesIO(value),
+                        Bucket=self.bucket,
+                        Key=key,
+                        **self._upload_args(value),
+                    )
+                self._cache_hash(key, value)
             else:
-                await object_storage.upload_fileobj(
-                    value,
+                if self._content_hashes is not None:
+                    self._content_hashes.evict(key)
+                async with self._limit(key):
+                    await object_storage.upload_fileobj(
+                        value,
+                        Bucket=self.bucket,
+                        Key=key,
+                    )
+        return self._prune_prefix(key)
+
+    def presign_get(
+        self,
+        file_name: str,
+        *,
+        partition_key: Optional[str] = None,
+        expires_in: int = 3600,
+        content_type: Optional[str] = None,
+        content_disposition: Optional[str] = None,
+    ) -> PresignedRequest:
+        """
+        Creates a presigned GET request, so clients download a file directly from S3.
+        Signing is computed locally, no requests are sent to S3.
+
+        :param file_name, str: file name.
+        :param partition_key, Optional[str]: partition where the file is stored.
+        :param expires_in, int: seconds the request is valid for.
+        :param content_type, Optional[str]: `Content-Type` S3 sets in the response.
+        :param content_disposition, Optional[str]: `Content-Disposition` S3 sets in the
+            response, i.e. 'attachment; filename="file.png"'.
+        :return: `PresignedRequest` to download the file.
+        """
+        key = self._build_key(partition_key=partition_key, key=file_name)
+        params = {"Bucket": self.bucket, "Key": key}
+        if content_type:
+            params["ResponseContentType"] = content_type
+        if content_disposition:
+            params["ResponseContentDisposition"] = content_disposition
+        return PresignedRequest(
+            method="GET",
+            url=self._signer().generate_presigned_url(
+                "get_object", Params=params, ExpiresIn=expires_in
+            ),
+            location=self._prune_prefix(key),
+            expires_at=_expires_at(expires_in),
+        )
+
+    def presign_put(
+        self,
+        file_name: str,
+        *,
+        partition_values: Optional[Dict[str, Any]] = None,
+        expires_in: int = 3600,
+        content_type: Optional[str] = None,
+    ) -> PresignedRequest:
+        """
+        Creates a presigned PUT request, so clients upload a file directly to S3, stored
+        in the partition computed as in `store_file`. Signing is computed locally.
+
+        :param file_name, str: file name.
+        :param partition_values, Optional[Dict[str, Any]]: values used by partition strategy,
+            by default date partitions use current time.
+        :param expires_in, int: seconds the request is valid for.
+        :param content_type, Optional[str]: content type the client must upload.
+        :return: `PresignedRequest` to upload the file, with headers the client must send.
+        """
+        key = self._presigned_upload_key(file_name, partition_values)
+        params = {"Bucket": self.bucket, "Key": key}
+        headers: Dict[str, str] = {}
+        if content_type:
+            params["ContentType"] = headers["Content-Type"] = content_type
+        return PresignedRequest(
+            method="PUT",
+            url=self._signer().generate_presigned_url(
+                "put_object", Params=params, ExpiresIn=expires_in
+            ),
+            location=self._prune_prefix(key),
+            expires_at=_expires_at(expires_in),
+            headers=headers,
+        )
+
+    def presign_post(
+        self,
+        file_name: str,
+        *,
+        partition_values: Optional[Dict[str, Any]] = None,
+        expires_in: int = 3600,
+        content_type: Optional[str] = None,
+        max_size: Optional[int] = None,
+    ) -> PresignedRequest:
+        """
+        Creates a presigned POST request, so browsers upload a file directly to S3 using
+        a html form. Unlike PUT, S3 enforces content constraints. Signing is computed locally.
+
+        :param file_name, str: file name.
+        :param partition_values, Optional[Dict[str, Any]]: values used by partition strategy,
+            by default date partitions use current time.
+        :param expires_in, int: seconds the request is valid for.
+        :param content_type, Optional[str]: content type the client must upload.
+        :param max_size, Optional[int]: max allowed file size in bytes.
+        :return: `PresignedRequest` with form `fields` to send before the file.
+        """
+        key = self._presigned_upload_key(file_name, partition_values)
+        fields: Dict[str, str] = {}
+        conditions: List[Any] = []
+        if content_type:
+            fields["Content-Type"] = content_type
+            conditions.append({"Content-Type": content_type})
+        if max_size is not None:
+            conditions.append(["content-length-range", 0, max_size])
+        post = self._signer().generate_presigned_post(
+            self.bucket, key, Fields=fields, Conditions=conditions, ExpiresIn=expires_in
+        )
+        return PresignedRequest(
+            method="POST",
+            url=post["url"],
+            location=self._prune_prefix(key),
+            expires_at=_expires_at(expires_in),
+            fields=post["fields"],
+        )
+
+    async def create_upload(
+        self,
+        file_name: str,
+        *,
+        partition_values: Optional[Dict[str, Any]] = None,
+        content_type: Optional[str] = None,
+    ) -> UploadSession:
+        """
+        Creates a multipart upload session, so clients upload parts of a file in parallel using
+        `presign_upload_part` and resume interrupted uploads checking `list_upload_parts`.
+        The file is stored in the partition computed as in `store_file` once the session is
+        completed using `complete_upload`. When `ObjectStorageSettings.uploads` is enabled,
+        sessions abandoned for longer than `ttl` are aborted.
+
+        :param file_name, str: file name.
+        :param partition_values, Optional[Dict[str, Any]]: values used by partition strategy,
+            by default date partitions use current time.
+        :param content_type, Optional[str]: content type of the stored file.
+        :return: `UploadSession` to be used by the client to upload parts and complete it.
+        """
+        if self._uploads is not None and time.monotonic() >= self._uploads_gc_at:
+            self._uploads_gc_at = time.monotonic() + self._uploads.gc_interval
+            await self.abort_stale_uploads(timedelta(seconds=self._uploads.ttl))
+        partition_key = None
+        if self.partition_strategy:
+            partition_key = self.partition_strategy.partition_key(
+                file_name, None, partition_values
+            ).rstrip("/")
+        key = self._build_key(partition_key=partition_key, key=file_name)
+        args = {"ContentType": content_type} if content_type else {}
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(key):
+                result = await object_storage.create_multipart_upload(
+                    Bucket=self.bucket, Key=key, **args
+                )
+        created = datetime.now(tz=timezone.utc)
+        return UploadSession(
+            upload_id=result["UploadId"],
+            file_name=file_name,
+            partition_key=partition_key or None,
+            location=self._prune_prefix(key),
+            created=created,
+            expires_at=(created + timedelta(seconds=self._uploads.ttl) if self._uploads else None),
+        )
+
+    def presign_upload_part(
+        self, session: UploadSession, part_number: int, *, expires_in: int = 3600
+    ) -> PresignedRequest:
+        """
+        Creates a presigned PUT request to upload a part of a multipart upload session.
+        Parts can be uploaded in parallel and in any order, all parts except the last one
+        must be at least 5 MB. Signing is computed locally.
+
+        :param session, UploadSession: session returned by `create_upload`.
+        :param part_number, int: part number, from 1 to 10000. Parts are joined in this order.
+        :param expires_in, int: seconds the request is valid for.
+        :return: `PresignedRequest` to upload the part. S3 returns the part ETag header.
+        """
+        if not 1 <= part_number <= MAX_PARTS:
+            raise ValueError(f"part_number must be between 1 and {MAX_PARTS}: {part_number}")
+        key = self._build_key(partition_key=session.partition_key, key=session.file_name)
+        return PresignedRequest(
+            method="PUT",
+            url=self._signer().generate_presigned_url(
+                "upload_part",
+                Params={
+                    "Bucket": self.bucket,
+                    "Key": key,
+                    "UploadId": session.upload_id,
+                    "PartNumber": part_number,
+                },
+                ExpiresIn=expires_in,
+            ),
+            location=session.location,
+            expires_at=_expires_at(expires_in),
+        )
+
+    async def list_upload_parts(self, session: UploadSession) -> List[UploadPart]:
+        """
+        Lists parts already uploaded to a multipart upload session, so an interrupted
+        upload can be resumed uploading only missing parts.
+
+        :param session, UploadSession: session returned by `create_upload`.
+        :return: uploaded `UploadPart`s sorted by part number.
+        """
+        key = self._build_key(partition_key=session.partition_key, key=session.file_name)
+        list_args: Dict[str, Any] = {
+            "Bucket": self.bucket,
+            "Key": key,
+            "UploadId": session.upload_id,
+        }
+        parts: List[UploadPart] = []
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            while True:
+                async with self._limit(key):
+                    result = await object_storage.list_parts(**list_args)
+                parts.extend(
+                    UploadPart(
+                        part_number=part["PartNumber"],
+                        size=part["Size"],
+                        etag=part["ETag"].strip('"'),
+                    )
+                    for part in result.get("Parts", [])
+                )
+                if not result.get("IsTruncated"):
+                    break
+                list_args["PartNumberMarker"] = result["NextPartNumberMarker"]
+        return parts
+
+    async def complete_upload(
+        self, session: UploadSession, parts: Optional[List[UploadPart]] = None
+    ) -> str:
+        """
+        Completes a multipart upload session, joining uploaded parts into the stored file.
+
+        :param session, UploadSession: session returned by `create_upload`.
+        :param parts, Optional[List[UploadPart]]: parts to join, as recorded by the client.
+            By default, every uploaded part listed using `list_upload_parts` is joined.
+        :return, str: file location, as returned by `store_file`.
+        """
+        if parts is None:
+            parts = await self.list_upload_parts(session)
+        if not parts:
+            raise ValueError(f"No parts uploaded to upload session: {session.location}")
+        key = self._build_key(partition_key=session.partition_key, key=session.file_name)
+        if self._content_hashes is not None:
+            self._content_hashes.evict(key)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(key):
+                await object_storage.complete_multipart_upload(
                     Bucket=self.bucket,
                     Key=key,
+                    UploadId=session.upload_id,
+                    MultipartUpload={
+                        "Parts": [
+                            {"PartNumber": part.part_number, "ETag": part.etag}
+                            for part in sorted(parts, key=lambda part: part.part_number)
+                        ]
+                    },
+                )
+        return session.location
+
+    async def abort_upload(self, session: UploadSession) -> None:
+        """
+        Aborts a multipart upload session, removing parts already uploaded.
+
+        :param session, UploadSession: session returned by `create_upload`.
+        """
+        key = self._build_key(partition_key=session.partition_key, key=session.file_name)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(key):
+                await object_storage.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=session.upload_id
+                )
+
+    async def abort_stale_uploads(self, older_than: timedelta, *, concurrency: int = 16) -> int:
+        """
+        Aborts multipart uploads under prefix created more than `older_than` ago and not
+        completed, so their parts are not stored anymore. Called automatically when creating
+        sessions if `ObjectStorageSettings.uploads` is enabled.
+
+        :param older_than, timedelta: age of uploads to abort.
+        :param concurrency, int: max number of concurrent abort requests.
+        :return: number of aborted uploads.
+        """
+        cutoff = datetime.now(tz=timezone.utc) - older_than
+        prefix = self.prefix or ""
+        list_args: Dict[str, Any] = {"Bucket": self.bucket, "Prefix": prefix}
+        stale: List[Tuple[str, str]] = []
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def abort(object_storage: Any, key: str, upload_id: str) -> None:
+            async with semaphore, self._limit(key):
+                await object_storage.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
                 )
-        return self._prune_prefix(key)
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            while True:
+                async with self._limit(prefix):
+                    result = await object_storage.list_multipart_uploads(**list_args)
+                stale.extend(
+                    (upload["Key"], upload["UploadId"])
+                    for upload in result.get("Uploads", [])
+                    if upload["Initiated"] < cutoff
+                )
+                if not result.get("IsTruncated"):
+                    break
+                list_args["KeyMarker"] = result["NextKeyMarker"]
+                list_args["UploadIdMarker"] = result["NextUploadIdMarker"]
+            await asyncio.gather(
+                *(abort(object_storage, key, upload_id) for key, upload_id in stale)
+            )
+        return len(stale)
 
     async def list_objects(
-        self, wildcard: str = "*", *, recursive: bool = False
+        self,
+        wildcard: str = "*",
+        *,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_since: Optional[datetime] = None,
     ) -> List[ItemLocator]:
         """
         Retrieves list of objects keys from the object storage
 
         :param wildcard: allow filter the listing of objects
-        :return: List of `ItemLocator` with objects location info
+        :param partition_values, Optional[Dict[str, Any]]: prunes listing to the partition
+            derived from these values, `wildcard` is then relative to that partition folder.
+        :param min_size, Optional[int]: lists only objects with at least this size in bytes.
+        :param max_size, Optional[int]: lists only objects with at most this size in bytes.
+        :param modified_since, Optional[datetime]: lists only objects modified at or after
+            this time.
+        :return: List of `ItemLocator` with objects location and metadata info
+        """
+        return (
+            await self.list_objects_compact(
+                wildcard,
+                recursive=recursive,
+                partition_values=partition_values,
+                min_size=min_size,
+                max_size=max_size,
+                modified_since=modified_since,
+            )
+        ).to_list()
+
+    async def list_objects_compact(
+        self,
+        wildcard: str = "*",
+        *,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_since: Optional[datetime] = None,
+    ) -> CompactListing:
+        """
+        Same as `list_objects`, returning a `CompactListing` that keeps listed keys in shared
+        buffers and creates `ItemLocator`s only on access, to list millions of objects.
         """
-        wildcard = wildcard + SUFFIX
-        n_part_comps = len(self.partition_dateformat.split("/"))
-        item_list = []
-        async for key in self._aioglob(wildcard, recursive):
-            item_list.append(key)
-        return [self._get_item_locator(item_path, n_part_comps, SUFFIX) for item_path in item_list]
+        wildcard = self._partition_wildcard(wildcard, partition_values) + SUFFIX
+        return await self._list_compact(
+            wildcard, recursive, SUFFIX, min_size, max_size, modified_since
+        )
 
     async def delete(self, *keys: str, partition_key: Optional[str] = None):
         """
         Delete specified keys
 
         :param keys: str, keys to be deleted
-        :param partition_key, Optional[str]: Optional partition key
+        :param partition_key, Optional[str]: Optional partition key. When index is enabled
+            and no `partition_key` is given, the partition of each key is resolved using the index.
         """
         async with self._session.client(S3, **self._conn_config) as object_storage:
             for key in keys:
-                key = self._build_key(partition_key=partition_key, key=key + SUFFIX)
-                await object_storage.delete_object(Bucket=self.bucket, Key=key)
+                item_partition_key = partition_key
+                if item_partition_key is None and self._index is not None:
+                    item_partition_key = self._pending_partition(key)
+                    if item_partition_key is None:
+                        item_partition_key = await self._read_index_entry(key)
+                item_key = self._build_key(partition_key=item_partition_key, key=key + SUFFIX)
+                await self._discard_pending(item_key)
+                async with self._limit(item_key):
+                    await object_storage.delete_object(Bucket=self.bucket, Key=item_key)
+                if self._index is not None:
+                    await self._remove_index_entry(object_storage, key, item_partition_key or "")
 
     async def delete_files(self, *file_names: str, partition_key: Optional[str] = None):
         """
@@ -349,132 +1229,1960 @@ class ObjectStorage(Generic[DataObject]):
         async with self._session.client(S3, **self._conn_config) as object_storage:
             for key in file_names:
                 key = self._build_key(partition_key=partition_key, key=key)
-                await object_storage.delete_object(Bucket=self.bucket, Key=key)
+                await self._discard_pending(key)
+                async with self._limit(key):
+                    await object_storage.delete_object(Bucket=self.bucket, Key=key)
 
-    async def list_files(
-        self, wildcard: str = "*", *, recursive: bool = False
-    ) -> List[ItemLocator]:
+    async def copy(
+        self,
+        src: ItemLocator,
+        dst: ItemLocator,
+        *,
+        files: bool = False,
+        target: Optional["ObjectStorage"] = None,
+        concurrency: int = 8,
+    ) -> Optional[ItemLocator]:
         """
-        Retrieves list of files_names from the object storage
-
-        :param wildcard, str: allow filter the listing of objects
-        :return: List of `ItemLocator` with file location info
+        Copies an object or file server-side, without downloading its content. Objects larger
+        than 5 GB are copied using a multipart upload with parts copied in parallel.
+        Content type and metadata are kept.
+
+        :param src: `ItemLocator` of the source item. When index is enabled and no
+            `partition_key` is given, the partition of objects is resolved using the index.
+        :param dst: `ItemLocator` with the id and partition of the copy.
+        :param files, bool: True if items are files, False for objects.
+        :param target, Optional[ObjectStorage]: storage where the copy is stored, to copy
+            across buckets or prefixes. Must be reachable using this storage connection.
+            By default the copy is stored in this storage.
+        :param concurrency, int: max number of parts copied at the same time for large items.
+        :return: `ItemLocator` of the copy, or None if the source was not found.
         """
-        n_part_comps = len(self.partition_dateformat.split("/"))
-        item_list = []
-        async for key in self._aioglob(wildcard, recursive):
-            item_list.append(key)
-        return [self._get_item_locator(item_path, n_part_comps) for item_path in item_list]
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            copied = await self._copy_item(
+                object_storage, src, dst, files, target or self, concurrency
+            )
+        return copied[1] if copied else None
 
-    def partition_key(self, path: str) -> str:
+    async def move(
+        self,
+        src: ItemLocator,
+        dst: ItemLocator,
+        *,
+        files: bool = False,
+        target: Optional["ObjectStorage"] = None,
+        concurrency: int = 8,
+    ) -> Optional[ItemLocator]:
         """
-        Get the partition key for a given path.
+        Moves an object or file server-side: copies it using `copy` and deletes the source.
 
-        :param path, str
-        :return str: the extracted partition key.
+        :return: `ItemLocator` of the moved item, or None if the source was not found.
         """
-        partition_key = ""
-        if self.partition_dateformat:
-            partition_key = path.rsplit("/", 1)[0]
-        return partition_key
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            copied = await self._copy_item(
+                object_storage, src, dst, files, target or self, concurrency
+            )
+        if copied is None:
+            return None
+        await self._delete_source(copied, files, target or self)
+        return copied[1]
 
-    async def create_bucket(self, exist_ok: bool = False):
+    async def copy_many(
+        self,
+        items: Sequence[Tuple[ItemLocator, ItemLocator]],
+        *,
+        files: bool = False,
+        target: Optional["ObjectStorage"] = None,
+        concurrency: int = 16,
+    ) -> List[Optional[ItemLocator]]:
         """
-        Creates a bucket in the ObjectStorage if it doesn't already exist,
-        based on the `check_if_exists` parameter.
-
-        Note: The `create_bucket` method is provided for convenience and should be avoided in production environments.
-
-        :param bucket, str: The name of the bucket to create.
-        :param exist_ok, bool: If False, raises an error if the bucket already exists (default is False).
+        Copies many objects or files server-side, running up to `concurrency` copies
+        at the same time.
+
+        :param items: source and destination `ItemLocator` pairs.
+        :param files, bool: True if items are files, False for objects.
+        :param target, Optional[ObjectStorage]: storage where copies are stored.
+        :param concurrency, int: max number of concurrent copies.
+        :return: `ItemLocator` of each copy, or None if its source was not found,
+            in the same order as `items`.
         """
+        copied = await self._copy_many(items, files, target or self, concurrency)
+        return [item[1] if item else None for item in copied]
 
-        region_name = os.getenv("AWS_DEFAULT_REGION")
-        if region_name and self._conn_config.get("region_name") is None:
-            self._conn_config["region_name"] = region_name
-
-        kwargs = (
-            {"CreateBucketConfiguration": {"LocationConstraint": self._conn_config["region_name"]}}
-            if self._conn_config.get("region_name") is not None
-            else {}
-        )
-
-        async with self._session.client("s3", **self._conn_config) as object_storage:
-            if exist_ok:
-                try:
-                    await object_storage.head_bucket(Bucket=self.bucket)
-                    return
-                except ClientError as e:
-                    if e.response["Error"]["Code"] != "404":
-                        raise e
-            try:
-                await object_storage.create_bucket(Bucket=self.bucket, **kwargs)
-            except ClientError as e:
-                raise e
-
-    async def _aioglob(
+    async def move_many(
         self,
-        wildcard: Optional[str] = None,
-        recursive: bool = False,
-    ) -> AsyncGenerator[str, None]:
+        items: Sequence[Tuple[ItemLocator, ItemLocator]],
+        *,
+        files: bool = False,
+        target: Optional["ObjectStorage"] = None,
+        concurrency: int = 16,
+    ) -> List[Optional[ItemLocator]]:
         """
-        A generator function similar to `glob` that lists files in an S3 bucket
-
-        :param wildcard, Optional[str]: Pattern to match file keys against.
-        :param recursive, bool: If True, lists files recursively.
+        Moves many objects or files server-side using `copy_many`, deleting sources
+        successfully copied.
 
-        :yields: str: The keys of the files that match the criteria.
+        :return: `ItemLocator` of each moved item, or None if its source was not found,
+            in the same order as `items`.
         """
-        async with self._session.client(S3, **self._conn_config) as object_storage:
-            prefix = self.prefix or ""
-
-            if wildcard:
-                dir_path = Path(wildcard).parent
-                if dir_path != Path("."):
-                    prefix += f"{dir_path}/"
-
-            paginator = object_storage.get_paginator("list_objects_v2")
-            async for result in paginator.paginate(
-                Bucket=self.bucket,
-                Prefix=prefix,
-                Delimiter="" if recursive else "/",
-            ):
-                for content in result.get("Contents", []):
-                    key = content["Key"]
-                    if wildcard and not fnmatch.fnmatch(
-                        key, self._build_key(partition_key=None, key=wildcard)
-                    ):
-                        continue
-                    yield self._prune_prefix(key)
+        copied = await self._copy_many(items, files, target or self, concurrency)
+        for item in copied:
+            if item is not None:
+                await self._delete_source(item, files, target or self)
+        return [item[1] if item else None for item in copied]
 
-    def _build_key(self, partition_key: Optional[str], key: str) -> str:
+    async def purge(
+        self,
+        older_than: Union[datetime, timedelta],
+        *,
+        dry_run: bool = False,
+        concurrency: int = 16,
+    ) -> PurgeResult:
         """
-        Build the key based on the prefix, partition key, and base key.
-
-        :param partition_key: Optional[str]: The partition key to add to the key.
-        :param key: str: The base file key.
-        :return: The constructed file key.
+        Deletes objects and files stored in date partitions older than `older_than`.
+
+        Expired partitions are found listing partition folders level by level, skipping
+        folders that are not expired, so live data is never listed. Objects and files in
+        expired partitions are deleted with concurrent `delete_objects` requests of up to
+        1000 keys, together with their index entries and partition manifests.
+
+        :param older_than: cutoff time, or age relative to current time. Partitions whose
+            date period ends before the cutoff are purged.
+        :param dry_run, bool: if True, nothing is deleted and the result reports what
+            would be purged.
+        :param concurrency, int: max number of concurrent listing and delete requests.
+        :return: `PurgeResult` with expired partitions, number of items and bytes freed.
+        """
+        if not has_date_partition(self.partition_strategy):
+            raise ValueError("purge requires a date partition in ObjectStorageSettings")
+        cutoff = (
+            datetime.now(tz=timezone.utc) - older_than
+            if isinstance(older_than, timedelta)
+            else older_than
+        )
+        if cutoff.tzinfo is None:
+            cutoff = cutoff.replace(tzinfo=timezone.utc)
+        result = PurgeResult(cutoff=cutoff, dry_run=dry_run)
+        semaphore = asyncio.Semaphore(concurrency)
+        shards = get_shard_keys(self.shards) if self.shards else [""]
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            expired = await asyncio.gather(
+                *(
+                    self._expired_folders(object_storage, shard, cutoff, semaphore)
+                    for shard in shards
+                )
+            )
+            listings = await asyncio.gather(
+                *(
+                    self._list_keys(
+                        object_storage, f"{self.prefix or ''}{shard}{folder}", semaphore
+                    )
+                    for shard, folders in zip(shards, expired)
+                    for folder in folders
+                )
+            )
+        keys = {key: size for listing in listings for key, size in listing}
+        result.partitions = sorted(
+            {folder.rstrip("/") for folders in expired for folder in folders}
+        )
+        result.items, result.size = len(keys), sum(keys.values())
+        if dry_run or not keys:
+            return result
+
+        index_keys = await self._expired_index_keys(keys, semaphore)
+        failed = await self._delete_keys(list(keys), concurrency)
+        result.failed = len(failed)
+        result.items -= len(failed)
+        result.size -= sum(keys[key] for key in failed)
+        await self._delete_keys([index_keys[key] for key in index_keys.keys() - set(failed)])
+        if self._manifests is not None and not failed:
+            manifests_base = self._manifest_key("")[: -len(MANIFEST_SUFFIX)]
+            async with self._session.client(S3, **self._conn_config) as object_storage:
+                manifests = await asyncio.gather(
+                    *(
+                        self._list_keys(object_storage, manifests_base + partition, semaphore)
+                        for partition in result.partitions
+                    )
+                )
+            # Manifests of expired folders and of partitions nested in them
+            manifest_keys = [
+                key
+                for partition, listing in zip(result.partitions, manifests)
+                for key, _ in listing
+                if key[len(manifests_base) : -len(MANIFEST_SUFFIX)] == partition
+                or key.startswith(f"{manifests_base}{partition}/")
+            ]
+            await self._delete_keys(manifest_keys)
+            for manifest_key in manifest_keys:
+                self._manifests.evict(manifest_key)
+        return result
+
+    async def sync_to_local(
+        self,
+        directory: Union[str, Path],
+        *,
+        partition_key: Optional[str] = None,
+        delete: bool = False,
+        dry_run: bool = False,
+        checksum: bool = False,
+        concurrency: int = 8,
+    ) -> SyncResult:
         """
-        return f"{self.prefix or ''}{partition_key.rstrip('/') + '/' if partition_key else ''}{key}"
+        Mirrors files stored under `partition_key` folder, or all files, into local `directory`,
+        downloading only files missing or changed since last sync, up to `concurrency` at the
+        same time. Large files are downloaded using parallel ranged requests. Files are saved
+        in their location path, i.e. `<directory>/2020/05/01/file.txt`, with S3 last modified
+        time as modification time, so files with the same size and time are not downloaded.
+
+        :param directory: local directory to sync into.
+        :param partition_key, Optional[str]: partition folder to sync, i.e. "2020/05",
+            or None to sync all files.
+        :param delete, bool: if True, local files not stored in S3 are deleted.
+        :param dry_run, bool: if True, nothing is downloaded or deleted and the result reports
+            what would be synced.
+        :param checksum, bool: if True, files with the same size and different time are compared
+            using MD5 digest and S3 ETag, when ETag is a plain MD5 digest.
+        :param concurrency, int: max number of files downloaded concurrently.
+        :return: `SyncResult` with downloaded and deleted file locations.
+        """
+        root = Path(directory)
+        remote = await self._sync_listing(partition_key)
+        local = await asyncio.to_thread(local_files, root, partition_key)
+        result = SyncResult(dry_run=dry_run)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def download(object_storage: Any, location: str, item: ItemLocator) -> None:
+            path = local_path(root, location)
+            if path is None:
+                result.errors[location] = "Invalid location"
+                return
+            stat = local.get(location)
+            async with semaphore:
+                if stat is not None and download_unchanged(stat, item):
+                    result.unchanged += 1
+                    return
+                if stat is not None and await self._sync_checksum(checksum, stat, path, item):
+                    if not dry_run:
+                        await asyncio.to_thread(set_mtime, path, item.last_modified)
+                    result.unchanged += 1
+                    return
+                if not dry_run:
+                    try:
+                        await self._download(object_storage, path, item)
+                    except Exception as e:  # pylint: disable=broad-except
+                        result.errors[location] = f"{type(e).__name__}: {e}"
+                        return
+                result.transferred.append(location)
+                result.size += item.size or 0
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            await asyncio.gather(
+                *(download(object_storage, location, item) for location, item in remote.items())
+            )
+        if delete:
+            for location in sorted(local.keys() - remote.keys()):
+                if not dry_run:
+                    try:
+                        os.remove(root / location)
+                    except OSError as e:
+                        result.errors[location] = f"{type(e).__name__}: {e}"
+                        continue
+                result.deleted.append(location)
+        result.transferred.sort()
+        return result
 
-    def _get_item_locator(
-        self, item_path: str, n_part_comps: int, suffix: Optional[str] = None
-    ) -> ItemLocator:
-        """This method generates an `ItemLocator` object from a given `item_path`"""
-        comps = item_path.split("/")
+    async def sync_from_local(
+        self,
+        directory: Union[str, Path],
+        *,
+        partition_key: Optional[str] = None,
+        delete: bool = False,
+        dry_run: bool = False,
+        checksum: bool = False,
+        concurrency: int = 8,
+    ) -> SyncResult:
+        """
+        Mirrors files in local `directory`, under `partition_key` folder or all files, into the
+        object storage, uploading only files missing or modified since last sync, up to
+        `concurrency` at the same time. Large files are uploaded using multipart uploads.
+        Local paths are used as file locations, i.e. `<directory>/2020/05/01/file.txt` is
+        stored as `2020/05/01/file.txt`, so files are synced back to the same location
+        they were downloaded from using `sync_to_local`.
+
+        :param directory: local directory to sync from.
+        :param partition_key, Optional[str]: partition folder to sync, i.e. "2020/05",
+            or None to sync all files.
+        :param delete, bool: if True, stored files not found in the local directory are deleted.
+        :param dry_run, bool: if True, nothing is uploaded or deleted and the result reports
+            what would be synced.
+        :param checksum, bool: if True, files with the same size and newer modification time
+            are compared using MD5 digest and S3 ETag, when ETag is a plain MD5 digest.
+        :param concurrency, int: max number of files uploaded concurrently.
+        :return: `SyncResult` with uploaded and deleted file locations.
+        """
+        root = Path(directory)
+        remote = await self._sync_listing(partition_key)
+        local = await asyncio.to_thread(local_files, root, partition_key)
+        result = SyncResult(dry_run=dry_run)
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def upload(object_storage: Any, location: str, stat: os.stat_result) -> None:
+            item = remote.get(location)
+            path = root / location
+            async with semaphore:
+                if item is not None and (
+                    upload_unchanged(stat, item)
+                    or await self._sync_checksum(checksum, stat, path, item)
+                ):
+                    result.unchanged += 1
+                    return
+                if not dry_run:
+                    try:
+                        await self._upload(object_storage, path, self._location_key(location))
+                    except Exception as e:  # pylint: disable=broad-except
+                        result.errors[location] = f"{type(e).__name__}: {e}"
+                        return
+                result.transferred.append(location)
+                result.size += stat.st_size
 
-        if not self.partition_dateformat:
-            return ItemLocator(item_id=item_path[: -len(suffix)] if suffix else item_path)
-        partition_key = "/".join(comps[0:n_part_comps])
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            await asyncio.gather(
+                *(upload(object_storage, location, stat) for location, stat in local.items())
+            )
+        if delete:
+            deleted: Dict[str, str] = {}
+            for location in remote.keys() - local.keys():
+                item = remote[location]
+                deleted[self._build_key(partition_key=item.partition_key, key=item.item_id)] = (
+                    location
+                )
+            failed = [] if dry_run else await self._delete_keys(list(deleted), concurrency)
+            for key in failed:
+                result.errors[deleted[key]] = "Delete failed"
+            result.deleted = sorted(deleted[key] for key in deleted.keys() - set(failed))
+        result.transferred.sort()
+        return result
+
+    async def poll_changes(
+        self,
+        checkpoint: FeedCheckpoint,
+        *,
+        files: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+        lookback: timedelta = timedelta(minutes=10),
+        now: Optional[datetime] = None,
+        concurrency: int = 16,
+    ) -> List[ItemLocator]:
+        """
+        Lists objects, or files, stored in the newest date partitions after the marks
+        in `checkpoint`, listing only keys after the last key seen in each partition using
+        `StartAfter`, and advances `checkpoint` marks to the last key listed.
+
+        Partitions covering the time from `lookback` ago to `now` are listed, so listing rolls
+        over to new date partitions automatically and marks of older partitions are dropped.
+        Partitions without a mark are listed from the start. Keys are listed in lexicographic
+        order, so items must be stored with keys increasing in arrival order within a partition,
+        i.e. time-ordered ids, to be found.
+
+        :param checkpoint, FeedCheckpoint: feed position, updated in place.
+        :param files, bool: if True, lists files instead of objects.
+        :param partition_values, Optional[Dict[str, Any]]: values of partitions other than date,
+            i.e. {"tenant": "acme"}, required when partitioning includes them.
+        :param lookback, timedelta: time partitions are still listed after rolling over.
+        :param now, Optional[datetime]: time to compute newest partitions, by default current time.
+        :param concurrency, int: max number of partitions and shards listed concurrently.
+        :return: new `ItemLocator`s, in partition and key order.
+        :raises ValueError: if partitioning has no date partition or `partition_values` are
+            missing for other partitions.
+        """
+        now = now or datetime.now(tz=timezone.utc)
+        partitions = feed_partitions(
+            self.partition_strategy, partition_values or {}, now - lookback, now
+        )
+        shards = get_shard_keys(self.shards) if self.shards else [""]
+        folders = [(shard, partition) for partition in partitions for shard in shards]
+        semaphore = asyncio.Semaphore(concurrency)
+        wildcard_suffix = "*" if files else f"*{SUFFIX}"
+
+        async def list_after(object_storage: Any, shard: str, partition: str) -> List[ListedObject]:
+            async with semaphore:
+                return [
+                    obj
+                    async for obj in self._list_shard(
+                        object_storage,
+                        shard,
+                        partition + wildcard_suffix,
+                        True,
+                        [],
+                        start_after=checkpoint.marks.get(shard + partition),
+                    )
+                ]
 
-        item_id = (
-            "/".join(comps[n_part_comps:])[: -len(suffix)]
-            if suffix
-            else "/".join(comps[n_part_comps:])
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            listings = await asyncio.gather(
+                *(list_after(object_storage, shard, partition) for shard, partition in folders)
+            )
+        marks: Dict[str, str] = {}
+        builder = CompactListingBuilder(
+            self.partition_strategy.split if self.partition_strategy else None,
+            None if files else SUFFIX,
         )
-        return ItemLocator(item_id=item_id, partition_key=partition_key)
+        for (shard, partition), listing in zip(folders, listings):
+            mark = listing[-1].key if listing else checkpoint.marks.get(shard + partition)
+            if mark is not None:
+                marks[shard + partition] = mark
+            builder.add_page(listing)
+        items = builder.build().to_list()
+        checkpoint.marks = marks
+        if items:
+            checkpoint.updated = now
+        return items
+
+    async def changes(
+        self,
+        *,
+        name: Optional[str] = None,
+        checkpoint: Optional[FeedCheckpoint] = None,
+        files: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+        lookback: timedelta = timedelta(minutes=10),
+        poll_interval: float = 5.0,
+        concurrency: int = 16,
+    ) -> AsyncIterator[ItemLocator]:
+        """
+        Change feed: yields objects, or files, as they are stored into the newest date
+        partitions, polling with `poll_changes` every `poll_interval` seconds while there are
+        no new items. Polling cost depends on the number of new items, not on partition size.
+
+        Feed position is advanced once every item found by a poll was consumed, so items are
+        delivered at least once. When `name` is given, the position is saved to the bucket
+        metadata folder and a feed with the same name resumes from it.
+
+        :param name, Optional[str]: feed name to save and resume position.
+        :param checkpoint, Optional[FeedCheckpoint]: position to start from when not resuming
+            a saved one, updated as items are consumed. By default, items already stored in the
+            newest partitions are yielded first.
+        :param files, bool: if True, yields files instead of objects.
+        :param partition_values, Optional[Dict[str, Any]]: values of partitions other than date.
+        :param lookback, timedelta: time partitions are still polled after rolling over.
+        :param poll_interval, float: seconds to wait between polls that find no new items.
+        :param concurrency, int: max number of partitions and shards listed concurrently.
+        :yields: `ItemLocator` of each new item, in partition and key order.
+        """
+        saved = await self._load_feed_checkpoint(name) if name else None
+        checkpoint = saved or checkpoint or FeedCheckpoint()
+        while True:
+            pending = FeedCheckpoint(marks=dict(checkpoint.marks), updated=checkpoint.updated)
+            items = await self.poll_changes(
+                pending,
+                files=files,
+                partition_values=partition_values,
+                lookback=lookback,
+                concurrency=concurrency,
+            )
+            for item in items:
+                yield item
+            changed = pending.marks != checkpoint.marks
+            checkpoint.marks, checkpoint.updated = pending.marks, pending.updated
+            if name and changed:
+                await self._save_feed_checkpoint(name, checkpoint)
+            if not items:
+                await asyncio.sleep(poll_interval)
+
+    async def list_files(
+        self,
+        wildcard: str = "*",
+        *,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_since: Optional[datetime] = None,
+    ) -> List[ItemLocator]:
+        """
+        Retrieves list of files_names from the object storage
+
+        :param wildcard, str: allow filter the listing of objects
+        :param partition_values, Optional[Dict[str, Any]]: prunes listing to the partition
+            derived from these values, `wildcard` is then relative to that partition folder.
+        :param min_size, Optional[int]: lists only files with at least this size in bytes.
+        :param max_size, Optional[int]: lists only files with at most this size in bytes.
+        :param modified_since, Optional[datetime]: lists only files modified at or after this time.
+        :return: List of `ItemLocator` with file location and metadata info
+        """
+        return (
+            await self.list_files_compact(
+                wildcard,
+                recursive=recursive,
+                partition_values=partition_values,
+                min_size=min_size,
+                max_size=max_size,
+                modified_since=modified_since,
+            )
+        ).to_list()
+
+    async def list_files_compact(
+        self,
+        wildcard: str = "*",
+        *,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+        min_size: Optional[int] = None,
+        max_size: Optional[int] = None,
+        modified_since: Optional[datetime] = None,
+    ) -> CompactListing:
+        """
+        Same as `list_files`, returning a `CompactListing` that keeps listed keys in shared
+        buffers and creates `ItemLocator`s only on access, to list millions of files.
+        """
+        wildcard = self._partition_wildcard(wildcard, partition_values)
+        return await self._list_compact(
+            wildcard, recursive, None, min_size, max_size, modified_since
+        )
+
+    async def list_objects_page(
+        self,
+        wildcard: str = "*",
+        *,
+        page_size: int = LISTING_PAGE_SIZE,
+        continuation_token: Optional[str] = None,
+        start_after: Optional[str] = None,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+    ) -> ListPage:
+        """
+        Retrieves one page of objects keys from the object storage
+
+        :param wildcard: allow filter the listing of objects
+        :param page_size, int: max number of items in the page
+        :param continuation_token, Optional[str]: `next_token` returned with previous page
+        :param start_after, Optional[str]: object location, as returned by `store`, to start
+            listing after. Ignored if `continuation_token` is given.
+        :param recursive, bool: If True, lists objects recursively.
+        :param partition_values, Optional[Dict[str, Any]]: prunes listing to the partition
+            derived from these values, `wildcard` is then relative to that partition folder.
+        :return: `ListPage` with listed `ItemLocator`s and token to retrieve next page, if any
+        :raise ValueError: if `page_size` is not positive or `continuation_token` is invalid.
+        """
+        wildcard = self._partition_wildcard(wildcard, partition_values) + SUFFIX
+        return await self._list_page(
+            wildcard, recursive, SUFFIX, page_size, continuation_token, start_after
+        )
+
+    async def list_files_page(
+        self,
+        wildcard: str = "*",
+        *,
+        page_size: int = LISTING_PAGE_SIZE,
+        continuation_token: Optional[str] = None,
+        start_after: Optional[str] = None,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+    ) -> ListPage:
+        """
+        Retrieves one page of file names from the object storage
+
+        :param wildcard: allow filter the listing of files
+        :param page_size, int: max number of items in the page
+        :param continuation_token, Optional[str]: `next_token` returned with previous page
+        :param start_after, Optional[str]: file location, as returned by `store_file`, to start
+            listing after. Ignored if `continuation_token` is given.
+        :param recursive, bool: If True, lists files recursively.
+        :param partition_values, Optional[Dict[str, Any]]: prunes listing to the partition
+            derived from these values, `wildcard` is then relative to that partition folder.
+        :return: `ListPage` with listed `ItemLocator`s and token to retrieve next page, if any
+        :raise ValueError: if `page_size` is not positive or `continuation_token` is invalid.
+        """
+        wildcard = self._partition_wildcard(wildcard, partition_values)
+        return await self._list_page(
+            wildcard, recursive, None, page_size, continuation_token, start_after
+        )
+
+    async def flush(self) -> int:
+        """
+        Stores pending writes when write-behind or spool are enabled. Failed writes are reported
+        to `on_error` callback and kept pending.
+
+        :return: number of stored writes
+        """
+        if self._write_behind is None:
+            return 0
+        return await self._write_behind.flush()
+
+    async def close(self) -> int:
+        """
+        Flushes pending writes and stops background flushing, to be called on shutdown
+        when write-behind or spool are enabled. When using spool, writes that could not be
+        stored are kept in the local journal and uploaded on next start.
+
+        :return: number of stored writes
+        """
+        if self._write_behind is None:
+            return 0
+        return await self._write_behind.close()
+
+    @property
+    def pending_writes(self) -> int:
+        """
+        Number of writes queued by write-behind or spool and not yet stored.
+        """
+        return self._write_behind.pending if self._write_behind else 0
+
+    def set_write_behind_callbacks(
+        self,
+        *,
+        on_error: Optional[Callable[[str, BaseException], None]] = None,
+        on_backpressure: Optional[Callable[[int], None]] = None,
+    ) -> "ObjectStorage":
+        """
+        Sets write-behind or spool callbacks.
+
+        :param on_error: called with the bucket key and the error when a pending write fails.
+            Failed writes are retried on next flush.
+        :param on_backpressure: called with pending bytes when a write has to wait because
+            `max_bytes` was reached.
+        :return: this instance
+        """
+        assert self._write_behind is not None, (
+            "Write-behind or spool are not enabled in ObjectStorageSettings"
+        )
+        self._write_behind.on_error = on_error
+        self._write_behind.on_backpressure = on_backpressure
+        return self
+
+    @property
+    def dedup_stats(self) -> DedupStats:
+        """
+        Content-hash deduplication counters of this instance.
+        """
+        return copy(self._dedup_stats)
+
+    async def store_blob(
+        self, value: Union[bytes, IO[bytes], Any], *, chunk_size: int = 1024 * 1024
+    ) -> BlobInfo:
+        """
+        Stores bytes or a file-like object once under the sha256 of its content
+        (content-addressed). File-like objects are hashed while read in chunks, spooling
+        content to a temporary file when larger than `chunk_size`.
+
+        :param value, Union[bytes, any]: bytes or a file-like object to store, it must
+            implement the read method and must return bytes.
+        :param chunk_size, int: size in bytes of chunks read from file-like objects.
+        :return: `BlobInfo`, with `stored` False if a blob with the same content existed.
+        """
+        assert self._content_hashes is not None, "Dedup is not enabled in ObjectStorageSettings"
+        with SpooledTemporaryFile(max_size=chunk_size) as file_obj:
+            if isinstance(value, bytes):
+                digest, size = content_hash(value), len(value)
+                body: Any = BytesIO(value)
+            else:
+                hasher, size = hashlib.sha256(), 0
+                while True:
+                    chunk = value.read(chunk_size)
+                    if inspect.isawaitable(chunk):
+                        chunk = await chunk
+                    if not chunk:
+                        break
+                    hasher.update(chunk)
+                    file_obj.write(chunk)
+                    size += len(chunk)
+                file_obj.seek(0)
+                digest, body = hasher.hexdigest(), file_obj
+            key = blob_key(self.prefix, digest)
+            self._dedup_stats.checked += 1
+            async with self._session.client(S3, **self._conn_config) as object_storage:
+                exists = self._content_hashes.get(key) == digest
+                if not exists:
+                    exists = await self._head(object_storage, key) is not None
+                if exists:
+                    self._dedup_stats.skipped += 1
+                    self._dedup_stats.skipped_bytes += size
+                else:
+                    self._dedup_stats.uploaded += 1
+                    async with self._limit(key):
+                        await object_storage.upload_fileobj(
+                            body,
+                            Bucket=self.bucket,
+                            Key=key,
+                            ExtraArgs={"Metadata": {HASH_METADATA: digest}},
+                        )
+            self._content_hashes.put(key, digest)
+        return BlobInfo(
+            content_hash=digest,
+            location=key[len(self.prefix or "") :],
+            size=size,
+            stored=not exists,
+        )
+
+    async def get_blob(self, content_hash: str) -> Optional[bytes]:
+        """
+        Retrieves a blob stored with `store_blob`.
+
+        :param content_hash: sha256 hex digest returned by `store_blob`.
+        :return: blob content, or None if not found.
+        """
+        key = blob_key(self.prefix, content_hash)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            try:
+                async with self._limit(key):
+                    obj = await object_storage.get_object(Bucket=self.bucket, Key=key)
+                    return await obj["Body"].read()
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "NoSuchKey":
+                    return None
+                raise e
+
+    def segment_writer(self) -> SegmentWriter:
+        """
+        Creates a `SegmentWriter` that buffers dataobjects per partition and stores them
+        as segment files, flushing each partition when `max_items` or `max_bytes` configured
+        in `SegmentSettings` are reached.
+
+        :return: `SegmentWriter`, to be used as async context manager or calling `flush`.
+        """
+        assert self._segments is not None, "Segments are not enabled in ObjectStorageSettings"
+        return SegmentWriter(self, self._segments)
+
+    async def store_segment(
+        self, items: Sequence[Tuple[str, DataObject]], *, partition_key: Optional[str] = None
+    ) -> SegmentInfo:
+        """
+        Stores `items` as a single segment file.
+
+        :param items: sequence of item ids and hopeit @dataobject
+        :param partition_key, Optional[str]: partition to store the segment,
+            by default no partition is used.
+        :return: `SegmentInfo`
+        """
+        assert self._segments is not None, "Segments are not enabled in ObjectStorageSettings"
+        return await self._put_segment(
+            partition_key, [(key, encode_record(value)) for key, value in items]
+        )
+
+    async def get_segment_item(
+        self,
+        segment_id: str,
+        key: str,
+        *,
+        datatype: Type[DataObject],
+        partition_key: Optional[str] = None,
+    ):
+        """
+        Retrieves item `key` from a segment using a ranged GET. Segment index is read
+        once and cached locally.
+
+        :param segment_id, str: segment id, as returned in `SegmentInfo` or `list_segments`.
+        :param key, str: item id
+        :param datatype: dataclass implementing @dataobject (@see DataObject)
+        :param partition_key, Optional[str]: partition where the segment is stored
+        :return: instance, or None if segment or item are not found
+        """
+        assert self._segments is not None, "Segments are not enabled in ObjectStorageSettings"
+        segment_key = self._build_key(partition_key, segment_id + SEGMENT_SUFFIX)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            index = await self._segment_index(object_storage, segment_key)
+            entry = index.get(key) if index else None
+            if entry is None:
+                return None
+            data = await self._get_range(
+                object_storage,
+                segment_key,
+                f"bytes={entry.offset}-{entry.offset + entry.length - 1}",
+            )
+        return None if data is None else decode_record(data, datatype)
+
+    async def read_segment(
+        self,
+        segment_id: str,
+        *,
+        datatype: Type[DataObject],
+        partition_key: Optional[str] = None,
+    ) -> AsyncIterator[Tuple[str, DataObject]]:
+        """
+        Streams all items of a segment, decoding each one as soon as its bytes are received.
+
+        :param segment_id, str: segment id, as returned in `SegmentInfo` or `list_segments`.
+        :param datatype: dataclass implementing @dataobject (@see DataObject)
+        :param partition_key, Optional[str]: partition where the segment is stored
+        :yields: tuples of item id and instance, in the order they were stored.
+        """
+        assert self._segments is not None, "Segments are not enabled in ObjectStorageSettings"
+        segment_key = self._build_key(partition_key, segment_id + SEGMENT_SUFFIX)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            index = await self._segment_index(object_storage, segment_key)
+            if not index:
+                return
+            async with self._limit(segment_key):
+                obj = await object_storage.get_object(
+                    Bucket=self.bucket, Key=segment_key, Range=f"bytes=0-{index.index_offset - 1}"
+                )
+            entries = iter(index.entries)
+            entry = next(entries, None)
+            buffer = b""
+            buffer_offset = 0
+            async for chunk in obj["Body"]:
+                buffer += chunk
+                buffer_end = buffer_offset + len(buffer)
+                while entry is not None and entry.offset + entry.length <= buffer_end:
+                    start = entry.offset - buffer_offset
+                    yield (
+                        entry.item_id,
+                        decode_record(buffer[start : start + entry.length], datatype),
+                    )
+                    entry = next(entries, None)
+                if entry is not None and entry.offset > buffer_offset:
+                    buffer = buffer[entry.offset - buffer_offset :]
+                    buffer_offset = entry.offset
+
+    async def list_segments(
+        self,
+        wildcard: str = "*",
+        *,
+        recursive: bool = False,
+        partition_values: Optional[Dict[str, Any]] = None,
+    ) -> List[ItemLocator]:
+        """
+        Retrieves list of segments from the object storage
+
+        :param wildcard, str: allow filter the listing of segments
+        :param recursive, bool: If True, lists segments recursively.
+        :param partition_values, Optional[Dict[str, Any]]: prunes listing to the partition
+            derived from these values, `wildcard` is then relative to that partition folder.
+        :return: List of `ItemLocator` with segment id as `item_id`, location and metadata info
+        """
+        wildcard = self._partition_wildcard(wildcard, partition_values) + SEGMENT_SUFFIX
+        return (
+            await self._list_compact(wildcard, recursive, SEGMENT_SUFFIX, None, None, None)
+        ).to_list()
+
+    def partition_key(self, path: str) -> str:
+        """
+        Get the partition key for a given path.
+
+        :param path, str
+        :return str: the extracted partition key.
+        """
+        partition_key = ""
+        if self.partition_strategy:
+            partition_key = path.rsplit("/", 1)[0]
+        return partition_key
+
+    async def seal_partition(self, partition_key: str) -> int:
+        """
+        Writes a manifest of the objects and files currently stored in a partition, so
+        listings read the manifest instead of listing the partition from S3.
+
+        Partitions should be sealed once closed, i.e. past dates: objects stored into a
+        sealed partition are not listed until the partition is sealed again.
+        Use `verify_partition` to check a manifest is up to date.
+
+        :param partition_key, str: partition to seal
+        :return: number of objects in the manifest
+        """
+        assert self._manifests is not None, "Manifests are not enabled in ObjectStorageSettings"
+        partition_key = partition_key.strip("/")
+        objects = await self._list_partition(partition_key)
+        manifest_key = self._manifest_key(partition_key)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(manifest_key):
+                await object_storage.put_object(
+                    Bucket=self.bucket,
+                    Key=manifest_key,
+                    Body=encode_manifest(partition_key, objects),
+                )
+        self._manifests.evict(manifest_key)
+        return len(objects)
+
+    async def unseal_partition(self, partition_key: str) -> None:
+        """
+        Removes the manifest of a sealed partition, so it is listed from S3 again.
+
+        :param partition_key, str: sealed partition
+        """
+        assert self._manifests is not None, "Manifests are not enabled in ObjectStorageSettings"
+        manifest_key = self._manifest_key(partition_key.strip("/"))
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(manifest_key):
+                await object_storage.delete_object(Bucket=self.bucket, Key=manifest_key)
+        self._manifests.evict(manifest_key)
+
+    async def verify_partition(self, partition_key: str) -> ManifestCheck:
+        """
+        Compares the manifest of a sealed partition against objects currently stored in it.
+
+        :param partition_key, str: sealed partition
+        :return: `ManifestCheck` with the differences found, if any
+        """
+        assert self._manifests is not None, "Manifests are not enabled in ObjectStorageSettings"
+        partition_key = partition_key.strip("/")
+        manifest_key = self._manifest_key(partition_key)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(manifest_key):
+                obj = await object_storage.get_object(Bucket=self.bucket, Key=manifest_key)
+                _, sealed_objects = decode_manifest(await obj["Body"].read())
+        sealed = {obj.key: obj for obj in sealed_objects}
+        stored = {obj.key: obj for obj in await self._list_partition(partition_key)}
+        return ManifestCheck(
+            partition_key=partition_key,
+            missing=sorted(sealed.keys() - stored.keys()),
+            unexpected=sorted(stored.keys() - sealed.keys()),
+            modified=sorted(
+                key
+                for key in sealed.keys() & stored.keys()
+                if (sealed[key].size, sealed[key].etag) != (stored[key].size, stored[key].etag)
+            ),
+        )
+
+    async def _list_partition(self, partition_key: str) -> List[ListedObject]:
+        """
+        Lists from S3 all objects and files in a partition, ignoring manifests.
+        """
+        return [
+            obj
+            async for obj in self._aioglob(
+                f"{partition_key}/*", recursive=True, use_manifests=False
+            )
+        ]
+
+    async def create_bucket(self, exist_ok: bool = False):
+        """
+        Creates a bucket in the ObjectStorage if it doesn't already exist,
+        based on the `check_if_exists` parameter.
+
+        Note: The `create_bucket` method is provided for convenience and should be avoided in production environments.
+
+        :param bucket, str: The name of the bucket to create.
+        :param exist_ok, bool: If False, raises an error if the bucket already exists (default is False).
+        """
+
+        region_name = os.getenv("AWS_DEFAULT_REGION")
+        if region_name and self._conn_config.get("region_name") is None:
+            self._conn_config["region_name"] = region_name
+
+        kwargs = (
+            {"CreateBucketConfiguration": {"LocationConstraint": self._conn_config["region_name"]}}
+            if self._conn_config.get("region_name") is not None
+            else {}
+        )
+
+        async with self._session.client("s3", **self._conn_config) as object_storage:
+            if exist_ok:
+                try:
+                    await object_storage.head_bucket(Bucket=self.bucket)
+                    return
+                except ClientError as e:
+                    if e.response["Error"]["Code"] != "404":
+                        raise e
+            try:
+                await object_storage.create_bucket(Bucket=self.bucket, **kwargs)
+            except ClientError as e:
+                raise e
+
+    async def _aioglob(
+        self,
+        wildcard: Optional[str] = None,
+        recursive: bool = False,
+        use_manifests: bool = True,
+        start_after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncGenerator[ListedObject, None]:
+        """
+        A generator function similar to `glob` that lists files in an S3 bucket
+
+        :param wildcard, Optional[str]: Pattern to match file keys against.
+        :param recursive, bool: If True, lists files recursively.
+        :param use_manifests, bool: If True and manifests are enabled, sealed partitions are
+            read from their manifests instead of being listed from S3.
+        :param start_after, Optional[str]: If set, lists only keys after this one.
+        :param limit, Optional[int]: If set, max number of keys to list.
+
+        :yields: `ListedObject`: keys and metadata of the files that match the criteria.
+        """
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            dir_prefix = self._dir_prefix(wildcard)
+            sealed: List[Tuple[str, str, str]] = []
+            if use_manifests and self._manifests is not None:
+                sealed = await self._sealed_partitions(object_storage, dir_prefix)
+            sealed_folders = [folder for folder, _, _ in sealed]
+
+            listings: List[AsyncGenerator[ListedObject, None]] = []
+            if not any(dir_prefix.startswith(folder) for folder in sealed_folders):
+                listings.extend(
+                    self._list_shard(
+                        object_storage,
+                        shard,
+                        wildcard,
+                        recursive,
+                        sealed_folders,
+                        start_after=start_after,
+                        limit=limit,
+                    )
+                    for shard in (get_shard_keys(self.shards) if self.shards else [""])
+                )
+            if len(listings) == 1 and not sealed:
+                async for obj in listings[0]:
+                    yield obj
+                return
+
+            async def collect(listing: AsyncGenerator[ListedObject, None]) -> List[ListedObject]:
+                return [obj async for obj in listing]
+
+            results = await asyncio.gather(
+                *(collect(listing) for listing in listings),
+                *(
+                    self._list_manifest(
+                        object_storage,
+                        manifest_key,
+                        etag,
+                        wildcard,
+                        dir_prefix,
+                        recursive,
+                        start_after=start_after,
+                        limit=limit,
+                    )
+                    for _, manifest_key, etag in sealed
+                ),
+            )
+            merged = heapq.merge(*results, key=lambda obj: obj.key)
+            for obj in itertools.islice(merged, limit):
+                yield obj
+
+    async def _list_shard(
+        self,
+        object_storage: Any,
+        shard: str,
+        wildcard: Optional[str],
+        recursive: bool,
+        sealed_folders: Optional[List[str]] = None,
+        *,
+        start_after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncGenerator[ListedObject, None]:
+        """
+        Lists keys under the given `shard` directory ("" when sharding is disabled)
+        matching `wildcard`, yielding them in S3 lexicographic order without prefix and shard.
+        Keys in `sealed_folders`, sorted partition folders read from manifests, are skipped
+        restarting the listing after them. Listing starts after `start_after` key if given,
+        and stops after `limit` keys.
+        """
+        base = f"{self.prefix or ''}{shard}"
+        prefix = base + self._dir_prefix(wildcard)
+        sealed_folders = sealed_folders or []
+
+        list_args: Dict[str, Any] = {
+            "Bucket": self.bucket,
+            "Prefix": prefix,
+            "Delimiter": "" if recursive else "/",
+        }
+        if start_after:
+            list_args["StartAfter"] = base + start_after
+        if limit:
+            list_args["MaxKeys"] = min(limit, LISTING_PAGE_SIZE)
+        count = 0
+        while True:
+            async with self._limit(prefix):
+                result = await object_storage.list_objects_v2(**list_args)
+            restart_after = None
+            for content in result.get("Contents", []):
+                key = content["Key"]
+                if key.startswith(METADATA_FOLDER, len(base)):
+                    continue
+                folder = self._sealed_folder(key[len(base) :], sealed_folders)
+                if folder is not None:
+                    # "0" follows "/", so listing restarts after every key in the folder
+                    restart_after = f"{base}{folder[:-1]}0"
+                    break
+                if wildcard and not fnmatch.fnmatch(key, base + wildcard):
+                    continue
+                yield ListedObject(
+                    key=key[len(base) :],
+                    size=content["Size"],
+                    etag=content["ETag"].strip('"'),
+                    last_modified=content["LastModified"].timestamp(),
+                )
+                count += 1
+                if count == limit:
+                    return
+            if restart_after is not None:
+                list_args.pop("ContinuationToken", None)
+                list_args["StartAfter"] = restart_after
+                continue
+            if not result.get("IsTruncated"):
+                break
+            list_args["ContinuationToken"] = result["NextContinuationToken"]
+
+    async def _sealed_partitions(
+        self, object_storage: Any, dir_prefix: str
+    ) -> List[Tuple[str, str, str]]:
+        """
+        Lists sealed partitions overlapping `dir_prefix`, returning sorted tuples of
+        partition folder, manifest key and manifest etag.
+        """
+        base = self._manifest_key("")[: -len(MANIFEST_SUFFIX)]
+        list_args = {"Bucket": self.bucket, "Prefix": base}
+        sealed = []
+        while True:
+            async with self._limit(base):
+                result = await object_storage.list_objects_v2(**list_args)
+            for content in result.get("Contents", []):
+                key = content["Key"]
+                if not key.endswith(MANIFEST_SUFFIX):
+                    continue
+                folder = key[len(base) : -len(MANIFEST_SUFFIX)] + "/"
+                if folder.startswith(dir_prefix) or dir_prefix.startswith(folder):
+                    sealed.append((folder, key, content["ETag"]))
+            if not result.get("IsTruncated"):
+                break
+            list_args["ContinuationToken"] = result["NextContinuationToken"]
+        return sorted(sealed)
+
+    async def _list_manifest(
+        self,
+        object_storage: Any,
+        manifest_key: str,
+        etag: str,
+        wildcard: Optional[str],
+        dir_prefix: str,
+        recursive: bool,
+        *,
+        start_after: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> List[ListedObject]:
+        """
+        Reads objects listed in a manifest matching `wildcard`, using cached manifest
+        when its `etag` didn't change. Only keys after `start_after`, up to `limit`,
+        are returned if given.
+        """
+        assert self._manifests is not None
+        objects = self._manifests.get(manifest_key, etag)
+        if objects is None:
+            async with self._limit(manifest_key):
+                obj = await object_storage.get_object(Bucket=self.bucket, Key=manifest_key)
+                _, objects = decode_manifest(await obj["Body"].read())
+            self._manifests.put(manifest_key, etag, objects)
+        matches = (
+            obj
+            for obj in objects
+            if obj.key.startswith(dir_prefix)
+            and (recursive or "/" not in obj.key[len(dir_prefix) :])
+            and (not wildcard or fnmatch.fnmatch(obj.key, wildcard))
+            and (not start_after or obj.key > start_after)
+        )
+        return list(itertools.islice(matches, limit))
+
+    @staticmethod
+    def _sealed_folder(key: str, sealed_folders: List[str]) -> Optional[str]:
+        """
+        Returns the folder in sorted `sealed_folders` containing `key`, if any.
+        """
+        pos = bisect.bisect_right(sealed_folders, key)
+        if pos and key.startswith(sealed_folders[pos - 1]):
+            return sealed_folders[pos - 1]
+        return None
+
+    @staticmethod
+    def _dir_prefix(wildcard: Optional[str]) -> str:
+        """
+        Returns the folder part of `wildcard`, with trailing "/", or "" if none.
+        """
+        if wildcard:
+            dir_path = Path(wildcard).parent
+            if dir_path != Path("."):
+                return f"{dir_path}/"
+        return ""
+
+    def _manifest_key(self, partition_key: str) -> str:
+        return (
+            f"{self.prefix or ''}{METADATA_FOLDER}{MANIFESTS_FOLDER}"
+            f"{partition_key}{MANIFEST_SUFFIX}"
+        )
+
+    async def _read_index_entry(self, key: str) -> Optional[str]:
+        """
+        Reads from the bucket the partition key indexed for `key` and caches it.
+        Returns "" for items stored without partition, or None if `key` is not indexed.
+        """
+        assert self._index is not None
+        index_key = self._index.index_key(key)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            try:
+                async with self._limit(index_key):
+                    obj = await object_storage.get_object(Bucket=self.bucket, Key=index_key)
+                    partition_key = (await obj["Body"].read()).decode()
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "NoSuchKey":
+                    return None
+                raise e
+        self._index.update(key, partition_key)
+        return partition_key
+
+    async def _write_index_entry(self, object_storage: Any, key: str, partition_key: str) -> None:
+        assert self._index is not None
+        index_key = self._index.index_key(key)
+        async with self._limit(index_key):
+            await object_storage.put_object(
+                Bucket=self.bucket, Key=index_key, Body=partition_key.encode()
+            )
+        self._index.update(key, partition_key)
+
+    async def _remove_index_entry(self, object_storage: Any, key: str, partition_key: str) -> None:
+        """
+        Removes index entry for `key` only if it points to the deleted `partition_key`,
+        so deleting an older copy of an item keeps the index pointing to the latest one.
+        """
+        assert self._index is not None
+        self._index.evict(key)
+        if await self._read_index_entry(key) != partition_key.rstrip("/"):
+            return
+        index_key = self._index.index_key(key)
+        async with self._limit(index_key):
+            await object_storage.delete_object(Bucket=self.bucket, Key=index_key)
+        self._index.evict(key)
+
+    def _pending_partition(self, key: str) -> Optional[str]:
+        """
+        Returns the partition of object `key` if it has a pending write-behind write.
+        """
+        if self._write_behind is None or self._index is None:
+            return None
+        partition_key = self._index.cached(key)
+        if partition_key is None:
+            return None
+        if not self._write_behind.is_pending(self._build_key(partition_key, key + SUFFIX)):
+            return None
+        return partition_key
+
+    async def _discard_pending(self, key: str) -> None:
+        """
+        Drops pending write-behind write for `key` before it is deleted, waiting for a write
+        already being stored, and evicts its cached content hash.
+        """
+        if self._write_behind is not None:
+            self._write_behind.discard(key)
+            await self._write_behind.wait_in_flight(key)
+        if self._content_hashes is not None:
+            self._content_hashes.evict(key)
+
+    async def _write_pending(self, writes: Sequence[PendingWrite]) -> List[Optional[BaseException]]:
+        """
+        Stores `writes` queued by write-behind, running up to `concurrency` uploads at the same
+        time. Returns the error raised by each write, or None if it was stored.
+        """
+        assert self._write_behind is not None
+        semaphore = asyncio.Semaphore(self._write_behind.settings.concurrency)
+
+        async def write(object_storage: Any, pending: PendingWrite) -> None:
+            async with semaphore:
+                async with self._limit(pending.key):
+                    await object_storage.upload_fileobj(
+                        BytesIO(pending.data),
+                        Bucket=self.bucket,
+                        Key=pending.key,
+                        **self._upload_args(pending.data),
+                    )
+                self._cache_hash(pending.key, pending.data)
+                if self._index is not None and pending.item_id is not None:
+                    await self._write_index_entry(
+                        object_storage, pending.item_id, pending.partition_key or ""
+                    )
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            results = await asyncio.gather(
+                *(write(object_storage, pending) for pending in writes), return_exceptions=True
+            )
+        return [result if isinstance(result, BaseException) else None for result in results]
+
+    async def _put_segment(
+        self, partition_key: Optional[str], records: Sequence[Tuple[str, bytes]]
+    ) -> SegmentInfo:
+        """
+        Stores compressed `records` as a new segment and caches its index.
+        """
+        assert self._segment_indexes is not None
+        segment_id = new_segment_id()
+        segment_key = self._build_key(partition_key, segment_id + SEGMENT_SUFFIX)
+        data, entries = encode_segment(records)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(segment_key):
+                await object_storage.put_object(Bucket=self.bucket, Key=segment_key, Body=data)
+        index_offset, _ = decode_footer(data)
+        self._segment_indexes.put(segment_key, SegmentIndex(entries, index_offset))
+        return SegmentInfo(
+            segment_id=segment_id,
+            partition_key=partition_key.rstrip("/") if partition_key else None,
+            location=self._prune_prefix(segment_key),
+            count=len(entries),
+            size=len(data),
+        )
+
+    async def _segment_index(self, object_storage: Any, segment_key: str) -> Optional[SegmentIndex]:
+        """
+        Returns cached segment index, or reads it from the tail of the segment, using a
+        second ranged GET only when the index is larger than `SEGMENT_TAIL_SIZE`.
+        Returns None if the segment is not found.
+        """
+        assert self._segment_indexes is not None
+        index = self._segment_indexes.get(segment_key)
+        if index is not None:
+            return index
+        try:
+            async with self._limit(segment_key):
+                obj = await object_storage.get_object(
+                    Bucket=self.bucket, Key=segment_key, Range=f"bytes=-{SEGMENT_TAIL_SIZE}"
+                )
+                tail = await obj["Body"].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise e
+        content_range = obj.get("ContentRange")
+        tail_offset = int(content_range.split(" ")[1].split("-")[0]) if content_range else 0
+        index_offset, index_length = decode_footer(tail)
+        start = index_offset - tail_offset
+        if start >= 0:
+            index_data = tail[start : start + index_length]
+        else:
+            index_data = await self._get_range(
+                object_storage,
+                segment_key,
+                f"bytes={index_offset}-{index_offset + index_length - 1}",
+            )
+            if index_data is None:
+                return None
+        index = SegmentIndex(decode_index(index_data), index_offset)
+        self._segment_indexes.put(segment_key, index)
+        return index
+
+    async def _store_conditional(
+        self,
+        key: str,
+        partition_key: Optional[str],
+        item_key: str,
+        data: bytes,
+        if_match: Optional[str],
+        if_none_match: Optional[str],
+    ) -> str:
+        """
+        Stores `data` using a conditional PUT, bypassing write-behind and deduplication.
+        """
+        conditions = {
+            name: value
+            for name, value in (("IfMatch", if_match), ("IfNoneMatch", if_none_match))
+            if value is not None
+        }
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            try:
+                async with self._limit(item_key):
+                    await object_storage.put_object(
+                        Bucket=self.bucket,
+                        Key=item_key,
+                        Body=data,
+                        **conditions,
+                        **self._upload_args(data).get("ExtraArgs", {}),
+                    )
+            except ClientError as e:
+                if e.response["Error"]["Code"] in PRECONDITION_ERRORS:
+                    raise PreconditionFailed(self._prune_prefix(item_key)) from e
+                raise e
+            if self._write_behind is not None:
+                self._write_behind.discard(item_key)
+            self._cache_hash(item_key, data)
+            if self._index is not None:
+                await self._write_index_entry(
+                    object_storage, key, (partition_key or "").rstrip("/")
+                )
+        return self._prune_prefix(item_key)
+
+    async def _copy_item(
+        self,
+        object_storage: Any,
+        src: ItemLocator,
+        dst: ItemLocator,
+        files: bool,
+        target: "ObjectStorage",
+        concurrency: int,
+    ) -> Optional[Tuple[ItemLocator, ItemLocator]]:
+        """
+        Copies `src` to `dst` in `target`, resolving source partition using the index if needed.
+
+        :return: located source and copy, or None if source was not found.
+        """
+        suffix = "" if files else SUFFIX
+        dst_key = target._build_key(partition_key=dst.partition_key, key=dst.item_id + suffix)
+
+        async def copy(partition_key: Optional[str]) -> Optional[ItemLocator]:
+            src_key = self._build_key(partition_key=partition_key, key=src.item_id + suffix)
+            source = {"Bucket": self.bucket, "Key": src_key}
+            # Size known from listings avoids a HEAD request for items copied in one request
+            if src.size is None or src.size > MULTIPART_COPY_THRESHOLD:
+                head = await self._head(object_storage, src_key)
+                if head is None:
+                    return None
+                if head["ContentLength"] > MULTIPART_COPY_THRESHOLD:
+                    await target._multipart_copy(object_storage, source, head, dst_key, concurrency)
+                    return ItemLocator(item_id=src.item_id, partition_key=partition_key)
+            try:
+                async with target._limit(dst_key):
+                    await object_storage.copy_object(
+                        Bucket=target.bucket, Key=dst_key, CopySource=source
+                    )
+            except ClientError as e:
+                if e.response["Error"]["Code"] in ("NoSuchKey", "404"):
+                    return None
+                raise e
+            return ItemLocator(item_id=src.item_id, partition_key=partition_key)
+
+        if src.partition_key is None and self._index is not None and not files:
+            located = await self._get_indexed(src.item_id, copy)
+        else:
+            located = await copy(src.partition_key)
+        if located is None:
+            return None
+        if target._write_behind is not None:
+            target._write_behind.discard(dst_key)
+        if target._content_hashes is not None:
+            target._content_hashes.evict(dst_key)
+        partition_key = dst.partition_key.rstrip("/") if dst.partition_key else None
+        if target._index is not None and not files:
+            await target._write_index_entry(object_storage, dst.item_id, partition_key or "")
+        return located, ItemLocator(item_id=dst.item_id, partition_key=partition_key)
+
+    async def _copy_many(
+        self,
+        items: Sequence[Tuple[ItemLocator, ItemLocator]],
+        files: bool,
+        target: "ObjectStorage",
+        concurrency: int,
+        return_exceptions: bool = False,
+    ) -> List[Any]:
+        """
+        Copies `items` running up to `concurrency` copies at the same time. Returns located
+        source and copy for each item, None if not found, or the error raised when
+        `return_exceptions` is True.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def copy(object_storage: Any, src: ItemLocator, dst: ItemLocator):
+            async with semaphore:
+                return await self._copy_item(object_storage, src, dst, files, target, concurrency)
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            return list(
+                await asyncio.gather(
+                    *(copy(object_storage, src, dst) for src, dst in items),
+                    return_exceptions=return_exceptions,
+                )
+            )
+
+    async def _delete_keys(self, keys: Sequence[str], concurrency: int = 1) -> List[str]:
+        """
+        Deletes bucket `keys` using `delete_objects` requests of up to 1000 keys,
+        sending up to `concurrency` requests at the same time, without updating the index.
+
+        :return: keys that could not be deleted.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def delete_batch(object_storage: Any, batch: Sequence[str]) -> List[str]:
+            for key in batch:
+                await self._discard_pending(key)
+            async with semaphore, self._limit(batch[0]):
+                result = await object_storage.delete_objects(
+                    Bucket=self.bucket,
+                    Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+                )
+            return [error["Key"] for error in result.get("Errors", [])]
+
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            results = await asyncio.gather(
+                *(
+                    delete_batch(object_storage, keys[start : start + DELETE_BATCH_SIZE])
+                    for start in range(0, len(keys), DELETE_BATCH_SIZE)
+                )
+            )
+        return [key for failed in results for key in failed]
+
+    def _feed_key(self, name: str) -> str:
+        return f"{self.prefix or ''}{METADATA_FOLDER}{FEEDS_FOLDER}{name}.json"
+
+    async def _load_feed_checkpoint(self, name: str) -> Optional[FeedCheckpoint]:
+        feed_key = self._feed_key(name)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            try:
+                async with self._limit(feed_key):
+                    obj = await object_storage.get_object(Bucket=self.bucket, Key=feed_key)
+                    data = await obj["Body"].read()
+            except ClientError as e:
+                if e.response["Error"]["Code"] == "NoSuchKey":
+                    return None
+                raise e
+        return Payload.from_json(data, FeedCheckpoint)
+
+    async def _save_feed_checkpoint(self, name: str, checkpoint: FeedCheckpoint) -> None:
+        feed_key = self._feed_key(name)
+        async with self._session.client(S3, **self._conn_config) as object_storage:
+            async with self._limit(feed_key):
+                await object_storage.put_object(
+                    Bucket=self.bucket, Key=feed_key, Body=Payload.to_json(checkpoint).encode()
+                )
+
+    async def _sync_listing(self, partition_key: Optional[str]) -> Dict[str, ItemLocator]:
+        """
+        Lists files to sync under `partition_key` folder, or all files, by location.
+        """
+        wildcard = f"{partition_key.strip('/')}/*" if partition_key else "*"
+        listing = await self.list_files_compact(wildcard, recursive=True)
+        return {item_location(item): item for item in listing.to_list()}
+
+    async def _sync_checksum(
+        self, checksum: bool, stat: os.stat_result, path: Path, item: ItemLocator
+    ) -> bool:
+        """
+        Returns whether local file in `path` has the same content as `item` when `checksum`
+        is enabled, comparing MD5 digest with S3 ETag.
+        """
+        md5 = etag_md5(item.etag)
+        if not checksum or md5 is None or stat.st_size != item.size:
+            return False
+        return await asyncio.to_thread(file_md5, path) == md5
+
+    async def _download(self, object_storage: Any, path: Path, item: ItemLocator) -> None:
+        """
+        Downloads file `item` into `path` using parallel ranged requests for large files.
+        File is written to a temporary path and renamed when complete. Local file operations
+        run in a worker thread.
+        """
+        key = self._build_key(partition_key=item.partition_key, key=item.item_id)
+        temp_path = path.with_name(path.name + TEMP_SUFFIX)
+        await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+        try:
+            file = await ThreadedFile.open(temp_path, "wb")
+            try:
+                async with self._limit(key):
+                    await object_storage.download_fileobj(self.bucket, key, file)
+            finally:
+                await file.close()
+            await asyncio.to_thread(os.replace, temp_path, path)
+        finally:
+            await asyncio.to_thread(temp_path.unlink, missing_ok=True)
+        await asyncio.to_thread(set_mtime, path, item.last_modified)
+
+    async def _upload(self, object_storage: Any, path: Path, key: str) -> None:
+        """
+        Uploads local file in `path` to `key`, using a multipart upload for large files.
+        Local file is read in a worker thread.
+        """
+        await self._discard_pending(key)
+        file = await ThreadedFile.open(path, "rb")
+        try:
+            async with self._limit(key):
+                await object_storage.upload_fileobj(file, self.bucket, key)
+        finally:
+            await file.close()
+
+    def _location_key(self, location: str) -> str:
+        """
+        Returns bucket key of file `location`, as returned by `store_file`.
+        """
+        partition_key, file_name = None, location
+        if self.partition_strategy and "/" in location:
+            partition_key, file_name = location.rsplit("/", 1)
+        return self._build_key(partition_key=partition_key, key=file_name)
+
+    async def _expired_folders(
+        self, object_storage: Any, shard: str, cutoff: datetime, semaphore: asyncio.Semaphore
+    ) -> List[str]:
+        """
+        Finds partition folders in `shard` containing only items older than `cutoff`,
+        listing only folders that overlap `cutoff`.
+
+        :return: expired folders, relative to prefix and shard, with trailing "/".
+        """
+        assert self.partition_strategy is not None
+        strategy = self.partition_strategy
+        base = f"{self.prefix or ''}{shard}"
+        expired: List[str] = []
+
+        async def walk(folder: str) -> None:
+            list_args = {"Bucket": self.bucket, "Prefix": base + folder, "Delimiter": "/"}
+            subfolders: List[str] = []
+            while True:
+                async with semaphore, self._limit(base + folder):
+                    result = await object_storage.list_objects_v2(**list_args)
+                subfolders.extend(
+                    item["Prefix"][len(base) :] for item in result.get("CommonPrefixes", [])
+                )
+                if not result.get("IsTruncated"):
+                    break
+                list_args["ContinuationToken"] = result["NextContinuationToken"]
+            pending = []
+            for subfolder in subfolders:
+                if subfolder.startswith(METADATA_FOLDER):
+                    continue
+                comps = subfolder.rstrip("/").split("/")
+                state = partition_expired(strategy, comps, cutoff)
+                if state:
+                    expired.append(subfolder)
+                elif state is None and len(comps) < strategy.n_components:
+                    pending.append(walk(subfolder))
+            await asyncio.gather(*pending)
+
+        await walk("")
+        return expired
+
+    async def _list_keys(
+        self, object_storage: Any, prefix: str, semaphore: asyncio.Semaphore
+    ) -> List[Tuple[str, int]]:
+        """
+        Lists recursively bucket keys and sizes under `prefix`.
+        """
+        list_args = {"Bucket": self.bucket, "Prefix": prefix}
+        keys: List[Tuple[str, int]] = []
+        while True:
+            async with semaphore, self._limit(prefix):
+                result = await object_storage.list_objects_v2(**list_args)
+            keys.extend((item["Key"], item["Size"]) for item in result.get("Contents", []))
+            if not result.get("IsTruncated"):
+                break
+            list_args["ContinuationToken"] = result["NextContinuationToken"]
+        return keys
+
+    async def _expired_index_keys(
+        self, keys: Dict[str, int], semaphore: asyncio.Semaphore
+    ) -> Dict[str, str]:
+        """
+        Returns index entry keys of purged objects by object key, only for entries pointing
+        to the purged partition, so entries of items stored again in newer partitions are kept.
+        """
+        if self._index is None:
+            return {}
+        assert self.partition_strategy is not None
+        base = self.prefix or ""
+        items: Dict[str, Tuple[str, str]] = {}
+        for key in keys:
+            path = key[len(base) :]
+            if self.shards:
+                path = path.split("/", 1)[1]
+            partition_key, item_path = self.partition_strategy.split(path)
+            if item_path.endswith(SUFFIX) and "/" not in item_path:
+                items[key] = (item_path[: -len(SUFFIX)], partition_key)
+
+        async def indexed(item_id: str, partition_key: str) -> bool:
+            async with semaphore:
+                return await self._read_index_entry(item_id) == partition_key
+
+        matches = await asyncio.gather(*(indexed(*item) for item in items.values()))
+        index_keys: Dict[str, str] = {}
+        for (key, (item_id, _)), match in zip(items.items(), matches):
+            if match:
+                assert self._index is not None
+                index_keys[key] = self._index.index_key(item_id)
+                self._index.evict(item_id)
+        return index_keys
+
+    async def _multipart_copy(
+        self,
+        object_storage: Any,
+        source: Dict[str, str],
+        head: Dict[str, Any],
+        key: str,
+        concurrency: int,
+    ) -> None:
+        """
+        Copies `source` object to `key` using a multipart upload, copying byte ranges
+        of `MULTIPART_COPY_PART_SIZE` in parallel. Upload is aborted on failure.
+        """
+        size = head["ContentLength"]
+        extra = {"ContentType": head["ContentType"]} if head.get("ContentType") else {}
+        async with self._limit(key):
+            upload = await object_storage.create_multipart_upload(
+                Bucket=self.bucket, Key=key, Metadata=head.get("Metadata", {}), **extra
+            )
+        upload_id = upload["UploadId"]
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def copy_part(part_number: int, start: int) -> Dict[str, Any]:
+            end = min(start + MULTIPART_COPY_PART_SIZE, size) - 1
+            async with semaphore:
+                async with self._limit(key):
+                    result = await object_storage.upload_part_copy(
+                        Bucket=self.bucket,
+                        Key=key,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        CopySource=source,
+                        CopySourceRange=f"bytes={start}-{end}",
+                    )
+            return {"PartNumber": part_number, "ETag": result["CopyPartResult"]["ETag"]}
+
+        try:
+            parts = await asyncio.gather(
+                *(
+                    copy_part(part_number, start)
+                    for part_number, start in enumerate(
+                        range(0, size, MULTIPART_COPY_PART_SIZE), start=1
+                    )
+                )
+            )
+            async with self._limit(key):
+                await object_storage.complete_multipart_upload(
+                    Bucket=self.bucket,
+                    Key=key,
+                    UploadId=upload_id,
+                    MultipartUpload={"Parts": list(parts)},
+                )
+        except BaseException:
+            async with self._limit(key):
+                await object_storage.abort_multipart_upload(
+                    Bucket=self.bucket, Key=key, UploadId=upload_id
+                )
+            raise
+
+    async def _delete_source(
+        self, copied: Tuple[ItemLocator, ItemLocator], files: bool, target: "ObjectStorage"
+    ) -> None:
+        """
+        Deletes the source of a moved item, using its resolved partition so the index entry
+        of the moved item is kept when moved within the same storage.
+        """
+        src, dst = copied
+        if target is self and src == dst:
+            return
+        if files:
+            await self.delete_files(src.item_id, partition_key=src.partition_key)
+        else:
+            await self.delete(src.item_id, partition_key=src.partition_key or "")
+
+    async def _stat_item(
+        self, object_storage: Any, key: str, partition_key: Optional[str], suffix: str
+    ) -> Optional[ItemStat]:
+        """
+        Returns metadata of object `key`, resolving its partition using the index if needed.
+        """
+        if partition_key is None and self._index is not None:
+            return await self._get_indexed(
+                key, partial(self._stat, object_storage, key, suffix=suffix)
+            )
+        return await self._stat(object_storage, key, partition_key, suffix)
+
+    async def _stat(
+        self, object_storage: Any, key: str, partition_key: Optional[str], suffix: str
+    ) -> Optional[ItemStat]:
+        item_key = self._build_key(partition_key=partition_key, key=key + suffix)
+        partition = partition_key.rstrip("/") if partition_key else None
+        pending_size = self._write_behind.size(item_key) if self._write_behind else None
+        if pending_size is not None:
+            return ItemStat(item_id=key, partition_key=partition, size=pending_size)
+        head = await self._head(object_storage, item_key)
+        if head is None:
+            return None
+        return ItemStat(
+            item_id=key,
+            partition_key=partition,
+            size=head["ContentLength"],
+            etag=head.get("ETag"),
+            last_modified=head.get("LastModified"),
+            content_type=head.get("ContentType"),
+            metadata=head.get("Metadata", {}),
+        )
+
+    async def _unchanged(self, object_storage: Any, key: str, data: bytes) -> bool:
+        """
+        Returns whether `data` is the content already stored in `key` when dedup is enabled,
+        comparing with the cached content hash or, if `object_storage` client is given and
+        `check_remote` is enabled, with the stored object metadata. Keys with a pending
+        write-behind write are always stored. The content hash is cached by `_cache_hash`
+        once `data` is stored.
+        """
+        if self._dedup is None or self._content_hashes is None:
+            return False
+        digest = content_hash(data)
+        self._dedup_stats.checked += 1
+        if self._write_behind is not None and self._write_behind.is_pending(key):
+            unchanged = False
+        else:
+            unchanged = self._content_hashes.get(key) == digest
+        if not unchanged and object_storage is not None and self._dedup.check_remote:
+            head = await self._head(object_storage, key)
+            unchanged = head is not None and matches(head, digest, data)
+        if unchanged:
+            self._content_hashes.put(key, digest)
+            self._dedup_stats.skipped += 1
+            self._dedup_stats.skipped_bytes += len(data)
+        else:
+            self._content_hashes.evict(key)
+            self._dedup_stats.uploaded += 1
+        return unchanged
+
+    def _cache_hash(self, key: str, data: bytes) -> None:
+        """
+        Caches content hash of `data` once it is stored in `key`, when dedup is enabled.
+        """
+        if self._content_hashes is not None:
+            self._content_hashes.put(key, content_hash(data))
+
+    def _upload_args(self, data: bytes) -> Dict[str, Any]:
+        """
+        Returns `upload_fileobj` args to store content hash metadata when dedup is enabled.
+        """
+        if self._dedup is None:
+            return {}
+        return {"ExtraArgs": {"Metadata": {HASH_METADATA: content_hash(data)}}}
+
+    async def _head(self, object_storage: Any, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            async with self._limit(key):
+                return await object_storage.head_object(Bucket=self.bucket, Key=key)
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "404":
+                return None
+            raise e
+
+    async def _get_range(self, object_storage: Any, key: str, byte_range: str) -> Optional[bytes]:
+        try:
+            async with self._limit(key):
+                obj = await object_storage.get_object(Bucket=self.bucket, Key=key, Range=byte_range)
+                return await obj["Body"].read()
+        except ClientError as e:
+            if e.response["Error"]["Code"] == "NoSuchKey":
+                return None
+            raise e
+
+    def _signer(self) -> Any:
+        """
+        Returns the client used to sign presigned requests, created on first use. Signing
+        is computed locally, so this client never sends requests.
+        """
+        if self._signing_client is None:
+            self._signing_client = get_botocore_session().create_client(S3, **self._conn_config)
+        return self._signing_client
+
+    def _presigned_upload_key(
+        self, file_name: str, partition_values: Optional[Dict[str, Any]]
+    ) -> str:
+        partition_key = None
+        if self.partition_strategy:
+            partition_key = self.partition_strategy.partition_key(file_name, None, partition_values)
+        key = self._build_key(partition_key=partition_key, key=file_name)
+        # Content is uploaded bypassing this instance, so cached hash would be stale
+        if self._content_hashes is not None:
+            self._content_hashes.evict(key)
+        return key
+
+    def _limit(self, key: str) -> AsyncContextManager:
+        """
+        Context to send a request for the given `key` or listing prefix,
+        subject to client-side rate limiting when throttling is enabled.
+        """
+        if self._rate_limiter is None:
+            return nullcontext()
+        return self._rate_limiter.limit(key)
+
+    def _build_key(self, partition_key: Optional[str], key: str) -> str:
+        """
+        Build the key based on the prefix, partition key, and base key.
+
+        :param partition_key: Optional[str]: The partition key to add to the key.
+        :param key: str: The base file key.
+        :return: The constructed file key.
+        """
+        shard = get_shard_key(key, self.shards) if self.shards else ""
+        return (
+            f"{self.prefix or ''}{shard}"
+            f"{partition_key.rstrip('/') + '/' if partition_key else ''}{key}"
+        )
+
+    async def _list_compact(
+        self,
+        wildcard: str,
+        recursive: bool,
+        suffix: Optional[str],
+        min_size: Optional[int],
+        max_size: Optional[int],
+        modified_since: Optional[datetime],
+    ) -> CompactListing:
+        """
+        Lists keys matching `wildcard` and metadata filters into a `CompactListing`,
+        parsing partition keys and item ids a page at a time.
+        """
+        builder = CompactListingBuilder(
+            self.partition_strategy.split if self.partition_strategy else None, suffix
+        )
+        page: List[ListedObject] = []
+        async for obj in self._aioglob(wildcard, recursive):
+            if _match_metadata(obj, min_size, max_size, modified_since):
+                page.append(obj)
+                if len(page) == LISTING_PAGE_SIZE:
+                    builder.add_page(page)
+                    page = []
+        builder.add_page(page)
+        return builder.build()
+
+    async def _list_page(
+        self,
+        wildcard: str,
+        recursive: bool,
+        suffix: Optional[str],
+        page_size: int,
+        continuation_token: Optional[str],
+        start_after: Optional[str],
+    ) -> ListPage:
+        """
+        Lists up to `page_size` keys after the key encoded in `continuation_token`
+        or after `start_after`. One extra key is listed to know if there is a next page.
+        """
+        if page_size < 1:
+            raise ValueError(f"Invalid page_size: {page_size}. Expected a positive number.")
+        if continuation_token:
+            start_after = decode_page_token(continuation_token)
+        objects = [
+            obj
+            async for obj in self._aioglob(
+                wildcard, recursive, start_after=start_after, limit=page_size + 1
+            )
+        ]
+        next_token = None
+        if len(objects) > page_size:
+            objects = objects[:page_size]
+            next_token = encode_page_token(objects[-1].key)
+        builder = CompactListingBuilder(
+            self.partition_strategy.split if self.partition_strategy else None, suffix
+        )
+        builder.add_page(objects)
+        return ListPage(items=builder.build().to_list(), next_token=next_token)
+
+    def _partition_wildcard(self, wildcard: str, partition_values: Optional[Dict[str, Any]]) -> str:
+        """
+        Prepends to `wildcard` the partition folder derived from `partition_values`, if any.
+        """
+        if not (partition_values and self.partition_strategy):
+            return wildcard
+        partition_prefix = self.partition_strategy.partition_prefix(partition_values)
+        return f"{partition_prefix}{wildcard}" if partition_prefix else wildcard
 
     def _prune_prefix(self, file_path: str) -> str:
         if self.prefix:
-            return file_path[len(self.prefix) :]
+            file_path = file_path[len(self.prefix) :]
+        if self.shards:
+            file_path = file_path.split("/", 1)[1]
         return file_path
+
+
+def _expires_at(expires_in: int) -> datetime:
+    return datetime.now(tz=timezone.utc) + timedelta(seconds=expires_in)
+
+
+def _match_metadata(
+    obj: ListedObject,
+    min_size: Optional[int],
+    max_size: Optional[int],
+    modified_since: Optional[datetime],
+) -> bool:
+    """
+    Checks listed object metadata against listing filters.
+    """
+    if min_size is not None and obj.size < min_size:
+        return False
+    if max_size is not None and obj.size > max_size:
+        return False
+    if modified_since is not None and obj.last_modified < modified_since.timestamp():
+        return False
+    return True
@@ -2,9 +2,27 @@
 S3 Storage plugin package module
 """
 
+import hashlib
+from abc import ABC, abstractmethod
 from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import quote
 
-from hopeit.dataobjects import DataObject
+from hopeit.dataobjects import DataObject, dataclass, dataobject
+
+__all__ = [
+    "PartitionSettings",
+    "PartitionStrategy",
+    "DatePartition",
+    "FieldPartition",
+    "HashPartition",
+    "CompositePartition",
+    "build_partition_strategy",
+    "get_file_partition_key",
+    "get_partition_key",
+    "get_shard_key",
+    "get_shard_keys",
+]
 
 
 def get_file_partition_key(partition_dateformat: str) -> str:
@@ -15,3 +33,231 @@ def get_file_partition_key(partition_dateformat: str) -> str:
 def get_partition_key(payload: DataObject, partition_dateformat: str) -> str:
     ts = payload.event_ts() or datetime.now(tz=timezone.utc)  # type: ignore
     return ts.astimezone(timezone.utc).strftime(partition_dateformat.strip("/")) + "/"
+
+
+def get_shard_key(key: str, shards: int) -> str:
+    """
+    Returns the hash-derived shard directory for `key`, i.e. "0a/", spreading keys
+    evenly across `shards` directories. The same key always maps to the same shard.
+    """
+    return _hash_dir(key, shards)
+
+
+def get_shard_keys(shards: int) -> List[str]:
+    """
+    Returns all shard directories, i.e. ["00/", "01/", ..., "0f/"] for 16 shards.
+    """
+    return [_hash_dir_name(shard, shards) for shard in range(shards)]
+
+
+def _extract_attr(payload: Any, expr: str) -> Any:
+    value = payload
+    for attr_name in expr.split("."):
+        if value is None:
+            break
+        value = getattr(value, attr_name)
+    return value
+
+
+def _hash_dir(value: str, buckets: int) -> str:
+    digest = hashlib.md5(value.encode(), usedforsecurity=False).digest()
+    return _hash_dir_name(int.from_bytes(digest[:4], "big") % buckets, buckets)
+
+
+def _hash_dir_name(bucket: int, buckets: int) -> str:
+    width = len(f"{buckets - 1:x}")
+    return f"{bucket:0{width}x}/"
+
+
+@dataobject
+@dataclass
+class PartitionSettings:
+    """
+    Settings for one of the built-in partition strategies.
+
+    :field strategy, str: "date", "field" or "hash".
+    :field dateformat, Optional[str]: "date" strategy `strftime` format, i.e. "%Y/%m/%d/".
+    :field field, Optional[str]: "field" strategy dataobject field name, dot notation is
+        supported for nested fields. For "hash" strategy, field to hash instead of item key.
+    :field buckets, int: "hash" strategy number of hash buckets.
+    """
+
+    strategy: str
+    dateformat: Optional[str] = None
+    field: Optional[str] = None
+    buckets: int = 16
+
+
+class PartitionStrategy(ABC):
+    """
+    Computes the partition folder where an item is stored.
+
+    Implementations must produce partition keys with a fixed number of path components
+    (`n_components`), so locations can be split back into partition key and item id.
+
+    Partition values, used to partition files and to prune listings, are given as a dict:
+    "date" strategies use the "ts" entry, "field" strategies the entry named as the field,
+    and "hash" strategies the entry named as the field, or "key" to hash the item key.
+    """
+
+    n_components: int
+
+    @abstractmethod
+    def partition_key(
+        self, key: str, payload: Optional[Any], values: Optional[Dict[str, Any]]
+    ) -> str:
+        """
+        Returns partition key, with trailing "/", for item `key` storing `payload`
+        (None when storing files) using partition `values` when provided.
+        """
+
+    @abstractmethod
+    def partition_prefix(self, values: Dict[str, Any]) -> Optional[str]:
+        """
+        Returns partition key, with trailing "/", derived only from `values`
+        or None if `values` are not enough to determine it.
+        """
+
+    def split(self, path: str) -> Tuple[str, str]:
+        """
+        Splits `path` into partition key (without trailing "/") and item path.
+        """
+        comps = path.split("/")
+        return "/".join(comps[: self.n_components]), "/".join(comps[self.n_components :])
+
+
+class DatePartition(PartitionStrategy):
+    """
+    Partitions by date using `dateformat` on `event_ts()` for dataobjects,
+    or the "ts" partition value. Defaults to current UTC time.
+    """
+
+    def __init__(self, dateformat: str):
+        self.dateformat = dateformat.strip("/")
+        self.n_components = len(self.dateformat.split("/"))
+
+    def partition_key(
+        self, key: str, payload: Optional[Any], values: Optional[Dict[str, Any]]
+    ) -> str:
+        ts = (values or {}).get("ts")
+        if ts is None and payload is not None:
+            ts = payload.event_ts()  # type: ignore
+        return self._format(ts or datetime.now(tz=timezone.utc))
+
+    def partition_prefix(self, values: Dict[str, Any]) -> Optional[str]:
+        ts = values.get("ts")
+        return None if ts is None else self._format(ts)
+
+    def _format(self, ts: datetime) -> str:
+        return ts.astimezone(timezone.utc).strftime(self.dateformat) + "/"
+
+
+class FieldPartition(PartitionStrategy):
+    """
+    Partitions by the value of a dataobject `field`, i.e. a tenant id.
+    """
+
+    n_components = 1
+
+    def __init__(self, field: str):
+        self.field = field
+
+    def partition_key(
+        self, key: str, payload: Optional[Any], values: Optional[Dict[str, Any]]
+    ) -> str:
+        value = (values or {}).get(self.field)
+        if value is None and payload is not None:
+            value = _extract_attr(payload, self.field)
+        if value is None:
+            raise ValueError(f"Missing value for partition field: {self.field}")
+        return self._format(value)
+
+    def partition_prefix(self, values: Dict[str, Any]) -> Optional[str]:
+        value = values.get(self.field)
+        return None if value is None else self._format(value)
+
+    @staticmethod
+    def _format(value: Any) -> str:
+        return quote(str(value), safe="") + "/"
+
+
+class HashPartition(PartitionStrategy):
+    """
+    Partitions into `buckets` hash buckets of the item key, or of `field` value when given.
+    """
+
+    n_components = 1
+
+    def __init__(self, buckets: int, field: Optional[str] = None):
+        self.buckets = buckets
+        self.field = field
+
+    def partition_key(
+        self, key: str, payload: Optional[Any], values: Optional[Dict[str, Any]]
+    ) -> str:
+        if self.field is None:
+            return _hash_dir(key, self.buckets)
+        value = (values or {}).get(self.field)
+        if value is None and payload is not None:
+            value = _extract_attr(payload, self.field)
+        if value is None:
+            raise ValueError(f"Missing value for partition field: {self.field}")
+        return _hash_dir(str(value), self.buckets)
+
+    def partition_prefix(self, values: Dict[str, Any]) -> Optional[str]:
+        value = values.get(self.field or "key")
+        return None if value is None else _hash_dir(str(value), self.buckets)
+
+
+class CompositePartition(PartitionStrategy):
+    """
+    Nests partitions of each strategy in order, i.e. tenant then date.
+    Listings prune by the leading strategies which values are given.
+    """
+
+    def __init__(self, strategies: List[PartitionStrategy]):
+        self.strategies = strategies
+        self.n_components = sum(strategy.n_components for strategy in strategies)
+
+    def partition_key(
+        self, key: str, payload: Optional[Any], values: Optional[Dict[str, Any]]
+    ) -> str:
+        return "".join(strategy.partition_key(key, payload, values) for strategy in self.strategies)
+
+    def partition_prefix(self, values: Dict[str, Any]) -> Optional[str]:
+        prefix = ""
+        for strategy in self.strategies:
+            part = strategy.partition_prefix(values)
+            if part is None:
+                break
+            prefix += part
+        return prefix or None
+
+
+def build_partition_strategy(
+    partition_dateformat: Optional[str], partitioning: List[PartitionSettings]
+) -> Optional[PartitionStrategy]:
+    """
+    Creates the `PartitionStrategy` for `ObjectStorageSettings`: `partitioning` settings
+    when specified, more than one are combined in a `CompositePartition`,
+    otherwise a `DatePartition` using `partition_dateformat` if set.
+    """
+    if partitioning:
+        assert not partition_dateformat, "Use either partition_dateformat or partitioning"
+        strategies = [_create_strategy(settings) for settings in partitioning]
+        return strategies[0] if len(strategies) == 1 else CompositePartition(strategies)
+    if partition_dateformat and partition_dateformat.strip("/"):
+        return DatePartition(partition_dateformat)
+    return None
+
+
+def _create_strategy(settings: PartitionSettings) -> PartitionStrategy:
+    if settings.strategy == "date":
+        assert settings.dateformat, "dateformat is required for date partitions"
+        return DatePartition(settings.dateformat)
+    if settings.strategy == "field":
+        assert settings.field, "field is required for field partitions"
+        return FieldPartition(settings.field)
+    if settings.strategy == "hash":
+        return HashPartition(settings.buckets, settings.field)
+    raise ValueError(f"Unknown partition strategy: {settings.strategy}")
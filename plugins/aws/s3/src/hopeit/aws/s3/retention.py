@@ -0,0 +1,116 @@
+"""
+Retention: finds expired partitions from partition folder names, so old data can be purged
+without listing live data.
+
+Each folder level of the partition layout is checked against the cutoff time: the period
+covered by a date partition folder is computed from its `dateformat`, i.e. `2020/05/` covers
+May 2020 using `%Y/%m/%d/`. Folders whose period ends before the cutoff are expired, folders
+starting after the cutoff are skipped, and only folders overlapping the cutoff are listed
+deeper. Folders of "field" and "hash" partitions are always listed deeper.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from hopeit.dataobjects import dataclass, dataobject, field
+
+from .partition import CompositePartition, DatePartition, PartitionStrategy
+
+__all__ = ["PurgeResult", "date_period", "partition_expired", "has_date_partition"]
+
+DIRECTIVE = re.compile(r"%[a-zA-Z]")
+
+# Period added by the finest directive in a date format, in order from coarsest
+PERIODS = [
+    ({"%Y", "%y"}, "year"),
+    ({"%m", "%b", "%B"}, "month"),
+    ({"%d", "%j"}, timedelta(days=1)),
+    ({"%H"}, timedelta(hours=1)),
+    ({"%M"}, timedelta(minutes=1)),
+    ({"%S"}, timedelta(seconds=1)),
+]
+KNOWN_DIRECTIVES = set().union(*(directives for directives, _ in PERIODS))
+
+
+@dataobject
+@dataclass
+class PurgeResult:
+    """
+    Result of purging expired partitions.
+
+    :field cutoff, datetime: items in partitions ending before this time were purged.
+    :field partitions, List[str]: expired partition folders, without shard.
+    :field items, int: number of objects and files deleted, or to delete on dry run.
+    :field size, int: bytes freed, or to free on dry run.
+    :field failed, int: number of items that could not be deleted.
+    :field dry_run, bool: True if nothing was deleted.
+    """
+
+    cutoff: datetime
+    partitions: List[str] = field(default_factory=list)
+    items: int = 0
+    size: int = 0
+    failed: int = 0
+    dry_run: bool = False
+
+
+def date_period(dateformat: str, comps: List[str]) -> Optional[Tuple[datetime, datetime]]:
+    """
+    Returns the UTC time period covered by partition folder `comps`, the leading folders
+    of a date partition formatted with `dateformat`, or None if it can't be determined,
+    i.e. folders don't include the year or use unsupported directives.
+    """
+    fmt = "/".join(dateformat.strip("/").split("/")[: len(comps)])
+    directives = set(DIRECTIVE.findall(fmt))
+    if not directives & {"%Y", "%y"} or not directives <= KNOWN_DIRECTIVES:
+        return None
+    try:
+        start = datetime.strptime("/".join(comps), fmt).replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+    period = next(period for keys, period in reversed(PERIODS) if directives & keys)
+    if period == "year":
+        return start, start.replace(year=start.year + 1)
+    if period == "month":
+        year, month = divmod(start.month, 12)
+        return start, start.replace(year=start.year + year, month=month + 1)
+    assert isinstance(period, timedelta)
+    return start, start + period
+
+
+def partition_expired(
+    strategy: PartitionStrategy, comps: List[str], cutoff: datetime
+) -> Optional[bool]:
+    """
+    Checks leading partition folder `comps` against `cutoff`: returns True if every item in it
+    is older than `cutoff`, False if every item is newer, or None if it can't be determined
+    from these folders.
+    """
+    strategies = strategy.strategies if isinstance(strategy, CompositePartition) else [strategy]
+    expired: Optional[bool] = None
+    for part_strategy in strategies:
+        if not comps:
+            break
+        part, comps = comps[: part_strategy.n_components], comps[part_strategy.n_components :]
+        if not isinstance(part_strategy, DatePartition):
+            continue
+        period = date_period(part_strategy.dateformat, part)
+        if period is None:
+            continue
+        start, end = period
+        if end <= cutoff:
+            return True
+        if start >= cutoff:
+            expired = False
+    return expired
+
+
+def has_date_partition(strategy: Optional[PartitionStrategy]) -> bool:
+    """
+    Returns whether `strategy` includes a date partition.
+    """
+    if strategy is None:
+        return False
+    strategies = strategy.strategies if isinstance(strategy, CompositePartition) else [strategy]
+    return any(isinstance(part_strategy, DatePartition) for part_strategy in strategies)
@@ -0,0 +1,262 @@
+"""
+Segment files: pack many small dataobjects of a partition into a single object,
+reducing PUT requests and listed keys by orders of magnitude.
+
+A segment is stored as `partition/segment_id.seg` and contains, in order:
+- one gzip member per record, with the json of the dataobject followed by a newline,
+  so each record can be read alone using a ranged GET,
+- a gzip compressed json index of `[item_id, offset, length]` entries,
+- a fixed size footer with the offset and length of the index.
+
+Records section is a valid multi-member gzip stream of NDJSON. Segments are immutable,
+so indexes read from S3 are cached locally without validation.
+"""
+
+import gzip
+import json
+import struct
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from hopeit.dataobjects import dataclass, dataobject
+from hopeit.dataobjects.payload import Payload
+
+__all__ = [
+    "SegmentSettings",
+    "SegmentInfo",
+    "SegmentEntry",
+    "SegmentIndex",
+    "SegmentIndexCache",
+    "SegmentWriter",
+    "encode_record",
+    "decode_record",
+    "encode_segment",
+    "decode_footer",
+    "decode_index",
+]
+
+SEGMENT_SUFFIX = ".seg"
+SEGMENT_VERSION = 1
+SEGMENT_MAGIC = b"HSG1"
+FOOTER = struct.Struct(">QI4s")
+SEGMENT_TAIL_SIZE = 64 * 1024
+
+
+@dataobject
+@dataclass
+class SegmentSettings:
+    """
+    Segment files settings.
+
+    :field max_items, int: max number of items buffered per partition before flushing
+        a segment when using `SegmentWriter`.
+    :field max_bytes, int: max size in bytes of compressed items buffered per partition
+        before flushing a segment when using `SegmentWriter`.
+    :field cache_size, int: max number of segment indexes kept in memory, so items
+        from the same segment are read with a single ranged GET each.
+    """
+
+    max_items: int = 10000
+    max_bytes: int = 8 * 1024 * 1024
+    cache_size: int = 256
+
+
+@dataobject
+@dataclass
+class SegmentInfo:
+    """
+    Stored segment.
+
+    :field segment_id, str: segment identifier, to read its items.
+    :field partition_key, Optional[str]: partition where the segment is stored.
+    :field location, str: segment location in the bucket, relative to prefix.
+    :field count, int: number of items in the segment.
+    :field size, int: segment size in bytes.
+    """
+
+    segment_id: str
+    partition_key: Optional[str]
+    location: str
+    count: int
+    size: int
+
+
+class SegmentEntry(NamedTuple):
+    """
+    Index entry: `offset` and `length` in bytes of the compressed record of `item_id`.
+    """
+
+    item_id: str
+    offset: int
+    length: int
+
+
+class SegmentIndex:
+    """
+    Index of a segment: entries in storage order and lookup by item id.
+    """
+
+    def __init__(self, entries: List[SegmentEntry], index_offset: int):
+        self.entries = entries
+        self.index_offset = index_offset
+        self._lookup: Dict[str, SegmentEntry] = {entry.item_id: entry for entry in entries}
+
+    def get(self, item_id: str) -> Optional[SegmentEntry]:
+        return self._lookup.get(item_id)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+def encode_record(value: Any) -> bytes:
+    """
+    Returns `value` dataobject as a compressed record.
+    """
+    return gzip.compress(Payload.to_json(value).encode() + b"\n", mtime=0)
+
+
+def decode_record(data: bytes, datatype: Any) -> Any:
+    """
+    Returns dataobject of `datatype` from a record created with `encode_record`.
+    """
+    return Payload.from_json(gzip.decompress(data), datatype)
+
+
+def encode_segment(records: Sequence[Tuple[str, bytes]]) -> Tuple[bytes, List[SegmentEntry]]:
+    """
+    Returns segment contents and index entries for `records`, a sequence of
+    item ids and records created with `encode_record`.
+    """
+    entries: List[SegmentEntry] = []
+    offset = 0
+    for item_id, record in records:
+        entries.append(SegmentEntry(item_id, offset, len(record)))
+        offset += len(record)
+    index = gzip.compress(
+        json.dumps(
+            {"version": SEGMENT_VERSION, "items": [list(entry) for entry in entries]},
+            separators=(",", ":"),
+        ).encode(),
+        mtime=0,
+    )
+    footer = FOOTER.pack(offset, len(index), SEGMENT_MAGIC)
+    return b"".join([*(record for _, record in records), index, footer]), entries
+
+
+def decode_footer(data: bytes) -> Tuple[int, int]:
+    """
+    Returns index offset and length from the last bytes of a segment.
+    """
+    if len(data) < FOOTER.size:
+        raise ValueError("Invalid segment: missing footer")
+    index_offset, index_length, magic = FOOTER.unpack(data[-FOOTER.size :])
+    if magic != SEGMENT_MAGIC:
+        raise ValueError("Invalid segment: footer not found")
+    return index_offset, index_length
+
+
+def decode_index(data: bytes) -> List[SegmentEntry]:
+    """
+    Returns index entries from the index section of a segment.
+    """
+    index = json.loads(gzip.decompress(data))
+    if index.get("version") != SEGMENT_VERSION:
+        raise ValueError(f"Unsupported segment version: {index.get('version')}")
+    return [SegmentEntry(*entry) for entry in index["items"]]
+
+
+def new_segment_id() -> str:
+    return uuid.uuid4().hex
+
+
+class SegmentIndexCache:
+    """
+    LRU cache of segment indexes by segment key.
+    """
+
+    def __init__(self, cache_size: int):
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, SegmentIndex]" = OrderedDict()
+
+    def get(self, segment_key: str) -> Optional[SegmentIndex]:
+        index = self._cache.get(segment_key)
+        if index is not None:
+            self._cache.move_to_end(segment_key)
+        return index
+
+    def put(self, segment_key: str, index: SegmentIndex) -> None:
+        self._cache[segment_key] = index
+        self._cache.move_to_end(segment_key)
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+
+class SegmentWriter:
+    """
+    Buffers dataobjects per partition and stores them as segments when `max_items`
+    or `max_bytes` are reached, or when `flush` is called. Items are compressed when
+    appended, so memory usage is bounded by `max_bytes` per partition.
+
+    Use `ObjectStorage.segment_writer()` to create a writer. As an async context manager,
+    pending items are flushed on exit::
+
+        async with object_storage.segment_writer() as writer:
+            for event in events:
+                await writer.append(key=event.id, value=event)
+    """
+
+    def __init__(self, object_storage: Any, settings: SegmentSettings):
+        self.object_storage = object_storage
+        self.settings = settings
+        self._buffers: Dict[Optional[str], List[Tuple[str, bytes]]] = {}
+        self._sizes: Dict[Optional[str], int] = {}
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of appended items not yet stored.
+        """
+        return sum(len(buffer) for buffer in self._buffers.values())
+
+    async def append(self, *, key: str, value: Any) -> Optional[SegmentInfo]:
+        """
+        Appends `value` to the buffer of its partition.
+
+        :param key: item id
+        :param value: hopeit @dataobject
+        :return: `SegmentInfo` if the partition buffer was full and a segment was stored.
+        """
+        partition_key = None
+        if self.object_storage.partition_strategy:
+            partition_key = self.object_storage.partition_strategy.partition_key(key, value, None)
+        record = encode_record(value)
+        buffer = self._buffers.setdefault(partition_key, [])
+        buffer.append((key, record))
+        self._sizes[partition_key] = self._sizes.get(partition_key, 0) + len(record)
+        if (
+            len(buffer) >= self.settings.max_items
+            or self._sizes[partition_key] >= self.settings.max_bytes
+        ):
+            return await self._flush_partition(partition_key)
+        return None
+
+    async def flush(self) -> List[SegmentInfo]:
+        """
+        Stores buffered items of every partition as segments.
+
+        :return: list of stored `SegmentInfo`
+        """
+        return [await self._flush_partition(partition_key) for partition_key in list(self._buffers)]
+
+    async def _flush_partition(self, partition_key: Optional[str]) -> SegmentInfo:
+        records = self._buffers.pop(partition_key)
+        self._sizes.pop(partition_key)
+        return await self.object_storage._put_segment(partition_key, records)
+
+    async def __aenter__(self) -> "SegmentWriter":
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback) -> None:
+        if exc_type is None:
+            await self.flush()
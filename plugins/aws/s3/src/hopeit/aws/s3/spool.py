@@ -0,0 +1,493 @@
+"""
+Durable local spool: writes are appended to a local journal and return immediately,
+while a background uploader drains the journal to S3 with retries. Pending writes
+survive restarts and are uploaded by the next `ObjectStorage` using the same spool path.
+
+Journal files are stored in `path/bucket/prefix/` as numbered segments, `000000000001.journal`,
+with one record per write: a header with lengths and crc32, json metadata and data.
+Uploaded records are acknowledged appending their offset to `000000000001.acks`.
+Segments are deleted once all their records are uploaded.
+"""
+
+import asyncio
+import json
+import os
+import struct
+import threading
+import time
+import zlib
+from pathlib import Path
+from typing import (
+    IO,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from hopeit.dataobjects import dataclass, dataobject
+
+from .writebehind import BackpressureCallback, ErrorCallback, PendingWrite, _LoopState
+
+__all__ = ["SpoolSettings", "Spool", "get_spool"]
+
+JOURNAL_SUFFIX = ".journal"
+ACKS_SUFFIX = ".acks"
+RECORD_MAGIC = b"HSP1"
+RECORD_HEADER = struct.Struct(">4sIII")
+ACK = struct.Struct(">Q")
+
+
+@dataobject
+@dataclass
+class SpoolSettings:
+    """
+    Local spool settings.
+
+    :field path, str: local folder where journal files are stored.
+    :field max_bytes, int: max size in bytes of pending writes in the journal. When reached,
+        writers wait until pending writes are uploaded (backpressure).
+    :field segment_bytes, int: size in bytes after which a new journal segment is started.
+    :field batch_bytes, int: max size in bytes of pending writes read from disk and uploaded
+        in each round.
+    :field concurrency, int: max number of writes sent to S3 concurrently.
+    :field retry_interval, float: seconds to wait before retrying failed uploads,
+        doubled after each failed round up to `max_retry_interval`.
+    :field max_retry_interval, float: max seconds between upload retries.
+    :field fsync, bool: if True, journal is synced to disk on every write before returning.
+    """
+
+    path: str
+    max_bytes: int = 1024 * 1024 * 1024
+    segment_bytes: int = 64 * 1024 * 1024
+    batch_bytes: int = 8 * 1024 * 1024
+    concurrency: int = 16
+    retry_interval: float = 1.0
+    max_retry_interval: float = 60.0
+    fsync: bool = True
+
+
+class SpooledWrite(NamedTuple):
+    """
+    Location in the journal of a pending write.
+    """
+
+    segment: int
+    offset: int
+    key: str
+    size: int
+    item_id: Optional[str]
+    partition_key: Optional[str]
+
+
+class Spool:
+    """
+    Pending writes journaled to local disk, by bucket key. Writing the same key again
+    supersedes its pending write, so reads on the same process see the latest write.
+
+    Writes are uploaded by `write_batch`, which returns an error, or None, for each write.
+    Failed writes are reported to `on_error` and retried with exponential backoff.
+    """
+
+    def __init__(
+        self,
+        settings: SpoolSettings,
+        name: str,
+        write_batch: Callable[[Sequence[PendingWrite]], Awaitable[List[Optional[BaseException]]]],
+    ):
+        self.settings = settings
+        self.on_error: Optional[ErrorCallback] = None
+        self.on_backpressure: Optional[BackpressureCallback] = None
+        self.path = Path(settings.path) / name
+        self._write_batch = write_batch
+        self._pending: Dict[str, SpooledWrite] = {}
+        self._in_flight: Set[Tuple[int, int]] = set()
+        self._in_flight_keys: Set[str] = set()
+        self._unacked: Dict[int, int] = {}
+        self._bytes = 0
+        self._retry_at = 0.0
+        self._retry_interval = settings.retry_interval
+        self._file_lock = threading.Lock()
+        self._segment = 0
+        self._journal: Optional[IO[bytes]] = None
+        self._states: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+        self._load()
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of pending writes.
+        """
+        return len(self._pending)
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        Size in bytes of pending writes.
+        """
+        return self._bytes
+
+    def is_pending(self, key: str) -> bool:
+        """
+        Returns whether there is a pending write for `key`.
+        """
+        return key in self._pending
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns pending data for `key` read from the journal, or None if there is no pending write.
+        The journal is read in the calling thread, use `read` from async code.
+        """
+        spooled = self._pending.get(key)
+        if spooled is None:
+            return None
+        return self._read(spooled)
+
+    async def read(self, key: str) -> Optional[bytes]:
+        """
+        Returns pending data for `key`, or None if there is no pending write. Pending writes
+        are looked up in memory and only the journal record of a pending write is read,
+        in a worker thread, so the event loop is not blocked.
+        """
+        spooled = self._pending.get(key)
+        if spooled is None:
+            return None
+        return await asyncio.to_thread(self._read, spooled)
+
+    def size(self, key: str) -> Optional[int]:
+        """
+        Returns size in bytes of pending write for `key`, or None if there is no pending write.
+        """
+        spooled = self._pending.get(key)
+        return None if spooled is None else spooled.size
+
+    def discard(self, key: str) -> None:
+        """
+        Drops pending write for `key`, i.e. when it is deleted.
+        """
+        spooled = self._pending.pop(key, None)
+        if spooled is not None:
+            self._bytes -= spooled.size
+            if (spooled.segment, spooled.offset) not in self._in_flight:
+                self._ack(spooled)
+
+    async def wait_in_flight(self, key: str) -> None:
+        """
+        Waits until a write for `key` being uploaded completes, so a delete issued after
+        it returns is not overwritten by that write.
+        """
+        if key not in self._in_flight_keys:
+            return
+        state = self._state()
+        async with state.changed:
+            await state.changed.wait_for(lambda: key not in self._in_flight_keys)
+
+    async def put(self, write: PendingWrite) -> bool:
+        """
+        Appends `write` to the journal, waiting while pending writes exceed `max_bytes`.
+
+        :return: False if `write` is larger than `max_bytes` and must be written directly.
+        """
+        size = len(write.data)
+        if size > self.settings.max_bytes:
+            return False
+        state = self._state()
+        async with state.changed:
+            if self._bytes + size > self.settings.max_bytes:
+                if self.on_backpressure is not None:
+                    self.on_backpressure(self._bytes)
+                state.wakeup.set()
+                await state.changed.wait_for(lambda: self._bytes + size <= self.settings.max_bytes)
+            spooled = await asyncio.to_thread(self._append, write)
+            self.discard(write.key)
+            self._pending[write.key] = spooled
+            self._bytes += size
+        state.wakeup.set()
+        return True
+
+    def start(self) -> None:
+        """
+        Starts uploading pending writes in the background on the running event loop,
+        i.e. writes left in the journal by a previous process.
+        """
+        if self._pending:
+            self._state().wakeup.set()
+
+    async def flush(self) -> int:
+        """
+        Uploads pending writes, stopping at the first round with failed uploads.
+
+        :return: number of uploaded writes. Failed writes are kept pending.
+        """
+        state = self._state()
+        uploaded = 0
+        while True:
+            stored, failed = await self._upload(state)
+            uploaded += stored
+            if failed or not stored:
+                return uploaded
+
+    async def close(self) -> int:
+        """
+        Uploads pending writes, stops background uploads and closes the journal.
+        Writes that could not be uploaded remain in the journal for next start.
+
+        :return: number of uploaded writes.
+        """
+        uploaded = await self.flush()
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None and state.task is not None:
+            state.task.cancel()
+        with self._file_lock:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            if not self._unacked.get(self._segment):
+                self._remove_segment(self._segment)
+        if _spools.get(str(self.path)) is self:
+            del _spools[str(self.path)]
+        return uploaded
+
+    async def _upload(self, state: _LoopState) -> Tuple[int, int]:
+        """
+        Uploads a batch of up to `batch_bytes` pending writes.
+
+        :return: number of uploaded and failed writes
+        """
+        async with state.flush_lock:
+            batch: List[SpooledWrite] = []
+            batch_bytes = 0
+            for spooled in self._pending.values():
+                if batch and batch_bytes + spooled.size > self.settings.batch_bytes:
+                    break
+                batch.append(spooled)
+                batch_bytes += spooled.size
+            if not batch:
+                return 0, 0
+            for spooled in batch:
+                self._in_flight.add((spooled.segment, spooled.offset))
+            self._in_flight_keys = {spooled.key for spooled in batch}
+            try:
+                writes = await asyncio.to_thread(self._read_writes, batch)
+                errors = await self._write_batch(writes)
+            except Exception as e:  # pylint: disable=broad-except
+                errors = [e] * len(batch)
+            finally:
+                for spooled in batch:
+                    self._in_flight.discard((spooled.segment, spooled.offset))
+                self._in_flight_keys = set()
+            uploaded = failed = 0
+            for spooled, error in zip(batch, errors):
+                current = self._pending.get(spooled.key) is spooled
+                if error is not None and current:
+                    failed += 1
+                    if self.on_error is not None:
+                        self.on_error(spooled.key, error)
+                    continue
+                if error is None:
+                    uploaded += 1
+                if current:
+                    del self._pending[spooled.key]
+                    self._bytes -= spooled.size
+                # Superseded or discarded while uploading: no need to retry
+                self._ack(spooled)
+        async with state.changed:
+            state.changed.notify_all()
+        return uploaded, failed
+
+    def _state(self) -> _LoopState:
+        """
+        Returns state for the running event loop, starting its background upload task.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            for other in [other for other in self._states if other.is_closed()]:
+                del self._states[other]
+            state = _LoopState()
+            self._states[loop] = state
+        if state.task is None or state.task.done():
+            state.task = loop.create_task(self._run(state))
+        return state
+
+    async def _run(self, state: _LoopState) -> None:
+        """
+        Background task uploading pending writes, backing off after failed rounds.
+        """
+        while True:
+            if not self._pending:
+                await state.wakeup.wait()
+            state.wakeup.clear()
+            delay = self._retry_at - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            _, failed = await self._upload(state)
+            if failed:
+                self._retry_at = time.monotonic() + self._retry_interval
+                self._retry_interval = min(
+                    self._retry_interval * 2, self.settings.max_retry_interval
+                )
+            else:
+                self._retry_interval = self.settings.retry_interval
+
+    def _append(self, write: PendingWrite) -> SpooledWrite:
+        """
+        Appends `write` to the current journal segment, starting a new one when full.
+        """
+        meta = json.dumps(
+            {"key": write.key, "item_id": write.item_id, "partition_key": write.partition_key}
+        ).encode()
+        crc = zlib.crc32(write.data, zlib.crc32(meta))
+        header = RECORD_HEADER.pack(RECORD_MAGIC, len(meta), len(write.data), crc)
+        with self._file_lock:
+            if self._journal is None or self._journal.tell() >= self.settings.segment_bytes:
+                self._rotate()
+            assert self._journal is not None
+            offset = self._journal.tell()
+            self._journal.write(header + meta + write.data)
+            self._journal.flush()
+            if self.settings.fsync:
+                os.fsync(self._journal.fileno())
+            self._unacked[self._segment] = self._unacked.get(self._segment, 0) + 1
+            return SpooledWrite(
+                self._segment,
+                offset,
+                write.key,
+                len(write.data),
+                write.item_id,
+                write.partition_key,
+            )
+
+    def _rotate(self) -> None:
+        if self._journal is not None:
+            self._journal.close()
+            if not self._unacked.get(self._segment):
+                self._remove_segment(self._segment)
+        self._segment += 1
+        self._journal = open(self._segment_path(self._segment, JOURNAL_SUFFIX), "ab")
+
+    def _ack(self, spooled: SpooledWrite) -> None:
+        """
+        Records `spooled` as uploaded, removing its segment once fully uploaded.
+        """
+        with self._file_lock:
+            with open(self._segment_path(spooled.segment, ACKS_SUFFIX), "ab") as acks:
+                acks.write(ACK.pack(spooled.offset))
+            self._unacked[spooled.segment] -= 1
+            if not self._unacked[spooled.segment] and spooled.segment != self._segment:
+                self._remove_segment(spooled.segment)
+
+    def _remove_segment(self, segment: int) -> None:
+        self._unacked.pop(segment, None)
+        for suffix in (JOURNAL_SUFFIX, ACKS_SUFFIX):
+            self._segment_path(segment, suffix).unlink(missing_ok=True)
+
+    def _read(self, spooled: SpooledWrite) -> bytes:
+        with open(self._segment_path(spooled.segment, JOURNAL_SUFFIX), "rb") as journal:
+            journal.seek(spooled.offset)
+            header = journal.read(RECORD_HEADER.size)
+            _, meta_length, data_length, _ = RECORD_HEADER.unpack(header)
+            journal.seek(meta_length, os.SEEK_CUR)
+            return journal.read(data_length)
+
+    def _read_writes(self, batch: List[SpooledWrite]) -> List[PendingWrite]:
+        return [
+            PendingWrite(spooled.key, self._read(spooled), spooled.item_id, spooled.partition_key)
+            for spooled in batch
+        ]
+
+    def _load(self) -> None:
+        """
+        Loads pending writes from journal segments left by a previous process,
+        truncating records partially written before a crash.
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        segments = sorted(
+            int(path.stem) for path in self.path.iterdir() if path.suffix == JOURNAL_SUFFIX
+        )
+        self._segment = segments[-1] if segments else 0
+        for segment in segments:
+            acks_path = self._segment_path(segment, ACKS_SUFFIX)
+            acked = set()
+            if acks_path.exists():
+                data = acks_path.read_bytes()
+                acked = {
+                    ACK.unpack_from(data, i)[0]
+                    for i in range(0, len(data) - len(data) % ACK.size, ACK.size)
+                }
+            journal_path = self._segment_path(segment, JOURNAL_SUFFIX)
+            valid_length = 0
+            with open(journal_path, "rb") as journal:
+                for spooled, end in self._scan(segment, journal):
+                    valid_length = end
+                    if spooled.offset in acked:
+                        continue
+                    self._unacked[segment] = self._unacked.get(segment, 0) + 1
+                    previous = self._pending.get(spooled.key)
+                    if previous is not None:
+                        self._bytes -= previous.size
+                        self._ack(previous)
+                    self._pending[spooled.key] = spooled
+                    self._bytes += spooled.size
+            if valid_length < journal_path.stat().st_size:
+                os.truncate(journal_path, valid_length)
+            if not self._unacked.get(segment):
+                self._remove_segment(segment)
+
+    def _scan(self, segment: int, journal: IO[bytes]):
+        """
+        Yields valid records in a journal segment with the offset where each one ends.
+        """
+        while True:
+            offset = journal.tell()
+            header = journal.read(RECORD_HEADER.size)
+            if len(header) < RECORD_HEADER.size:
+                return
+            magic, meta_length, data_length, crc = RECORD_HEADER.unpack(header)
+            if magic != RECORD_MAGIC:
+                return
+            meta = journal.read(meta_length)
+            data = journal.read(data_length)
+            if len(data) < data_length or zlib.crc32(data, zlib.crc32(meta)) != crc:
+                return
+            info = json.loads(meta)
+            yield (
+                SpooledWrite(
+                    segment,
+                    offset,
+                    info["key"],
+                    data_length,
+                    info["item_id"],
+                    info["partition_key"],
+                ),
+                journal.tell(),
+            )
+
+    def _segment_path(self, segment: int, suffix: str) -> Path:
+        return self.path / f"{segment:012d}{suffix}"
+
+
+_spools: Dict[str, Spool] = {}
+
+
+def get_spool(
+    settings: SpoolSettings,
+    name: str,
+    write_batch: Callable[[Sequence[PendingWrite]], Awaitable[List[Optional[BaseException]]]],
+) -> Spool:
+    """
+    Returns the process wide `Spool` stored in folder `name` under `settings.path`, so every
+    `ObjectStorage` instance writing to the same bucket and prefix shares the journal.
+    Pending writes are uploaded using `write_batch` of the instance that created the spool.
+    """
+    path = str(Path(settings.path) / name)
+    spool = _spools.get(path)
+    if spool is None:
+        spool = Spool(settings, name, write_batch)
+        _spools[path] = spool
+    return spool
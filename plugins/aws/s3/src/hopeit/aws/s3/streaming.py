@@ -0,0 +1,329 @@
+"""
+Streaming helpers: retrieve listed objects concurrently with bounded look-ahead
+and stream them as newline delimited json (NDJSON) responses, and ingest NDJSON
+request bodies storing parsed objects with a bounded number of concurrent writes.
+"""
+
+import asyncio
+from collections import deque
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Deque,
+    Iterable,
+    Optional,
+    Set,
+    Tuple,
+    Type,
+    TypeVar,
+    Union,
+)
+
+from hopeit.app.context import EventContext, PostprocessHook, PostprocessStreamResponseHook
+from hopeit.dataobjects import dataclass, dataobject
+from hopeit.dataobjects.payload import Payload
+
+from .listing import ItemLocator
+from .object_storage import ObjectStorage
+
+__all__ = [
+    "NDJSON_CONTENT_TYPE",
+    "IngestResult",
+    "prepare_chunked_response",
+    "get_objects",
+    "stream_ndjson",
+    "read_ndjson",
+    "store_ndjson",
+]
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+MAX_LINE_SIZE = 1024 * 1024
+
+ItemLocators = Union[Iterable[ItemLocator], AsyncIterable[ItemLocator]]
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+@dataobject
+@dataclass
+class IngestResult:
+    """
+    Result of storing one NDJSON line.
+
+    :field line, int: line number in the ingested body, starting at 1.
+    :field key, Optional[str]: key of the stored object.
+    :field location, Optional[str]: location where the object was stored, None on errors.
+    :field error, Optional[str]: reason why the line could not be parsed or stored.
+    """
+
+    line: int
+    key: Optional[str] = None
+    location: Optional[str] = None
+    error: Optional[str] = None
+
+
+async def _iter_items(items: Union[Iterable[T], AsyncIterable[T]]) -> AsyncIterator[T]:
+    if isinstance(items, AsyncIterable):
+        async for item in items:
+            yield item
+    else:
+        for item in items:
+            yield item
+
+
+async def _map_bounded(
+    func: Callable[[T], Coroutine[Any, Any, R]],
+    items: Union[Iterable[T], AsyncIterable[T]],
+    concurrency: int,
+    ordered: bool,
+) -> AsyncIterator[R]:
+    """
+    Applies `func` to `items` running up to `concurrency` calls at the same time,
+    yielding results in `items` order if `ordered`, otherwise as soon as they complete.
+    """
+    if concurrency < 1:
+        raise ValueError(f"Invalid concurrency: {concurrency}. Expected a positive number.")
+    pending: Deque[asyncio.Task] = deque()
+    running: Set[asyncio.Task] = set()
+    try:
+        async for item in _iter_items(items):
+            task = asyncio.create_task(func(item))
+            pending.append(task)
+            running.add(task)
+            if len(running) >= concurrency:
+                async for result in _completed(pending, running, ordered, wait_all=False):
+                    yield result
+        async for result in _completed(pending, running, ordered, wait_all=True):
+            yield result
+    finally:
+        for task in running:
+            task.cancel()
+
+
+async def _completed(
+    pending: Deque[asyncio.Task],
+    running: Set[asyncio.Task],
+    ordered: bool,
+    wait_all: bool,
+) -> AsyncIterator[Any]:
+    """
+    Yields results of finished tasks: waits for at least one, or for all if `wait_all`.
+    """
+    while running:
+        if ordered:
+            task = pending.popleft()
+            result = await task
+            running.discard(task)
+            yield result
+        else:
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                running.discard(task)
+                pending.remove(task)
+                yield task.result()
+        if not wait_all:
+            return
+
+
+async def get_objects(
+    object_storage: ObjectStorage,
+    items: ItemLocators,
+    datatype: Type[Any],
+    *,
+    concurrency: int = 16,
+    ordered: bool = True,
+) -> AsyncIterator[Tuple[ItemLocator, Optional[Any]]]:
+    """
+    Retrieves objects located by `items`, keeping up to `concurrency` requests in flight.
+
+    :param object_storage, ObjectStorage: storage to retrieve objects from.
+    :param items: `ItemLocator`s, i.e. returned by `list_objects` or `list_objects_page`,
+        or an async iterable of them.
+    :param datatype: dataclass implementing @dataobject (@see DataObject)
+    :param concurrency, int: max number of objects retrieved concurrently.
+    :param ordered, bool: if True, objects are yielded in the same order as `items`,
+        otherwise as soon as each one is retrieved.
+    :yields: tuples of `ItemLocator` and retrieved object, None if it was not found.
+    """
+
+    async def get(item: ItemLocator) -> Tuple[ItemLocator, Optional[Any]]:
+        value = await object_storage.get(
+            key=item.item_id, datatype=datatype, partition_key=item.partition_key
+        )
+        return item, value
+
+    async for result in _map_bounded(get, items, concurrency, ordered):
+        yield result
+
+
+async def prepare_chunked_response(
+    context: EventContext,
+    response: PostprocessHook,
+    *,
+    content_disposition: str,
+    content_type: str,
+) -> PostprocessStreamResponseHook:
+    """
+    Prepares a stream response of unknown length, sent using chunked transfer encoding,
+    to be written as content is produced. To be used in `__postprocess__` event methods.
+
+    `PostprocessHook.prepare_stream_response` expects a `content_length`: None is passed,
+    so the underlying aiohttp `StreamResponse` is sent without `Content-Length` and falls
+    back to chunked encoding, and the `Content-Length` header the testing hook sets from
+    the given value is removed from `response` headers.
+
+    :param context, EventContext: event context
+    :param response, PostprocessHook: response hook from `__postprocess__`
+    :param content_disposition, str: Content-Disposition header,
+        i.e. 'attachment; filename="files.zip"'.
+    :param content_type, str: Content-Type header.
+    :return: prepared stream response to `write` content to.
+    """
+    stream_response = await response.prepare_stream_response(
+        context,
+        content_disposition=content_disposition,
+        content_type=content_type,
+        content_length=None,  # type: ignore[arg-type]
+    )
+    response.headers.pop("Content-Length", None)
+    return stream_response
+
+
+async def stream_ndjson(
+    object_storage: ObjectStorage,
+    items: ItemLocators,
+    datatype: Type[Any],
+    context: EventContext,
+    response: PostprocessHook,
+    *,
+    file_name: str = "objects.ndjson",
+    concurrency: int = 16,
+    ordered: bool = True,
+) -> int:
+    """
+    Streams objects located by `items` as NDJSON, one json object per line, using
+    `PostprocessHook.prepare_stream_response`. Objects are retrieved concurrently
+    using `get_objects` and written as soon as they are available. Not found
+    objects are skipped. To be used in `__postprocess__` event methods.
+
+    :param object_storage, ObjectStorage: storage to retrieve objects from.
+    :param items: `ItemLocator`s or an async iterable of them.
+    :param datatype: dataclass implementing @dataobject (@see DataObject)
+    :param context, EventContext: event context
+    :param response, PostprocessHook: response hook from `__postprocess__`
+    :param file_name, str: file name for Content-Disposition header
+    :param concurrency, int: max number of objects retrieved concurrently.
+    :param ordered, bool: if True, objects are streamed in the same order as `items`.
+    :return: number of streamed objects
+    """
+    stream_response = await prepare_chunked_response(
+        context,
+        response,
+        content_disposition=f'inline; filename="{file_name}"',
+        content_type=NDJSON_CONTENT_TYPE,
+    )
+    count = 0
+    async for _, value in get_objects(
+        object_storage, items, datatype, concurrency=concurrency, ordered=ordered
+    ):
+        if value is not None:
+            await stream_response.write(Payload.to_json(value).encode() + b"\n")
+            count += 1
+    return count
+
+
+async def read_ndjson(
+    chunks: AsyncIterable[bytes],
+    datatype: Type[Any],
+    *,
+    max_line_size: int = MAX_LINE_SIZE,
+) -> AsyncIterator[Tuple[int, Union[Any, ValueError]]]:
+    """
+    Parses NDJSON incrementally from `chunks` of bytes, i.e. `PreprocessFileHook.read_chunks`,
+    keeping in memory only the line being parsed. Empty lines are skipped.
+
+    :param chunks: async iterable of bytes.
+    :param datatype: dataclass implementing @dataobject (@see DataObject)
+    :param max_line_size, int: max size in bytes of a line, longer lines are skipped.
+    :yields: tuples of line number and parsed object, or ValueError if the line is invalid.
+    """
+    buffer = b""
+    line_number = 0
+    skipping = False
+    async for chunk in chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            if skipping or len(line) > max_line_size:
+                skipping = False
+                yield line_number, ValueError(f"Line exceeds {max_line_size} bytes")
+            elif line.strip():
+                yield line_number, _parse_line(line, datatype)
+        if len(buffer) > max_line_size:
+            buffer, skipping = b"", True
+    if skipping or len(buffer) > max_line_size:
+        yield line_number + 1, ValueError(f"Line exceeds {max_line_size} bytes")
+    elif buffer.strip():
+        yield line_number + 1, _parse_line(buffer, datatype)
+
+
+def _parse_line(line: bytes, datatype: Type[Any]) -> Union[Any, ValueError]:
+    try:
+        return Payload.from_json(line, datatype=datatype)
+    except ValueError as e:
+        return e
+
+
+async def store_ndjson(
+    object_storage: ObjectStorage,
+    chunks: AsyncIterable[bytes],
+    datatype: Type[Any],
+    *,
+    key: Callable[[Any], str],
+    transform: Optional[Callable[[Any], Any]] = None,
+    concurrency: int = 16,
+    max_line_size: int = MAX_LINE_SIZE,
+) -> AsyncIterator[IngestResult]:
+    """
+    Parses NDJSON from `chunks` using `read_ndjson` and stores each parsed object,
+    running up to `concurrency` store requests at the same time. Memory usage depends on
+    `concurrency` and `max_line_size`, not on the size of the ingested body.
+
+    :param object_storage, ObjectStorage: storage where objects are saved.
+    :param chunks: async iterable of bytes, i.e. `PreprocessFileHook.read_chunks`.
+    :param datatype: dataclass implementing @dataobject (@see DataObject) to parse lines.
+    :param key: function returning the key to store each object.
+    :param transform: optional function to convert parsed objects into objects to store.
+    :param concurrency, int: max number of objects stored concurrently.
+    :param max_line_size, int: max size in bytes of a line, longer lines are not stored.
+    :yields: `IngestResult` for each non empty line, in the same order as the ingested lines.
+    """
+
+    async def store(parsed: Tuple[int, Union[Any, ValueError]]) -> IngestResult:
+        line, value = parsed
+        if isinstance(value, ValueError):
+            return IngestResult(line=line, error=str(value))
+        try:
+            if transform is not None:
+                value = transform(value)
+            item_id = key(value)
+        except (ValueError, TypeError, AttributeError) as e:
+            return IngestResult(line=line, error=str(e))
+        try:
+            location = await object_storage.store(key=item_id, value=value)
+        except Exception as e:  # pylint: disable=broad-except
+            return IngestResult(line=line, key=item_id, error=f"{type(e).__name__}: {e}")
+        return IngestResult(line=line, key=item_id, location=location)
+
+    async for result in _map_bounded(
+        store,
+        read_ndjson(chunks, datatype, max_line_size=max_line_size),
+        concurrency,
+        ordered=True,
+    ):
+        yield result
@@ -0,0 +1,172 @@
+"""
+Incremental sync between a local directory and the object storage: files are compared using
+listing metadata against local file size and modification time, so only changed files are
+transferred.
+
+Local files mirror file locations, i.e. `2020/05/01/file.txt` is synced to
+`<directory>/2020/05/01/file.txt`. Downloaded files get the S3 last modified time as local
+modification time, so files are unchanged while size and modification time match. Uploaded
+files are unchanged while local modification time is not newer than S3 last modified time.
+Optionally, files with the same size but different time are compared using their MD5 digest
+and the S3 ETag, when ETag is a plain MD5 digest, i.e. not for multipart uploads.
+"""
+
+import asyncio
+import hashlib
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import IO, Dict, List, Optional
+
+from hopeit.dataobjects import dataclass, dataobject, field
+
+from .listing import ItemLocator
+
+__all__ = [
+    "SyncResult",
+    "ThreadedFile",
+    "item_location",
+    "local_path",
+    "local_files",
+    "etag_md5",
+    "file_md5",
+    "set_mtime",
+    "download_unchanged",
+    "upload_unchanged",
+]
+
+TEMP_SUFFIX = ".sync-part"
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+@dataobject
+@dataclass
+class SyncResult:
+    """
+    Result of syncing files between a local directory and the object storage.
+
+    :field transferred, List[str]: locations of files downloaded or uploaded,
+        or to transfer on dry run.
+    :field deleted, List[str]: locations of files deleted from the destination,
+        or to delete on dry run.
+    :field unchanged, int: number of files already up to date.
+    :field size, int: bytes transferred, or to transfer on dry run.
+    :field errors, Dict[str, str]: locations of files that could not be synced, with the error.
+    :field dry_run, bool: True if nothing was transferred or deleted.
+    """
+
+    transferred: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    unchanged: int = 0
+    size: int = 0
+    errors: Dict[str, str] = field(default_factory=dict)
+    dry_run: bool = False
+
+
+class ThreadedFile:
+    """
+    Local binary file whose blocking calls run in a worker thread, so files are transferred
+    using `download_fileobj` and `upload_fileobj` without blocking the event loop.
+    """
+
+    def __init__(self, file: IO[bytes]):
+        self.file = file
+
+    @classmethod
+    async def open(cls, path: Path, mode: str) -> "ThreadedFile":
+        return cls(await asyncio.to_thread(open, path, mode))
+
+    async def read(self, size: int = -1) -> bytes:
+        return await asyncio.to_thread(self.file.read, size)
+
+    async def write(self, data: bytes) -> int:
+        return await asyncio.to_thread(self.file.write, data)
+
+    async def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        return await asyncio.to_thread(self.file.seek, offset, whence)
+
+    async def close(self) -> None:
+        await asyncio.to_thread(self.file.close)
+
+
+def item_location(item: ItemLocator) -> str:
+    """
+    Returns file location relative to storage prefix, i.e. `2020/05/01/file.txt`.
+    """
+    return f"{item.partition_key}/{item.item_id}" if item.partition_key else item.item_id
+
+
+def local_path(directory: Path, location: str) -> Optional[Path]:
+    """
+    Returns the path of `location` in `directory`, or None if location would be outside it.
+    """
+    parts = location.split("/")
+    if any(part in ("", ".", "..") for part in parts):
+        return None
+    return directory.joinpath(*parts)
+
+
+def local_files(directory: Path, partition_key: Optional[str]) -> Dict[str, os.stat_result]:
+    """
+    Returns locations and stats of files in `directory`, under `partition_key` folder if given,
+    skipping partially downloaded files.
+    """
+    root = directory / partition_key.strip("/") if partition_key else directory
+    files: Dict[str, os.stat_result] = {}
+    for folder, _, file_names in os.walk(root):
+        for file_name in file_names:
+            if file_name.endswith(TEMP_SUFFIX):
+                continue
+            path = Path(folder) / file_name
+            files[path.relative_to(directory).as_posix()] = path.stat()
+    return files
+
+
+def etag_md5(etag: Optional[str]) -> Optional[str]:
+    """
+    Returns the MD5 hex digest in `etag`, or None if it is not a plain MD5 digest.
+    """
+    if not etag:
+        return None
+    etag = etag.strip('"')
+    return None if "-" in etag else etag
+
+
+def file_md5(path: Path) -> str:
+    digest = hashlib.md5(usedforsecurity=False)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def set_mtime(path: Path, last_modified: Optional[datetime]) -> None:
+    """
+    Sets `last_modified`, if known, as modification time of local file in `path`.
+    """
+    if last_modified is not None:
+        ts = last_modified.timestamp()
+        os.utime(path, (ts, ts))
+
+
+def _mtime(last_modified: Optional[datetime]) -> Optional[int]:
+    return None if last_modified is None else int(last_modified.timestamp())
+
+
+def download_unchanged(stat: os.stat_result, item: ItemLocator) -> bool:
+    """
+    Returns whether local file with `stat` is the downloaded version of `item`.
+    """
+    return stat.st_size == item.size and int(stat.st_mtime) == _mtime(item.last_modified)
+
+
+def upload_unchanged(stat: os.stat_result, item: ItemLocator) -> bool:
+    """
+    Returns whether local file with `stat` was not modified after `item` was uploaded.
+    """
+    remote_mtime = _mtime(item.last_modified)
+    return (
+        stat.st_size == item.size
+        and remote_mtime is not None
+        and int(stat.st_mtime) <= remote_mtime
+    )
@@ -0,0 +1,239 @@
+"""
+Client-side request throttling for S3: token buckets per bucket and per key prefix
+that back off automatically when S3 answers with `SlowDown`/503.
+"""
+
+import asyncio
+import random
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Mapping, Optional, Tuple
+from urllib.parse import unquote
+
+from botocore.exceptions import ClientError
+from hopeit.dataobjects import dataclass, dataobject
+from hopeit.dataobjects.payload import Payload
+
+__all__ = ["ThrottlingSettings", "RateLimiter", "get_rate_limiter", "is_throttling_error"]
+
+THROTTLING_ERROR_CODES = {
+    "SlowDown",
+    "503",
+    "ServiceUnavailable",
+    "Throttling",
+    "ThrottlingException",
+    "RequestLimitExceeded",
+    "RequestThrottled",
+    "TooManyRequestsException",
+}
+
+MAX_TRACKED_PREFIXES = 4096
+
+
+@dataobject
+@dataclass
+class ThrottlingSettings:
+    """
+    Client-side rate limiting for requests sent to S3.
+
+    :field prefix_rate, float: initial requests per second allowed for each key prefix.
+    :field bucket_rate, Optional[float]: initial requests per second allowed for the whole bucket,
+        `None` to limit only per prefix.
+    :field burst, int: maximum number of requests that can be sent at once after an idle period.
+    :field min_rate, float: lower limit for the rate when requests are being throttled.
+    :field max_rate, float: upper limit for the rate when recovering from throttling.
+    :field decrease_factor, float: rate multiplier applied every time S3 throttles a request.
+    :field increase_step, float: requests per second added to the rate after each successful
+        request, until `max_rate` is reached.
+    :field backoff_base, float: base delay in seconds for the jittered exponential backoff
+        applied after consecutive throttling errors.
+    :field backoff_max, float: maximum backoff delay in seconds.
+    """
+
+    prefix_rate: float = 3500.0
+    bucket_rate: Optional[float] = None
+    burst: int = 100
+    min_rate: float = 10.0
+    max_rate: float = 5500.0
+    decrease_factor: float = 0.5
+    increase_step: float = 1.0
+    backoff_base: float = 0.1
+    backoff_max: float = 20.0
+
+
+def is_throttling_error(error: BaseException) -> bool:
+    """
+    Returns True if `error` is S3 signaling the request rate should be reduced.
+    """
+    if not isinstance(error, ClientError):
+        return False
+    return _is_throttling_response(error.response)
+
+
+def _is_throttling_response(response: Mapping[str, Any]) -> bool:
+    code = response.get("Error", {}).get("Code")
+    status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+    return code in THROTTLING_ERROR_CODES or status == 503
+
+
+class TokenBucket:
+    """
+    Token bucket with additive increase / multiplicative decrease of its rate.
+    """
+
+    def __init__(self, rate: float, settings: ThrottlingSettings):
+        self.settings = settings
+        self.rate = rate
+        self.tokens = float(settings.burst)
+        self.throttle_count = 0
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._locks: Dict[asyncio.AbstractEventLoop, asyncio.Lock] = {}
+
+    async def acquire(self) -> None:
+        """
+        Waits until a token is available, honoring any backoff in place.
+        """
+        async with self._lock():
+            while True:
+                now = time.monotonic()
+                if now < self._blocked_until:
+                    await asyncio.sleep(self._blocked_until - now)
+                    continue
+                self._refill(now)
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self.tokens) / self.rate)
+
+    def throttled(self) -> None:
+        """
+        Reduces rate and blocks the bucket for a jittered exponential backoff period.
+        """
+        self.throttle_count += 1
+        self.rate = max(self.settings.min_rate, self.rate * self.settings.decrease_factor)
+        max_delay = min(
+            self.settings.backoff_max,
+            self.settings.backoff_base * 2 ** (self.throttle_count - 1),
+        )
+        self._blocked_until = max(
+            self._blocked_until, time.monotonic() + random.uniform(0.0, max_delay)
+        )
+        self.tokens = 0.0
+
+    def succeeded(self) -> None:
+        """
+        Slowly recovers rate after successful requests.
+        """
+        self.throttle_count = 0
+        self.rate = min(self.settings.max_rate, self.rate + self.settings.increase_step)
+
+    def _lock(self) -> asyncio.Lock:
+        """
+        Lock serializing waiters, one per event loop since `asyncio.Lock`
+        binds to the loop where it is first contended.
+        """
+        loop = asyncio.get_running_loop()
+        lock = self._locks.get(loop)
+        if lock is None:
+            for other in [other for other in self._locks if other.is_closed()]:
+                del self._locks[other]
+            lock = asyncio.Lock()
+            self._locks[loop] = lock
+        return lock
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self._updated
+        self._updated = now
+        self.tokens = min(float(self.settings.burst), self.tokens + elapsed * self.rate)
+
+
+class RateLimiter:
+    """
+    Limits request rate to a bucket, using one token bucket per key prefix
+    and optionally one for the whole bucket.
+
+    Throttled attempts are detected through botocore `needs-retry` events (see
+    `on_needs_retry`), so backoff is applied on every attempt retried by botocore,
+    not only when a request finally fails after exhausting its retries.
+    """
+
+    def __init__(self, bucket: str, settings: ThrottlingSettings):
+        self.bucket = bucket
+        self.settings = settings
+        self._bucket_limit: Optional[TokenBucket] = (
+            TokenBucket(settings.bucket_rate, settings) if settings.bucket_rate else None
+        )
+        self._prefix_limits: "OrderedDict[str, TokenBucket]" = OrderedDict()
+
+    @asynccontextmanager
+    async def limit(self, key: str) -> AsyncIterator[None]:
+        """
+        Acquires tokens to send a request for `key`, and recovers rates when
+        the request executed inside the context succeeds.
+
+        :param key, str: object key or listing prefix the request refers to.
+        """
+        limits = self._limits_for(key)
+        for token_bucket in limits:
+            await token_bucket.acquire()
+        yield
+        for token_bucket in limits:
+            token_bucket.succeeded()
+
+    def throttled(self, key: str) -> None:
+        """
+        Backs off bucket and prefix rates after a throttled request for `key`.
+        """
+        for token_bucket in self._limits_for(key):
+            token_bucket.throttled()
+
+    def on_needs_retry(
+        self,
+        response: Optional[Tuple[Any, Mapping[str, Any]]] = None,
+        request_dict: Optional[Dict[str, Any]] = None,
+        **kwargs: Any,
+    ) -> None:
+        """
+        botocore `needs-retry.s3` event handler: backs off when an attempt was throttled.
+        Returns None to leave the retry decision to botocore retry handlers.
+        """
+        if response is None or not _is_throttling_response(response[1]):
+            return None
+        path = unquote((request_dict or {}).get("url_path", "").split("?", 1)[0]).lstrip("/")
+        if path.startswith(f"{self.bucket}/"):
+            path = path[len(self.bucket) + 1 :]
+        self.throttled(path)
+        return None
+
+    def _limits_for(self, key: str) -> List[TokenBucket]:
+        prefix = key.rsplit("/", 1)[0] + "/" if "/" in key else ""
+        limit = self._prefix_limits.get(prefix)
+        if limit is None:
+            limit = TokenBucket(self.settings.prefix_rate, self.settings)
+            self._prefix_limits[prefix] = limit
+            if len(self._prefix_limits) > MAX_TRACKED_PREFIXES:
+                self._prefix_limits.popitem(last=False)
+        else:
+            self._prefix_limits.move_to_end(prefix)
+        if self._bucket_limit is None:
+            return [limit]
+        return [self._bucket_limit, limit]
+
+
+_rate_limiters: Dict[Tuple[str, str], RateLimiter] = {}
+
+
+def get_rate_limiter(bucket: str, settings: ThrottlingSettings) -> RateLimiter:
+    """
+    Returns the process wide `RateLimiter` for `bucket` and `settings`, so every
+    `ObjectStorage` instance pointing to the same bucket with the same settings
+    shares request rates and backoff state.
+    """
+    cache_key = (bucket, Payload.to_json(settings))
+    rate_limiter = _rate_limiters.get(cache_key)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(bucket, settings)
+        _rate_limiters[cache_key] = rate_limiter
+    return rate_limiter
@@ -0,0 +1,68 @@
+"""
+Client-driven multipart upload sessions: clients upload parts of a large file in parallel
+directly to S3 using presigned part URLs, and can resume an interrupted upload uploading
+only missing parts. Parts are tracked by S3, so sessions don't keep state in the application.
+"""
+
+from datetime import datetime
+from typing import Optional
+
+from hopeit.dataobjects import dataclass, dataobject
+
+__all__ = ["UploadSettings", "UploadSession", "UploadPart"]
+
+MAX_PARTS = 10000
+
+
+@dataobject
+@dataclass
+class UploadSettings:
+    """
+    Multipart upload sessions settings.
+
+    :field ttl, float: seconds after which sessions not completed are considered abandoned.
+    :field gc_interval, float: min seconds between checks for abandoned sessions, aborted when
+        a new session is created, so parts already uploaded are not stored anymore.
+    """
+
+    ttl: float = 24 * 60 * 60
+    gc_interval: float = 60 * 60
+
+
+@dataobject
+@dataclass
+class UploadSession:
+    """
+    Multipart upload session, to be kept by the client to upload parts and complete it.
+
+    :field upload_id, str: S3 multipart upload id.
+    :field file_name, str: name of the file being uploaded.
+    :field partition_key, Optional[str]: partition where the file is stored.
+    :field location, str: file location, relative to prefix, as returned by `store_file`.
+    :field created, datetime: time the session was created.
+    :field expires_at, Optional[datetime]: time after which the session can be aborted
+        if not completed, when `ObjectStorageSettings.uploads` is enabled.
+    """
+
+    upload_id: str
+    file_name: str
+    partition_key: Optional[str]
+    location: str
+    created: datetime
+    expires_at: Optional[datetime] = None
+
+
+@dataobject
+@dataclass
+class UploadPart:
+    """
+    Part uploaded to a multipart upload session.
+
+    :field part_number, int: part number, from 1 to 10000. Parts are joined in this order.
+    :field size, int: size in bytes.
+    :field etag, str: S3 ETag returned when the part was uploaded.
+    """
+
+    part_number: int
+    size: int
+    etag: str
@@ -0,0 +1,251 @@
+"""
+Write-behind buffer: queues writes in memory and stores them in the background,
+so `store` and `store_file` return without waiting for S3.
+"""
+
+import asyncio
+import time
+from typing import Awaitable, Callable, Dict, List, NamedTuple, Optional, Sequence, Set
+
+from hopeit.dataobjects import dataclass, dataobject
+
+__all__ = ["WriteBehindSettings", "PendingWrite", "WriteBehindBuffer"]
+
+ErrorCallback = Callable[[str, BaseException], None]
+BackpressureCallback = Callable[[int], None]
+
+
+@dataobject
+@dataclass
+class WriteBehindSettings:
+    """
+    Write-behind settings.
+
+    :field max_bytes, int: max size in bytes of pending writes kept in memory. When reached,
+        writers wait until pending writes are stored (backpressure).
+    :field flush_bytes, int: size in bytes of pending writes that triggers a background flush.
+    :field flush_interval, float: max seconds a write stays pending before a background flush.
+    :field concurrency, int: max number of writes sent to S3 concurrently on each flush.
+    """
+
+    max_bytes: int = 64 * 1024 * 1024
+    flush_bytes: int = 4 * 1024 * 1024
+    flush_interval: float = 1.0
+    concurrency: int = 16
+
+
+class PendingWrite(NamedTuple):
+    """
+    Write queued for bucket `key`. `item_id` and `partition_key` are set for objects
+    stored with `store`, to write their index entry when the index is enabled.
+    """
+
+    key: str
+    data: bytes
+    item_id: Optional[str] = None
+    partition_key: Optional[str] = None
+
+
+class _LoopState:
+    """
+    Synchronization primitives and background flush task for one event loop.
+    """
+
+    def __init__(self):
+        self.changed = asyncio.Condition()
+        self.wakeup = asyncio.Event()
+        self.flush_lock = asyncio.Lock()
+        self.task: Optional[asyncio.Task] = None
+
+
+class WriteBehindBuffer:
+    """
+    Pending writes by bucket key. Writing the same key again replaces its pending data,
+    so reads on the same `ObjectStorage` instance always see the latest write.
+
+    Writes are stored by `write_batch`, which returns an error, or None, for each write.
+    Failed writes are reported to `on_error` and kept pending to be retried on next flush.
+    Keys being stored are tracked as in flight, so deletes can wait for them using
+    `wait_in_flight`.
+    """
+
+    def __init__(
+        self,
+        settings: WriteBehindSettings,
+        write_batch: Callable[[Sequence[PendingWrite]], Awaitable[List[Optional[BaseException]]]],
+    ):
+        self.settings = settings
+        self.on_error: Optional[ErrorCallback] = None
+        self.on_backpressure: Optional[BackpressureCallback] = None
+        self._write_batch = write_batch
+        self._pending: Dict[str, PendingWrite] = {}
+        self._in_flight: Set[str] = set()
+        self._bytes = 0
+        self._oldest: Optional[float] = None
+        self._states: Dict[asyncio.AbstractEventLoop, _LoopState] = {}
+
+    @property
+    def pending(self) -> int:
+        """
+        Number of pending writes.
+        """
+        return len(self._pending)
+
+    @property
+    def pending_bytes(self) -> int:
+        """
+        Size in bytes of pending writes.
+        """
+        return self._bytes
+
+    def is_pending(self, key: str) -> bool:
+        """
+        Returns whether there is a pending write for `key`.
+        """
+        return key in self._pending
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Returns pending data for `key`, or None if there is no pending write.
+        """
+        write = self._pending.get(key)
+        return None if write is None else write.data
+
+    async def read(self, key: str) -> Optional[bytes]:
+        """
+        Returns pending data for `key`, or None if there is no pending write.
+        Same as `get`, provided to read pending data from a `Spool` or a buffer alike.
+        """
+        return self.get(key)
+
+    def size(self, key: str) -> Optional[int]:
+        """
+        Returns size in bytes of pending write for `key`, or None if there is no pending write.
+        """
+        write = self._pending.get(key)
+        return None if write is None else len(write.data)
+
+    def discard(self, key: str) -> None:
+        """
+        Drops pending write for `key`, i.e. when it is deleted.
+        """
+        write = self._pending.pop(key, None)
+        if write is not None:
+            self._bytes -= len(write.data)
+
+    async def wait_in_flight(self, key: str) -> None:
+        """
+        Waits until a write for `key` being stored by a flush completes, so a delete
+        issued after it returns is not overwritten by that write.
+        """
+        if key not in self._in_flight:
+            return
+        state = self._state()
+        async with state.changed:
+            await state.changed.wait_for(lambda: key not in self._in_flight)
+
+    async def put(self, write: PendingWrite) -> bool:
+        """
+        Queues `write`, waiting while there is no room for it in the buffer.
+
+        :return: False if `write` is larger than `max_bytes` and must be written directly.
+        """
+        size = len(write.data)
+        if size > self.settings.max_bytes:
+            return False
+        state = self._state()
+        async with state.changed:
+            if not self._fits(write):
+                if self.on_backpressure is not None:
+                    self.on_backpressure(self._bytes)
+                state.wakeup.set()
+                await state.changed.wait_for(lambda: self._fits(write))
+            self.discard(write.key)
+            self._pending[write.key] = write
+            self._bytes += size
+            if self._oldest is None:
+                self._oldest = time.monotonic()
+        if self._bytes >= self.settings.flush_bytes:
+            state.wakeup.set()
+        return True
+
+    async def flush(self) -> int:
+        """
+        Stores all pending writes.
+
+        :return: number of writes stored. Failed writes are kept pending.
+        """
+        state = self._state()
+        try:
+            async with state.flush_lock:
+                writes = list(self._pending.values())
+                if not writes:
+                    return 0
+                self._in_flight = {write.key for write in writes}
+                try:
+                    errors = await self._write_batch(writes)
+                finally:
+                    self._in_flight = set()
+                stored = 0
+                for write, error in zip(writes, errors):
+                    if error is not None:
+                        if self.on_error is not None:
+                            self.on_error(write.key, error)
+                        continue
+                    stored += 1
+                    if self._pending.get(write.key) is write:
+                        del self._pending[write.key]
+                        self._bytes -= len(write.data)
+                self._oldest = time.monotonic() if self._pending else None
+        finally:
+            async with state.changed:
+                state.changed.notify_all()
+        return stored
+
+    async def close(self) -> int:
+        """
+        Flushes pending writes and stops background flushing on the current event loop.
+
+        :return: number of writes stored.
+        """
+        stored = await self.flush()
+        state = self._states.pop(asyncio.get_running_loop(), None)
+        if state is not None and state.task is not None:
+            state.task.cancel()
+        return stored
+
+    def _fits(self, write: PendingWrite) -> bool:
+        replaced = self._pending.get(write.key)
+        replaced_size = len(replaced.data) if replaced is not None else 0
+        return self._bytes - replaced_size + len(write.data) <= self.settings.max_bytes
+
+    def _state(self) -> _LoopState:
+        """
+        Returns state for the running event loop, starting its background flush task.
+        """
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            for other in [other for other in self._states if other.is_closed()]:
+                del self._states[other]
+            state = _LoopState()
+            self._states[loop] = state
+        if state.task is None or state.task.done():
+            state.task = loop.create_task(self._run(state))
+        return state
+
+    async def _run(self, state: _LoopState) -> None:
+        """
+        Background task flushing when `flush_bytes` or `flush_interval` are reached.
+        """
+        while True:
+            timeout = self.settings.flush_interval
+            if self._oldest is not None:
+                timeout = max(0.0, self._oldest + timeout - time.monotonic())
+            try:
+                await asyncio.wait_for(state.wakeup.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+            state.wakeup.clear()
+            if self._pending:
+                await self.flush()
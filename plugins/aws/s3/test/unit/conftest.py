@@ -0,0 +1,18 @@
+"""
+hopeit.aws.s3 tests
+"""
+
+from time import sleep
+
+import pytest
+from moto.server import ThreadedMotoServer
+
+
+# Fixture to start and stop the Moto server
+@pytest.fixture(scope="session")
+def moto_server():
+    server = ThreadedMotoServer(port=9002)
+    server.start()
+    sleep(1)
+    yield server
+    server.stop()
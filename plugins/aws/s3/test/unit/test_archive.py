@@ -0,0 +1,276 @@
+"""
+hopeit.aws.s3 archive tests
+"""
+
+import asyncio
+import gzip
+import io
+import tarfile
+import zipfile
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+
+import pytest
+from hopeit.app.context import PostprocessHook
+from hopeit.aws.s3 import ConnectionConfig, ItemLocator, ObjectStorage, ObjectStorageSettings
+from hopeit.aws.s3.archive import ExtractResult, store_archive, stream_zip, zip_files
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="archive",
+        partition_dateformat="%Y/%m/%d/",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+FILES = {f"file{i}.txt": f"data{i}".encode() * (i * 1000) for i in range(1, 6)}
+
+
+async def store_files(object_storage: ObjectStorage) -> None:
+    ts = datetime(2020, 5, 1, tzinfo=timezone.utc)
+    for file_name, data in FILES.items():
+        await object_storage.store_file(
+            file_name=file_name, value=data, partition_values={"ts": ts}
+        )
+
+
+async def delete_files(object_storage: ObjectStorage) -> None:
+    await object_storage.delete_files(*FILES.keys(), partition_key="2020/05/01")
+
+
+@pytest.mark.asyncio
+async def test_zip_files_wildcard(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    await store_files(object_storage)
+
+    chunks = [
+        data
+        async for data in zip_files(
+            object_storage, "2020/05/01/*", concurrency=2, read_ahead=1, chunk_size=1024
+        )
+    ]
+    assert len(chunks) > len(FILES)
+
+    with zipfile.ZipFile(io.BytesIO(b"".join(chunks))) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == [f"2020/05/01/{file_name}" for file_name in FILES]
+        for file_name, data in FILES.items():
+            assert archive.read(f"2020/05/01/{file_name}") == data
+        assert archive.getinfo("2020/05/01/file1.txt").date_time[0] >= 2020
+
+    await delete_files(object_storage)
+
+
+@pytest.mark.asyncio
+async def test_zip_files_locators_deflated(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings(shards=2)).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    await store_files(object_storage)
+
+    items = [
+        ItemLocator("file3.txt", "2020/05/01"),
+        ItemLocator("missing.txt", "2020/05/01"),
+        ItemLocator("file1.txt", "2020/05/01"),
+    ]
+    data = b"".join(
+        [
+            chunk
+            async for chunk in zip_files(object_storage, items, compression=zipfile.ZIP_DEFLATED)
+        ]
+    )
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.namelist() == ["2020/05/01/file3.txt", "2020/05/01/file1.txt"]
+        assert archive.getinfo("2020/05/01/file3.txt").compress_type == zipfile.ZIP_DEFLATED
+        assert archive.read("2020/05/01/file3.txt") == FILES["file3.txt"]
+        assert archive.read("2020/05/01/file1.txt") == FILES["file1.txt"]
+    assert len(data) < len(FILES["file3.txt"])
+
+    with pytest.raises(ValueError):
+        async for _ in zip_files(object_storage, items, concurrency=0):
+            pass
+
+    await delete_files(object_storage)
+
+
+@pytest.mark.asyncio
+async def test_zip_files_close(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    await store_files(object_storage)
+
+    def prefetching():
+        return [
+            task
+            for task in asyncio.all_tasks()
+            if task.get_coro().__name__ == "_prefetch" and not task.done()  # type: ignore
+        ]
+
+    chunks = zip_files(object_storage, "2020/05/01/*", concurrency=2, read_ahead=1, chunk_size=1024)
+    assert await chunks.__anext__()
+    assert prefetching()
+    await chunks.aclose()  # type: ignore[attr-defined]
+    await asyncio.sleep(0.05)
+    assert prefetching() == []
+
+    await delete_files(object_storage)
+
+
+@pytest.mark.asyncio
+async def test_stream_zip(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    await store_files(object_storage)
+
+    response = PostprocessHook()
+    context = MagicMock(track_ids={})
+    count = await stream_zip(
+        object_storage, "2020/05/01/*", context, response, file_name="may.zip", concurrency=3
+    )
+    assert count == len(FILES)
+    assert response.headers == {
+        "Content-Disposition": 'attachment; filename="may.zip"',
+        "Content-Type": "application/zip",
+    }
+    assert response.stream_response is not None
+    data = response.stream_response.resp.data  # type: ignore
+    with zipfile.ZipFile(io.BytesIO(data)) as archive:
+        assert archive.testzip() is None
+        assert len(archive.namelist()) == len(FILES)
+
+    await delete_files(object_storage)
+
+
+def tar_archive(members, tar_format=tarfile.GNU_FORMAT) -> bytes:
+    buffer = io.BytesIO()
+    with tarfile.open(fileobj=buffer, mode="w", format=tar_format) as archive:
+        folder = tarfile.TarInfo("docs")
+        folder.type = tarfile.DIRTYPE
+        archive.addfile(folder)
+        for name, data in members:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            archive.addfile(info, io.BytesIO(data))
+        link = tarfile.TarInfo("docs/link.txt")
+        link.type = tarfile.SYMTYPE
+        link.linkname = "file1.txt"
+        archive.addfile(link)
+    return buffer.getvalue()
+
+
+async def chunked(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+LONG_NAME = "docs/" + "x" * 120 + ".txt"
+MEMBERS = [
+    ("docs/file1.txt", b"data1" * 10),
+    (LONG_NAME, b"long"),
+    ("docs/empty.txt", b""),
+    ("large.bin", b"large" * 1000),
+]
+
+
+@pytest.mark.parametrize(
+    "tar_format,compress", [(tarfile.GNU_FORMAT, False), (tarfile.PAX_FORMAT, True)]
+)
+@pytest.mark.asyncio
+async def test_store_archive(moto_server, tar_format, compress):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    ts = datetime(2020, 5, 2, tzinfo=timezone.utc)
+    data = tar_archive(MEMBERS, tar_format)
+    if compress:
+        data = gzip.compress(data)
+
+    results = [
+        result
+        async for result in store_archive(
+            object_storage,
+            chunked(data, 333),
+            partition_values={"ts": ts},
+            concurrency=2,
+            max_buffer_size=1000,
+        )
+    ]
+    assert results == [
+        ExtractResult(name, len(value), location=f"2020/05/02/{name.rsplit('/', 1)[-1]}")
+        for name, value in MEMBERS
+    ]
+    for name, value in MEMBERS:
+        file_name = name.rsplit("/", 1)[-1]
+        assert await object_storage.get_file(file_name, partition_key="2020/05/02") == value
+        await object_storage.delete_files(file_name, partition_key="2020/05/02")
+
+
+@pytest.mark.asyncio
+async def test_store_archive_file_names_and_errors(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    ts = datetime(2020, 5, 3, tzinfo=timezone.utc)
+    data = tar_archive(MEMBERS)
+
+    def file_name(name: str):
+        if name.endswith(".bin"):
+            return None
+        return name.replace("/", "-") if name != "docs/empty.txt" else "a/b"
+
+    # Archive truncated in the middle of the long name member data
+    truncated = data[: data.index(b"long") + 2]
+    results = [
+        result
+        async for result in store_archive(
+            object_storage,
+            chunked(truncated, 100),
+            partition_values={"ts": ts},
+            file_name=file_name,
+        )
+    ]
+    assert results == [
+        ExtractResult("docs/file1.txt", 50, location="2020/05/03/docs-file1.txt"),
+        ExtractResult(LONG_NAME, 4, error="Unexpected end of archive"),
+    ]
+
+    results = [
+        result
+        async for result in store_archive(
+            object_storage, chunked(data, 100), partition_values={"ts": ts}, file_name=file_name
+        )
+    ]
+    assert [(result.member, result.error) for result in results] == [
+        ("docs/file1.txt", None),
+        (LONG_NAME, None),
+        ("docs/empty.txt", "Invalid file name: 'a/b'"),
+    ]
+    await object_storage.delete_files(
+        "docs-file1.txt", LONG_NAME.replace("/", "-"), partition_key="2020/05/03"
+    )
+
+    # Archive truncated in the middle of a large member streamed to S3
+    truncated = data[: data.index(b"largelarge") + 100]
+    results = [
+        result
+        async for result in store_archive(
+            object_storage,
+            chunked(truncated, 100),
+            partition_values={"ts": ts},
+            file_name=lambda name: "large.bin" if name == "large.bin" else None,
+            max_buffer_size=1000,
+        )
+    ]
+    assert len(results) == 1 and results[0].location is None
+    assert "Unexpected end of archive" in str(results[0].error)
+    assert await object_storage.get_file("large.bin", partition_key="2020/05/03") is None
+
+    with pytest.raises(ValueError):
+        async for _ in store_archive(object_storage, chunked(b"not a tar" * 100, 100)):
+            pass
@@ -0,0 +1,156 @@
+"""
+hopeit.aws.s3 change feed tests
+"""
+
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    FeedCheckpoint,
+    ItemLocator,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PartitionSettings,
+)
+from hopeit.aws.s3.changefeed import feed_partitions
+from hopeit.aws.s3.partition import build_partition_strategy
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject(event_ts="ts")
+@dataclass
+class FeedData:
+    id: str
+    ts: datetime
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="feed",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+def utc(year: int, month: int, day: int, hour: int = 0, minute: int = 0) -> datetime:
+    return datetime(year, month, day, hour, minute, tzinfo=timezone.utc)
+
+
+def test_feed_partitions():
+    strategy = build_partition_strategy("%Y/%m/%d/", [])
+    assert feed_partitions(strategy, {}, utc(2020, 5, 1, 10), utc(2020, 5, 1, 11)) == [
+        "2020/05/01/"
+    ]
+    assert feed_partitions(strategy, {}, utc(2020, 5, 31, 23, 50), utc(2020, 6, 1, 0, 5)) == [
+        "2020/05/31/",
+        "2020/06/01/",
+    ]
+
+    composite = build_partition_strategy(
+        None,
+        [
+            PartitionSettings(strategy="field", field="tenant"),
+            PartitionSettings(strategy="date", dateformat="%Y/%m/%d/%H/"),
+        ],
+    )
+    assert feed_partitions(
+        composite, {"tenant": "acme"}, utc(2020, 5, 1, 10, 50), utc(2020, 5, 1, 12)
+    ) == ["acme/2020/05/01/10/", "acme/2020/05/01/11/", "acme/2020/05/01/12/"]
+    with pytest.raises(ValueError):
+        feed_partitions(composite, {}, utc(2020, 5, 1), utc(2020, 5, 1))
+    with pytest.raises(ValueError):
+        feed_partitions(None, {}, utc(2020, 5, 1), utc(2020, 5, 1))
+    hashed = build_partition_strategy(None, [PartitionSettings(strategy="hash", buckets=4)])
+    with pytest.raises(ValueError):
+        feed_partitions(hashed, {}, utc(2020, 5, 1), utc(2020, 5, 1))
+
+
+async def store_items(object_storage: ObjectStorage, ts: datetime, *ids: str) -> None:
+    for item_id in ids:
+        await object_storage.store(key=item_id, value=FeedData(id=item_id, ts=ts))
+
+
+@pytest.mark.asyncio
+async def test_poll_changes(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(partition_dateformat="%Y/%m/%d/", shards=2)
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    await store_items(object_storage, utc(2020, 5, 1, 10), "item01", "item02", "item03")
+    await object_storage.store_file(
+        file_name="file.txt", value=b"data", partition_values={"ts": utc(2020, 5, 1)}
+    )
+
+    checkpoint = FeedCheckpoint()
+    now = utc(2020, 5, 1, 23, 55)
+    items = await object_storage.poll_changes(checkpoint, now=now)
+    assert sorted(items, key=lambda item: item.item_id) == [
+        ItemLocator(f"item0{i}", "2020/05/01") for i in range(1, 4)
+    ]
+    assert checkpoint.updated == now
+    assert all(mark.startswith("2020/05/01/") for mark in checkpoint.marks.values())
+    assert await object_storage.poll_changes(checkpoint, now=now) == []
+
+    # Only new keys are listed, rolling over to the new partition
+    await store_items(object_storage, utc(2020, 5, 1, 23), "item04")
+    await store_items(object_storage, utc(2020, 5, 2, 0), "item05")
+    items = await object_storage.poll_changes(checkpoint, now=utc(2020, 5, 2, 0, 5))
+    assert sorted(items, key=lambda item: item.item_id) == [
+        ItemLocator("item04", "2020/05/01"),
+        ItemLocator("item05", "2020/05/02"),
+    ]
+
+    # Previous partition is dropped after lookback
+    await store_items(object_storage, utc(2020, 5, 1, 23), "item06")
+    items = await object_storage.poll_changes(checkpoint, now=utc(2020, 5, 2, 1))
+    assert items == []
+    assert all(mark.startswith("2020/05/02/") for mark in checkpoint.marks.values())
+
+    files = await object_storage.poll_changes(FeedCheckpoint(), files=True, now=now)
+    assert sorted(item.item_id for item in files) == [
+        "file.txt",
+        "item01.json",
+        "item02.json",
+        "item03.json",
+        "item04.json",
+        "item06.json",
+    ]
+
+    await object_storage.purge(utc(2020, 6, 1))
+
+
+@pytest.mark.asyncio
+async def test_changes(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(partition_dateformat="%Y/%m/%d/%H/")
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    ts = datetime.now(tz=timezone.utc)
+    await store_items(object_storage, ts, "change01", "change02")
+
+    received = []
+    feed = object_storage.changes(name="test", poll_interval=0.01, lookback=timedelta(hours=1))
+    async for item in feed:
+        received.append(item.item_id)
+        if len(received) == 2:
+            await store_items(object_storage, ts, "change03")
+        if len(received) == 3:
+            break
+    await feed.aclose()
+    assert received == ["change01", "change02", "change03"]
+
+    # Resumes from saved position: last poll was not completely consumed
+    feed = object_storage.changes(name="test", poll_interval=0.01, lookback=timedelta(hours=1))
+    assert (await asyncio.wait_for(feed.__anext__(), timeout=5)).item_id == "change03"
+    await feed.aclose()
+
+    await object_storage.purge(ts + timedelta(hours=1))
+    await object_storage.delete_files(".hopeit/feeds/test.json")
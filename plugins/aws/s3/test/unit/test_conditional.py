@@ -0,0 +1,79 @@
+"""
+hopeit.aws.s3 conditional writes tests
+"""
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PreconditionFailed,
+)
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class ConditionalData:
+    value: str
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="conditional",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_store_if_none_match(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    location = await object_storage.store(
+        key="item1", value=ConditionalData(value="1"), if_none_match="*"
+    )
+    assert location == "item1.json"
+    with pytest.raises(PreconditionFailed) as e:
+        await object_storage.store(key="item1", value=ConditionalData(value="2"), if_none_match="*")
+    assert e.value.key == "item1.json"
+    assert await object_storage.get("item1", datatype=ConditionalData) == ConditionalData(value="1")
+    await object_storage.delete("item1")
+
+
+@pytest.mark.asyncio
+async def test_store_if_match(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(index=IndexSettings())
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    assert await object_storage.get_with_etag("item2", datatype=ConditionalData) == (None, None)
+    with pytest.raises(PreconditionFailed):
+        await object_storage.store(key="item2", value=ConditionalData(value="1"), if_match='"x"')
+
+    await object_storage.store(key="item2", value=ConditionalData(value="1"))
+    value, etag = await object_storage.get_with_etag("item2", datatype=ConditionalData)
+    assert value == ConditionalData(value="1")
+    assert etag is not None
+
+    await object_storage.store(key="item2", value=ConditionalData(value="2"), if_match=etag)
+    # Concurrent update with a stale ETag is rejected
+    with pytest.raises(PreconditionFailed):
+        await object_storage.store(key="item2", value=ConditionalData(value="3"), if_match=etag)
+
+    other_storage = await ObjectStorage.with_settings(
+        storage_settings(index=IndexSettings())
+    ).connect()
+    value, new_etag = await other_storage.get_with_etag("item2", datatype=ConditionalData)
+    assert value == ConditionalData(value="2")
+    assert new_etag != etag
+    await object_storage.delete("item2")
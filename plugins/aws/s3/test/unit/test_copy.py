@@ -0,0 +1,101 @@
+"""
+hopeit.aws.s3 server-side copy and move tests
+"""
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ItemLocator,
+    ObjectStorage,
+    ObjectStorageSettings,
+)
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class CopyData:
+    value: str
+
+
+def storage_settings(prefix: str, **kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_copy_and_move_objects(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings("copy", partition_dateformat="%Y/%m/%d/", index=IndexSettings())
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    location = await object_storage.store(key="item1", value=CopyData(value="1"))
+    partition_key = object_storage.partition_key(location)
+
+    # Copy within storage, resolving source partition using index
+    copied = await object_storage.copy(ItemLocator("item1"), ItemLocator("item2", "2020/01/01"))
+    assert copied == ItemLocator("item2", "2020/01/01")
+    assert await object_storage.get("item2", datatype=CopyData) == CopyData(value="1")
+    assert await object_storage.copy(ItemLocator("missing"), ItemLocator("item3")) is None
+
+    # Move to another partition keeps index pointing to the moved item
+    moved = await object_storage.move(ItemLocator("item2"), ItemLocator("item2", "2020/01/02"))
+    assert moved == ItemLocator("item2", "2020/01/02")
+    assert not await object_storage.exists("item2", partition_key="2020/01/01")
+    assert await object_storage.locate("item2") == ItemLocator("item2", "2020/01/02")
+    assert await object_storage.get("item2", datatype=CopyData) == CopyData(value="1")
+
+    # Move to another prefix
+    target = await ObjectStorage.with_settings(
+        storage_settings("copy-target", index=IndexSettings())
+    ).connect()
+    results = await object_storage.move_many(
+        [
+            (ItemLocator("item1", partition_key), ItemLocator("item1")),
+            (ItemLocator("item2"), ItemLocator("item2")),
+            (ItemLocator("missing"), ItemLocator("missing")),
+        ],
+        target=target,
+        concurrency=2,
+    )
+    assert results == [ItemLocator("item1"), ItemLocator("item2"), None]
+    assert await object_storage.list_objects(recursive=True) == []
+    assert await target.get("item1", datatype=CopyData) == CopyData(value="1")
+    assert await target.get("item2", datatype=CopyData) == CopyData(value="1")
+    await target.delete("item1", "item2")
+
+
+@pytest.mark.asyncio
+async def test_copy_files_multipart(monkeypatch, moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings("copy-files")).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    data = b"x" * (5 * 1024 * 1024) + b"y" * 1024
+    await object_storage.store_file(file_name="file1.txt", value=data)
+
+    monkeypatch.setattr("hopeit.aws.s3.object_storage.MULTIPART_COPY_THRESHOLD", 1024)
+    monkeypatch.setattr("hopeit.aws.s3.object_storage.MULTIPART_COPY_PART_SIZE", 5 * 1024 * 1024)
+    copied = await object_storage.copy_many(
+        [(ItemLocator("file1.txt"), ItemLocator("file2.txt", "copies"))], files=True
+    )
+    assert copied == [ItemLocator("file2.txt", "copies")]
+    assert await object_storage.get_file("file2.txt", partition_key="copies") == data
+    stat = await object_storage.stat_file("file2.txt", partition_key="copies")
+    assert stat is not None and stat.etag is not None and stat.etag.endswith('-2"')
+
+    moved = await object_storage.move(
+        ItemLocator("file2.txt", "copies"), ItemLocator("file3.txt"), files=True
+    )
+    assert moved == ItemLocator("file3.txt")
+    assert await object_storage.get_file("file2.txt", partition_key="copies") is None
+    assert await object_storage.get_file("file3.txt") == data
+    await object_storage.delete_files("file1.txt", "file3.txt")
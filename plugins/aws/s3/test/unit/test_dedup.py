@@ -0,0 +1,177 @@
+"""
+hopeit.aws.s3 content-hash deduplication tests
+"""
+
+import hashlib
+from io import BytesIO
+
+import pytest
+from hopeit.aws.s3 import (
+    BlobInfo,
+    ConnectionConfig,
+    DedupSettings,
+    DedupStats,
+    ObjectStorage,
+    ObjectStorageSettings,
+    WriteBehindSettings,
+)
+from hopeit.aws.s3.dedup import content_hash, matches
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class DedupData:
+    value: str
+
+
+def storage_settings(prefix: str, **kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+def test_matches():
+    data = b"data"
+    digest = content_hash(data)
+    md5 = hashlib.md5(data).hexdigest()
+    assert matches({"Metadata": {"content-sha256": digest}, "ETag": '"x"'}, digest, data)
+    assert not matches({"Metadata": {"content-sha256": "other"}}, digest, data)
+    assert matches({"Metadata": {}, "ETag": f'"{md5}"'}, digest, data)
+    assert not matches({"ETag": f'"{md5}-2"'}, digest, data)
+
+
+@pytest.mark.asyncio
+async def test_store_dedup(moto_server):
+    settings = storage_settings("dedup", dedup=DedupSettings())
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    await object_storage.store(key="item1", value=DedupData(value="1"))
+    await object_storage.store(key="item1", value=DedupData(value="1"))
+    await object_storage.store(key="item1", value=DedupData(value="2"))
+    await object_storage.store_file(file_name="file1.txt", value=b"data")
+    await object_storage.store_file(file_name="file1.txt", value=b"data")
+    assert object_storage.dedup_stats == DedupStats(
+        checked=5, skipped=2, skipped_bytes=len(b'{"value":"1"}') + 4, uploaded=3
+    )
+    assert await object_storage.get("item1", datatype=DedupData) == DedupData(value="2")
+
+    # New instance without cached hashes compares with stored objects metadata
+    other_storage = await ObjectStorage.with_settings(settings).connect()
+    await other_storage.store(key="item1", value=DedupData(value="2"))
+    await other_storage.store_file(file_name="file1.txt", value=b"other")
+    assert other_storage.dedup_stats == DedupStats(
+        checked=2, skipped=1, skipped_bytes=len(b'{"value":"2"}'), uploaded=1
+    )
+    assert await other_storage.get_file("file1.txt") == b"other"
+
+    # Objects stored without dedup metadata are compared by ETag
+    plain_storage = await ObjectStorage.with_settings(storage_settings("dedup")).connect()
+    await plain_storage.store_file(file_name="file2.txt", value=b"plain")
+    await other_storage.store_file(file_name="file2.txt", value=b"plain")
+    assert other_storage.dedup_stats.skipped == 2
+
+    await object_storage.delete("item1")
+    await object_storage.store(key="item1", value=DedupData(value="2"))
+    assert object_storage.dedup_stats.uploaded == 4
+    await object_storage.delete("item1")
+    await object_storage.delete_files("file1.txt", "file2.txt")
+
+
+@pytest.mark.asyncio
+async def test_store_dedup_caches_stored_content(moto_server, monkeypatch):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings("dedup-cache", dedup=DedupSettings())
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    def fail(data: bytes):
+        raise ConnectionError("upload failed")
+
+    # Failed uploads are not cached as stored content
+    monkeypatch.setattr(object_storage, "_upload_args", fail)
+    with pytest.raises(ConnectionError):
+        await object_storage.store_file(file_name="file1.txt", value=b"data")
+    monkeypatch.undo()
+    await object_storage.store_file(file_name="file1.txt", value=b"data")
+    assert await object_storage.get_file("file1.txt") == b"data"
+
+    # File-like uploads evict cached content hash
+    await object_storage.store_file(file_name="file1.txt", value=BytesIO(b"other"))
+    await object_storage.store_file(file_name="file1.txt", value=b"data")
+    assert await object_storage.get_file("file1.txt") == b"data"
+    assert object_storage.dedup_stats == DedupStats(checked=3, uploaded=3)
+
+    # Write-behind caches content hash once pending writes are flushed
+    wb_storage = await ObjectStorage.with_settings(
+        storage_settings("dedup-cache", dedup=DedupSettings(), write_behind=WriteBehindSettings())
+    ).connect()
+    await wb_storage.store_file(file_name="file2.txt", value=b"v1")
+    await wb_storage.store_file(file_name="file2.txt", value=b"v2")
+    await wb_storage.store_file(file_name="file2.txt", value=b"v1")
+    assert wb_storage.dedup_stats.skipped == 0
+    await wb_storage.flush()
+    await wb_storage.store_file(file_name="file2.txt", value=b"v1")
+    assert wb_storage.dedup_stats.skipped == 1
+    assert await wb_storage.get_file("file2.txt") == b"v1"
+    await wb_storage.close()
+
+    await object_storage.delete_files("file1.txt", "file2.txt")
+
+
+@pytest.mark.asyncio
+async def test_store_blob(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings("blobs", dedup=DedupSettings())
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    digest = content_hash(b"x" * 100)
+    info = await object_storage.store_blob(b"x" * 100)
+    assert info == BlobInfo(
+        content_hash=digest, location=f".hopeit/cas/{digest[:2]}/{digest}", size=100, stored=True
+    )
+    info = await object_storage.store_blob(BytesIO(b"x" * 100), chunk_size=16)
+    assert info.content_hash == digest and not info.stored
+
+    other_storage = await ObjectStorage.with_settings(
+        storage_settings("blobs", dedup=DedupSettings())
+    ).connect()
+    assert not (await other_storage.store_blob(b"x" * 100)).stored
+    assert await other_storage.get_blob(digest) == b"x" * 100
+    assert await other_storage.get_blob(content_hash(b"missing")) is None
+
+    streamed = await object_storage.store_blob(BytesIO(b"y" * 100), chunk_size=16)
+    assert streamed.stored and streamed.size == 100
+    assert await object_storage.get_blob(streamed.content_hash) == b"y" * 100
+
+    await object_storage.delete_files(info.location, streamed.location)
+
+
+@pytest.mark.asyncio
+async def test_store_blob_sharded(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings("blobs-sharded", dedup=DedupSettings(), shards=4)
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    digest = content_hash(b"z" * 100)
+    info = await object_storage.store_blob(b"z" * 100)
+    assert info.stored and info.location == f".hopeit/cas/{digest[:2]}/{digest}"
+    assert await object_storage.get_blob(digest) == b"z" * 100
+
+    # Blobs are not sharded, so their location is relative to prefix only
+    unsharded_storage = await ObjectStorage.with_settings(
+        storage_settings("blobs-sharded")
+    ).connect()
+    assert await unsharded_storage.get_file(info.location) == b"z" * 100
+    await unsharded_storage.delete_files(info.location)
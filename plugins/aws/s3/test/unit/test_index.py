@@ -0,0 +1,123 @@
+"""
+hopeit.aws.s3 item index tests
+"""
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ItemLocator,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PartitionSettings,
+)
+from hopeit.aws.s3.index import ItemIndex
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class TenantItem:
+    tenant: str
+    value: str
+
+
+def test_item_index_cache():
+    index = ItemIndex("prefix/", IndexSettings(cache_size=2))
+    assert index.index_key("a/b").startswith("prefix/.hopeit/index/")
+    assert index.index_key("a/b").endswith("/a%2Fb")
+    assert index.cached("item1") is None
+
+    index.update("item1", "2020/05/01")
+    index.update("item2", "")
+    assert index.cached("item1") == "2020/05/01"
+    index.update("item3", "2020/05/02")
+    assert index.cached("item2") is None
+    assert index.cached("item1") == "2020/05/01"
+    assert index.cached("item3") == "2020/05/02"
+
+    index.evict("item1")
+    assert index.cached("item1") is None
+
+
+def settings(prefix: str, shards: int, index: bool) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        shards=shards,
+        partitioning=[PartitionSettings(strategy="field", field="tenant")],
+        index=IndexSettings() if index else None,
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+
+
+@pytest.mark.parametrize("prefix,shards", [("indexed/", 0), ("indexed-sharded", 4)])
+@pytest.mark.asyncio
+async def test_indexed_objects(prefix, shards, moto_server):
+    object_storage = await ObjectStorage.with_settings(settings(prefix, shards, True)).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    assert await object_storage.store(key="item1", value=TenantItem("a", "v1")) == "a/item1.json"
+    assert await object_storage.get(key="item1", datatype=TenantItem) == TenantItem("a", "v1")
+    assert await object_storage.locate("item1") == ItemLocator("item1", "a")
+
+    assert await object_storage.store(key="item1", value=TenantItem("b", "v2")) == "b/item1.json"
+    assert await object_storage.list_objects(recursive=True) == [
+        ItemLocator("item1", "a"),
+        ItemLocator("item1", "b"),
+    ]
+    assert await object_storage.list_files(recursive=True) == [
+        ItemLocator("item1.json", "a"),
+        ItemLocator("item1.json", "b"),
+    ]
+
+    other_storage = await ObjectStorage.with_settings(settings(prefix, shards, True)).connect()
+    assert await other_storage.get(key="item1", datatype=TenantItem) == TenantItem("b", "v2")
+    assert await other_storage.locate("item1") == ItemLocator("item1", "b")
+
+    # Deleting an older copy keeps index pointing to the latest one
+    await object_storage.delete("item1", partition_key="a")
+    new_storage = await ObjectStorage.with_settings(settings(prefix, shards, True)).connect()
+    assert await new_storage.locate("item1") == ItemLocator("item1", "b")
+
+    # Deleting without partition_key resolves it from index
+    await object_storage.delete("item1")
+    assert await object_storage.list_objects(recursive=True) == []
+    assert await object_storage.locate("item1") is None
+
+    # Stale locally cached partition is refreshed from index
+    assert await other_storage.get(key="item1", datatype=TenantItem) is None
+    assert await other_storage.locate("item1") is None
+
+
+@pytest.mark.asyncio
+async def test_rebuild_index(moto_server):
+    prefix = "rebuild-index/"
+    unindexed_storage = await ObjectStorage.with_settings(settings(prefix, 0, False)).connect()
+    await unindexed_storage.create_bucket(exist_ok=True)
+    await unindexed_storage.store(key="item1", value=TenantItem("a", "v1"))
+    await unindexed_storage.store(key="item2", value=TenantItem("b", "v2"))
+
+    object_storage = await ObjectStorage.with_settings(settings(prefix, 0, True)).connect()
+    assert await object_storage.get(key="item1", datatype=TenantItem) is None
+
+    assert await object_storage.rebuild_index() == 2
+    assert await object_storage.get(key="item1", datatype=TenantItem) == TenantItem("a", "v1")
+    assert await object_storage.locate("item2") == ItemLocator("item2", "b")
+
+    await object_storage.delete("item1", "item2")
+    assert await unindexed_storage.list_objects(recursive=True) == []
+
+
+@pytest.mark.asyncio
+async def test_index_not_enabled(moto_server):
+    object_storage = await ObjectStorage.with_settings(settings("no-index/", 0, False)).connect()
+    with pytest.raises(AssertionError):
+        await object_storage.locate("item1")
+    with pytest.raises(AssertionError):
+        await object_storage.rebuild_index()
@@ -0,0 +1,202 @@
+"""
+hopeit.aws.s3 compact listing tests
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    CompactListing,
+    ConnectionConfig,
+    ItemLocator,
+    ListPage,
+    ManifestSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+)
+from hopeit.aws.s3.listing import CompactListingBuilder, decode_page_token, encode_page_token
+from hopeit.aws.s3.manifest import ListedObject
+from hopeit.aws.s3.partition import DatePartition
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class CompactData:
+    value: str
+
+
+def listing() -> CompactListing:
+    builder = CompactListingBuilder(DatePartition("%Y/%m/%d").split, ".json")
+    builder.add_page(
+        [
+            ListedObject("2020/05/02/b.json", 30, "etag-b", 1588377600.0),
+            ListedObject("2020/05/02/a.json", 10, "etag-a", 1588377660.0),
+        ]
+    )
+    builder.add_page([])
+    builder.add_page([ListedObject("2020/05/01/c.json", 20, "etag-c", 1588291200.0)])
+    return builder.build()
+
+
+def test_compact_listing_access():
+    items = listing()
+    assert len(items) == 3
+    assert items[0] == ItemLocator(item_id="b", partition_key="2020/05/02")
+    assert items[0].size == 30
+    assert items[0].etag == "etag-b"
+    assert items[0].last_modified == datetime(2020, 5, 2, tzinfo=timezone.utc)
+    assert items[-1] == ItemLocator(item_id="c", partition_key="2020/05/01")
+    assert items.item_id(1) == "a"
+    assert items.partition_key(1) == "2020/05/02"
+    assert list(items.item_ids()) == ["b", "a", "c"]
+    assert items.total_size == 60
+    assert items.to_list() == [
+        ItemLocator(item_id="b", partition_key="2020/05/02"),
+        ItemLocator(item_id="a", partition_key="2020/05/02"),
+        ItemLocator(item_id="c", partition_key="2020/05/01"),
+    ]
+    assert ItemLocator(item_id="a", partition_key="2020/05/02") in items
+    assert items._partitions == ["2020/05/02", "2020/05/01"]
+    with pytest.raises(IndexError):
+        items[3]
+
+
+def test_compact_listing_slice_and_sort():
+    items = listing()
+    assert list(items[1:]) == items.to_list()[1:]
+    assert list(items[::-1]) == items.to_list()[::-1]
+    assert items[1:][0].etag == "etag-a"
+    assert list(items.sorted().item_ids()) == ["c", "a", "b"]
+    assert list(items.sorted(by="size").item_ids()) == ["a", "c", "b"]
+    assert list(items.sorted(by="last_modified", reverse=True).item_ids()) == ["a", "b", "c"]
+    assert items.sorted(by="size")[2].size == 30
+    with pytest.raises(ValueError):
+        items.sorted(by="name")
+
+
+def test_compact_listing_empty():
+    items = CompactListingBuilder().build()
+    assert len(items) == 0
+    assert items.to_list() == []
+    assert items.sorted().to_list() == []
+
+
+@pytest.mark.asyncio
+async def test_list_compact(moto_server):
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix="compact",
+        partition_dateformat="%Y/%m/%d/",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    for i in range(5):
+        await object_storage.store(key=f"item{i}", value=CompactData(value=f"{i}"))
+    await object_storage.store_file(file_name="file.bin", value=b"data")
+
+    objects = await object_storage.list_objects_compact(recursive=True)
+    assert isinstance(objects, CompactListing)
+    assert list(objects.item_ids()) == [f"item{i}" for i in range(5)]
+    assert objects.to_list() == await object_storage.list_objects(recursive=True)
+    assert objects[0].size == len(b'{"value":"0"}')
+
+    files = await object_storage.list_files_compact(f"{objects[0].partition_key}/*.bin", min_size=4)
+    assert list(files.item_ids()) == ["file.bin"]
+    assert len(await object_storage.list_files_compact(recursive=True, min_size=5)) == 5
+
+    for item in objects:
+        await object_storage.delete(item.item_id, partition_key=item.partition_key)
+    await object_storage.delete_files("file.bin", partition_key=files[0].partition_key)
+
+
+def test_page_token():
+    token = encode_page_token("2020/05/01/ítem 1.json")
+    assert "=" not in token and "/" not in token and "+" not in token
+    assert decode_page_token(token) == "2020/05/01/ítem 1.json"
+    for invalid in ("not-a-token", encode_page_token("x")[:-2], "e30"):
+        with pytest.raises(ValueError):
+            decode_page_token(invalid)
+
+
+@pytest.mark.parametrize("shards,sealed", [(0, False), (4, False), (0, True), (4, True)])
+@pytest.mark.asyncio
+async def test_list_page(shards, sealed, moto_server):
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix=f"paged-{shards}-{sealed}",
+        partition_dateformat="%Y/%m/%d/",
+        shards=shards,
+        manifests=ManifestSettings(),
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    for day in (1, 2):
+        ts = datetime(2020, 5, day, tzinfo=timezone.utc)
+        for i in range(4):
+            await object_storage.store_file(
+                file_name=f"file{i}.bin", value=b"data", partition_values={"ts": ts}
+            )
+    await object_storage.store(key="object", value=CompactData(value="x"))
+    if sealed:
+        await object_storage.seal_partition("2020/05/01")
+
+    expected = await object_storage.list_files(recursive=True)
+    assert len(expected) == 9
+
+    pages = []
+    token = None
+    while True:
+        page = await object_storage.list_files_page(
+            page_size=4, continuation_token=token, recursive=True
+        )
+        assert isinstance(page, ListPage)
+        pages.append(page.items)
+        token = page.next_token
+        if token is None:
+            break
+    assert [len(items) for items in pages] == [4, 4, 1]
+    assert [item for items in pages for item in items] == expected
+    assert pages[0][0].size == 4
+
+    page = await object_storage.list_files_page(
+        "2020/05/02/*", page_size=2, start_after="2020/05/02/file0.bin"
+    )
+    assert page.items == [
+        ItemLocator(item_id="file1.bin", partition_key="2020/05/02"),
+        ItemLocator(item_id="file2.bin", partition_key="2020/05/02"),
+    ]
+    assert page.next_token is not None
+    page = await object_storage.list_files_page(
+        "2020/05/02/*", page_size=2, continuation_token=page.next_token
+    )
+    assert page == ListPage(
+        items=[ItemLocator(item_id="file3.bin", partition_key="2020/05/02")], next_token=None
+    )
+
+    page = await object_storage.list_objects_page(recursive=True, page_size=1)
+    assert page.items == await object_storage.list_objects(recursive=True)
+    assert page.next_token is None
+
+    with pytest.raises(ValueError):
+        await object_storage.list_files_page(page_size=0)
+    with pytest.raises(ValueError):
+        await object_storage.list_files_page(continuation_token="invalid")
+
+    if sealed:
+        await object_storage.unseal_partition("2020/05/01")
+    for item in expected:
+        await object_storage.delete_files(item.item_id, partition_key=item.partition_key)
@@ -0,0 +1,129 @@
+"""
+hopeit.aws.s3 partition manifests tests
+"""
+
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    ItemLocator,
+    ManifestCheck,
+    ManifestSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+)
+from hopeit.aws.s3.manifest import ListedObject, ManifestCache, decode_manifest, encode_manifest
+
+
+def test_encode_decode_manifest():
+    objects = [
+        ListedObject("2020/05/01/a.bin", 10, "etag1", 1588291200.0),
+        ListedObject("2020/05/01/sub/b\tc.bin", 0, "etag2", 1588291201.5),
+    ]
+    header, decoded = decode_manifest(encode_manifest("2020/05/01", objects))
+    assert header["partition_key"] == "2020/05/01"
+    assert header["count"] == 2
+    assert decoded == objects
+
+    _, decoded = decode_manifest(encode_manifest("2020/05/02", []))
+    assert decoded == []
+
+    with pytest.raises(ValueError):
+        decode_manifest(gzip.compress(b'{"version": 2}\n'))
+
+
+def test_manifest_cache():
+    cache = ManifestCache(cache_size=1)
+    objects = [ListedObject("a", 1, "e", 0.0)]
+    cache.put("m1", "etag1", objects)
+    assert cache.get("m1", "etag1") is objects
+    assert cache.get("m1", "etag2") is None
+    cache.put("m2", "etag1", [])
+    assert cache.get("m1", "etag1") is None
+    cache.evict("m2")
+    assert cache.get("m2", "etag1") is None
+
+
+def test_manifest_check():
+    assert ManifestCheck(partition_key="x").consistent
+    assert not ManifestCheck(partition_key="x", missing=["a"]).consistent
+
+
+def ts(day: int) -> datetime:
+    return datetime(2020, 5, day, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize("prefix,shards", [("manifests/", 0), ("manifests-sharded", 4)])
+@pytest.mark.asyncio
+async def test_sealed_partitions(prefix, shards, moto_server):
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        shards=shards,
+        partition_dateformat="%Y/%m/%d/",
+        manifests=ManifestSettings(),
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    expected = []
+    for day in (1, 2, 3):
+        for name in ("a.bin", "b.bin"):
+            await object_storage.store_file(
+                file_name=name, value=b"data", partition_values={"ts": ts(day)}
+            )
+            expected.append(ItemLocator(item_id=name, partition_key=f"2020/05/0{day}"))
+
+    assert await object_storage.seal_partition("2020/05/01") == 2
+    assert await object_storage.seal_partition("2020/05/02/") == 2
+    assert await object_storage.list_files(recursive=True) == expected
+    assert await object_storage.list_files("2020/05/01/a*") == expected[:1]
+    assert await object_storage.list_files("2020/05/*", recursive=True) == expected
+    assert await object_storage.list_files() == []
+
+    # Files stored into sealed partitions are not listed until partition is sealed again
+    await object_storage.store_file(
+        file_name="c.bin", value=b"data", partition_values={"ts": ts(1)}
+    )
+    await object_storage.store_file(
+        file_name="b.bin", value=b"modified", partition_values={"ts": ts(2)}
+    )
+    await object_storage.delete_files("a.bin", partition_key="2020/05/02")
+    assert await object_storage.list_files(recursive=True) == expected
+
+    check = await object_storage.verify_partition("2020/05/01")
+    assert check == ManifestCheck(partition_key="2020/05/01", unexpected=["2020/05/01/c.bin"])
+    check = await object_storage.verify_partition("2020/05/02")
+    assert check == ManifestCheck(
+        partition_key="2020/05/02", missing=["2020/05/02/a.bin"], modified=["2020/05/02/b.bin"]
+    )
+
+    assert await object_storage.seal_partition("2020/05/01") == 3
+    assert (await object_storage.verify_partition("2020/05/01")).consistent
+    await object_storage.unseal_partition("2020/05/02")
+    assert await object_storage.list_files(recursive=True) == [
+        *expected[:2],
+        ItemLocator(item_id="c.bin", partition_key="2020/05/01"),
+        *expected[3:],
+    ]
+
+    # Other ObjectStorage instances read manifests
+    other_storage = await ObjectStorage.with_settings(settings).connect()
+    assert await other_storage.list_files("2020/05/01/*") == [
+        ItemLocator(item_id="a.bin", partition_key="2020/05/01"),
+        ItemLocator(item_id="b.bin", partition_key="2020/05/01"),
+        ItemLocator(item_id="c.bin", partition_key="2020/05/01"),
+    ]
+
+    await object_storage.unseal_partition("2020/05/01")
+    for item in await object_storage.list_files(recursive=True):
+        await object_storage.delete_files(item.item_id, partition_key=item.partition_key)
+    assert await object_storage.list_files(recursive=True) == []
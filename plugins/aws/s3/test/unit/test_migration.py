@@ -0,0 +1,171 @@
+"""
+hopeit.aws.s3 partition re-layout migration tests
+"""
+
+import asyncio
+from datetime import datetime, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ItemLocator,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PartitionSettings,
+)
+from hopeit.aws.s3.migration import MigrationCheckpoint, main, migrate, source_partition_values
+from hopeit.aws.s3.partition import build_partition_strategy
+from hopeit.dataobjects import dataclass, dataobject
+from hopeit.dataobjects.payload import Payload
+
+
+@dataobject(event_ts="ts")
+@dataclass
+class MigrationData:
+    id: str
+    ts: datetime
+
+
+def storage_settings(prefix: str, **kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+def test_source_partition_values():
+    ts = datetime(2020, 5, 1, tzinfo=timezone.utc)
+    strategy = build_partition_strategy("%Y/%m/%d/", [])
+    assert source_partition_values(strategy, ItemLocator("a.json", "2020/05/01")) == {"ts": ts}
+    modified = datetime(2020, 5, 1, 10, 30, tzinfo=timezone.utc)
+    assert source_partition_values(
+        strategy, ItemLocator("a.json", "2020/05/01", last_modified=modified)
+    ) == {"ts": modified}
+    assert source_partition_values(
+        strategy, ItemLocator("a.json", "2020/05/01", last_modified=datetime(2021, 1, 1))
+    ) == {"ts": ts}
+    assert source_partition_values(strategy, ItemLocator("a.json", "2020/05/xx")) is None
+    assert source_partition_values(strategy, ItemLocator("a.json", "2020/05")) is None
+    assert source_partition_values(strategy, ItemLocator("10/a.json", "2020/05/01")) is None
+
+    composite = build_partition_strategy(
+        None,
+        [
+            PartitionSettings(strategy="field", field="tenant"),
+            PartitionSettings(strategy="date", dateformat="%Y/%m/"),
+        ],
+    )
+    assert source_partition_values(composite, ItemLocator("a", "acme%2Finc/2020/05")) == {
+        "tenant": "acme/inc",
+        "ts": ts,
+    }
+    assert source_partition_values(None, ItemLocator("a")) == {}
+    assert source_partition_values(None, ItemLocator("a", "2020")) is None
+
+
+@pytest.mark.asyncio
+async def test_migrate(tmp_path, moto_server):
+    source = await ObjectStorage.with_settings(
+        storage_settings("migrate-src", partition_dateformat="%Y/%m/%d/", index=IndexSettings())
+    ).connect()
+    await source.create_bucket(exist_ok=True)
+    target = await ObjectStorage.with_settings(
+        storage_settings(
+            "migrate-dst", partition_dateformat="%Y/%m/%d/%H/", shards=4, index=IndexSettings()
+        )
+    ).connect()
+
+    for i in range(5):
+        ts = datetime(2020, 5, 1 + i % 2, tzinfo=timezone.utc)
+        await source.store(key=f"item{i}", value=MigrationData(id=f"item{i}", ts=ts))
+    ts = datetime(2020, 5, 3, tzinfo=timezone.utc)
+    await source.store_file(file_name="file1.txt", value=b"data", partition_values={"ts": ts})
+
+    # Interrupted after first page
+    checkpoint_path = str(tmp_path / "checkpoint.json")
+
+    def interrupt(checkpoint: MigrationCheckpoint):
+        raise RuntimeError("interrupted")
+
+    with pytest.raises(RuntimeError):
+        await migrate(
+            source,
+            target,
+            checkpoint_path=checkpoint_path,
+            delete=True,
+            page_size=4,
+            on_page=interrupt,
+        )
+    with open(checkpoint_path, encoding="utf-8") as f:
+        checkpoint = Payload.from_json(f.read(), MigrationCheckpoint)
+    assert checkpoint.copied == 4 and checkpoint.deleted == 4 and not checkpoint.done
+
+    # Resumed from checkpoint
+    result = await migrate(
+        source, target, checkpoint_path=checkpoint_path, delete=True, page_size=4
+    )
+    assert result == MigrationCheckpoint(
+        next_token=None, done=True, listed=6, copied=6, skipped=0, failed=0, deleted=6
+    )
+    assert await source.list_files(recursive=True) == []
+    assert await source.locate("item1") is None
+
+    assert await target.get("item1", datatype=MigrationData) == MigrationData(
+        id="item1", ts=datetime(2020, 5, 2, tzinfo=timezone.utc)
+    )
+    assert await target.locate("item4") == ItemLocator("item4", "2020/05/01/00")
+    assert await target.get_file("file1.txt", partition_key="2020/05/03/00") == b"data"
+    assert len(await target.list_objects(recursive=True)) == 5
+
+    # Completed migration is not run again
+    assert await migrate(source, target, checkpoint_path=checkpoint_path) == result
+
+    await target.delete(*(f"item{i}" for i in range(5)))
+    await target.delete_files("file1.txt", partition_key="2020/05/03/00")
+
+
+def test_migrate_cli(tmp_path, moto_server):
+    source_settings = storage_settings("migrate-cli-src")
+    target_settings = storage_settings(
+        "migrate-cli-dst", partitioning=[PartitionSettings(strategy="hash", buckets=4)]
+    )
+    for name, settings in (("source", source_settings), ("target", target_settings)):
+        with open(tmp_path / f"{name}.json", "w", encoding="utf-8") as f:
+            f.write(Payload.to_json(settings))
+
+    async def setup():
+        storage = await ObjectStorage.with_settings(source_settings).connect()
+        await storage.create_bucket(exist_ok=True)
+        await storage.store_file(file_name="file1.txt", value=b"data")
+
+    asyncio.run(setup())
+    args = [
+        "--source",
+        str(tmp_path / "source.json"),
+        "--target",
+        str(tmp_path / "target.json"),
+        "--checkpoint",
+        str(tmp_path / "checkpoint.json"),
+        "--concurrency",
+        "4",
+    ]
+    assert main(args) == 0
+
+    async def check():
+        source = await ObjectStorage.with_settings(source_settings).connect()
+        target = await ObjectStorage.with_settings(target_settings).connect()
+        files = await target.list_files(recursive=True)
+        assert [item.item_id for item in files] == ["file1.txt"]
+        assert await target.get_file("file1.txt", partition_key=files[0].partition_key) == b"data"
+        await target.delete_files("file1.txt", partition_key=files[0].partition_key)
+        await source.delete_files("file1.txt")
+
+    asyncio.run(check())
@@ -0,0 +1,161 @@
+"""
+hopeit.aws.s3 partition strategies tests
+"""
+
+from datetime import datetime, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    ItemLocator,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PartitionSettings,
+)
+from hopeit.aws.s3.partition import (
+    CompositePartition,
+    DatePartition,
+    FieldPartition,
+    HashPartition,
+    build_partition_strategy,
+)
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class Tenant:
+    id: str
+
+
+@dataobject(event_ts="ts")
+@dataclass
+class TenantData:
+    tenant: Tenant
+    ts: datetime
+    value: str
+
+
+TS = datetime(2020, 5, 1, 13, 30, tzinfo=timezone.utc)
+
+
+def test_date_partition():
+    strategy = DatePartition("%Y/%m/%d/%H/")
+    data = TenantData(tenant=Tenant(id="acme"), ts=TS, value="x")
+    assert strategy.n_components == 4
+    assert strategy.partition_key("item", data, None) == "2020/05/01/13/"
+    assert strategy.partition_key("item", None, {"ts": TS}) == "2020/05/01/13/"
+    assert strategy.partition_prefix({"ts": TS}) == "2020/05/01/13/"
+    assert strategy.partition_prefix({}) is None
+    assert strategy.split("2020/05/01/13/sub/item.json") == ("2020/05/01/13", "sub/item.json")
+
+
+def test_field_partition():
+    strategy = FieldPartition("tenant.id")
+    data = TenantData(tenant=Tenant(id="ac/me"), ts=TS, value="x")
+    assert strategy.partition_key("item", data, None) == "ac%2Fme/"
+    assert strategy.partition_key("item", None, {"tenant.id": "acme"}) == "acme/"
+    assert strategy.partition_prefix({"tenant.id": "acme"}) == "acme/"
+    assert strategy.partition_prefix({}) is None
+    with pytest.raises(ValueError):
+        strategy.partition_key("item", None, None)
+
+
+def test_hash_partition():
+    strategy = HashPartition(buckets=16)
+    key_partition = strategy.partition_key("item", None, None)
+    assert len(key_partition) == 2
+    assert strategy.partition_prefix({"key": "item"}) == key_partition
+
+    field_strategy = HashPartition(buckets=256, field="tenant.id")
+    data = TenantData(tenant=Tenant(id="acme"), ts=TS, value="x")
+    assert field_strategy.partition_key("item", data, None) == field_strategy.partition_prefix(
+        {"tenant.id": "acme"}
+    )
+    assert len(field_strategy.partition_key("item", data, None)) == 3
+
+
+def test_composite_partition():
+    strategy = build_partition_strategy(
+        None,
+        [
+            PartitionSettings(strategy="field", field="tenant.id"),
+            PartitionSettings(strategy="date", dateformat="%Y/%m/%d"),
+        ],
+    )
+    assert isinstance(strategy, CompositePartition)
+    assert strategy.n_components == 4
+    data = TenantData(tenant=Tenant(id="acme"), ts=TS, value="x")
+    assert strategy.partition_key("item", data, None) == "acme/2020/05/01/"
+    assert strategy.partition_prefix({"tenant.id": "acme"}) == "acme/"
+    assert strategy.partition_prefix({"tenant.id": "acme", "ts": TS}) == "acme/2020/05/01/"
+    assert strategy.partition_prefix({"ts": TS}) is None
+    assert strategy.split("acme/2020/05/01/item.json") == ("acme/2020/05/01", "item.json")
+
+
+def test_build_partition_strategy():
+    assert build_partition_strategy(None, []) is None
+    assert isinstance(build_partition_strategy("%Y/%m/", []), DatePartition)
+    assert isinstance(
+        build_partition_strategy(None, [PartitionSettings(strategy="hash", buckets=4)]),
+        HashPartition,
+    )
+    with pytest.raises(ValueError):
+        build_partition_strategy(None, [PartitionSettings(strategy="unknown")])
+
+
+@pytest.mark.asyncio
+async def test_list_objects_with_partition_strategy(moto_server):
+    """Objects partitioned by tenant and date, listings pruned by tenant"""
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix="partitioned",
+        partitioning=[
+            PartitionSettings(strategy="field", field="tenant.id"),
+            PartitionSettings(strategy="date", dateformat="%Y/%m/%d/%H/"),
+        ],
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    for tenant in ("acme", "other"):
+        for i in range(2):
+            location = await object_storage.store(
+                key=f"item{i}",
+                value=TenantData(tenant=Tenant(id=tenant), ts=TS, value=f"{tenant}{i}"),
+            )
+            assert location == f"{tenant}/2020/05/01/13/item{i}.json"
+    location = await object_storage.store_file(
+        file_name="file.bin", value=b"data", partition_values={"tenant.id": "acme", "ts": TS}
+    )
+    assert location == "acme/2020/05/01/13/file.bin"
+
+    items = await object_storage.list_objects(
+        recursive=True, partition_values={"tenant.id": "acme"}
+    )
+    assert items == [
+        ItemLocator(item_id="item0", partition_key="acme/2020/05/01/13"),
+        ItemLocator(item_id="item1", partition_key="acme/2020/05/01/13"),
+    ]
+    items = await object_storage.list_objects(
+        "item1", partition_values={"tenant.id": "other", "ts": TS}
+    )
+    assert items == [ItemLocator(item_id="item1", partition_key="other/2020/05/01/13")]
+    files = await object_storage.list_files(recursive=True)
+    assert ItemLocator(item_id="file.bin", partition_key="acme/2020/05/01/13") in files
+    assert len(files) == 5
+
+    item = await object_storage.get(
+        key="item1", datatype=TenantData, partition_key="other/2020/05/01/13"
+    )
+    assert item is not None and item.value == "other1"
+
+    for tenant in ("acme", "other"):
+        await object_storage.delete("item0", "item1", partition_key=f"{tenant}/2020/05/01/13")
+    await object_storage.delete_files("file.bin", partition_key="acme/2020/05/01/13")
@@ -0,0 +1,106 @@
+"""
+hopeit.aws.s3 presigned requests tests
+"""
+
+from datetime import datetime, timezone
+
+import aiohttp
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    DedupSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PresignedRequest,
+)
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="presign",
+        partition_dateformat="%Y/%m/%d/",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_presign_put_and_get(moto_server):
+    object_storage = await ObjectStorage.with_settings(storage_settings(shards=2)).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    ts = datetime(2020, 5, 1, tzinfo=timezone.utc)
+
+    upload = object_storage.presign_put(
+        "file1.txt", partition_values={"ts": ts}, content_type="text/plain", expires_in=60
+    )
+    assert isinstance(upload, PresignedRequest)
+    assert upload.method == "PUT"
+    assert upload.location == "2020/05/01/file1.txt"
+    assert upload.headers == {"Content-Type": "text/plain"}
+    assert upload.expires_at > datetime.now(tz=timezone.utc)
+    async with aiohttp.ClientSession() as client:
+        async with client.put(upload.url, data=b"data", headers=upload.headers) as response:
+            assert response.status == 200
+
+    assert await object_storage.get_file("file1.txt", partition_key="2020/05/01") == b"data"
+
+    download = object_storage.presign_get(
+        "file1.txt",
+        partition_key="2020/05/01",
+        content_disposition='attachment; filename="file1.txt"',
+    )
+    assert download.method == "GET"
+    assert download.location == upload.location
+    async with aiohttp.ClientSession() as client:
+        async with client.get(download.url) as response:
+            assert response.status == 200
+            assert response.headers["Content-Disposition"] == 'attachment; filename="file1.txt"'
+            assert await response.read() == b"data"
+
+        # Signature doesn't allow changing the key
+        async with client.get(download.url.replace("file1.txt", "file2.txt")) as response:
+            assert response.status == 403
+
+    await object_storage.delete_files("file1.txt", partition_key="2020/05/01")
+
+
+@pytest.mark.asyncio
+async def test_presign_post(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(dedup=DedupSettings())
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    ts = datetime(2020, 5, 1, tzinfo=timezone.utc)
+    await object_storage.store_file(
+        file_name="file2.txt", value=b"old", partition_values={"ts": ts}
+    )
+
+    upload = object_storage.presign_post(
+        "file2.txt", partition_values={"ts": ts}, content_type="text/plain", max_size=100
+    )
+    assert upload.method == "POST"
+    assert upload.location == "2020/05/01/file2.txt"
+    assert upload.fields["key"] == "presign/2020/05/01/file2.txt"
+    assert upload.fields["Content-Type"] == "text/plain"
+
+    form = aiohttp.FormData(upload.fields)
+    form.add_field("file", b"data", filename="file2.txt", content_type="text/plain")
+    async with aiohttp.ClientSession() as client:
+        async with client.post(upload.url, data=form) as response:
+            assert response.status in (200, 204)
+
+    assert await object_storage.get_file("file2.txt", partition_key="2020/05/01") == b"data"
+
+    # Cached content hash was evicted, so storing previous content is not skipped
+    await object_storage.store_file(
+        file_name="file2.txt", value=b"old", partition_values={"ts": ts}
+    )
+    assert await object_storage.get_file("file2.txt", partition_key="2020/05/01") == b"old"
+
+    await object_storage.delete_files("file2.txt", partition_key="2020/05/01")
@@ -0,0 +1,143 @@
+"""
+hopeit.aws.s3 retention purge tests
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ItemLocator,
+    ManifestSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+    PartitionSettings,
+    PurgeResult,
+)
+from hopeit.aws.s3.partition import build_partition_strategy
+from hopeit.aws.s3.retention import date_period, partition_expired
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject(event_ts="ts")
+@dataclass
+class RetentionData:
+    id: str
+    ts: datetime
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="purge",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+def utc(year: int, month: int, day: int, hour: int = 0) -> datetime:
+    return datetime(year, month, day, hour, tzinfo=timezone.utc)
+
+
+def test_date_period():
+    assert date_period("%Y/%m/%d/", ["2020"]) == (utc(2020, 1, 1), utc(2021, 1, 1))
+    assert date_period("%Y/%m/%d/", ["2020", "12"]) == (utc(2020, 12, 1), utc(2021, 1, 1))
+    assert date_period("%Y/%m/%d/", ["2020", "05", "31"]) == (utc(2020, 5, 31), utc(2020, 6, 1))
+    assert date_period("%Y/%m/%d/%H/", ["2020", "05", "01", "10"]) == (
+        utc(2020, 5, 1, 10),
+        utc(2020, 5, 1, 11),
+    )
+    assert date_period("%Y-%m-%d", ["2020-05-01"]) == (utc(2020, 5, 1), utc(2020, 5, 2))
+    assert date_period("%m/%Y/", ["05"]) is None
+    assert date_period("%Y/%W/", ["2020", "10"]) is None
+    assert date_period("%Y/%m/", ["2020", "xx"]) is None
+
+
+def test_partition_expired():
+    cutoff = utc(2020, 5, 15)
+    strategy = build_partition_strategy("%Y/%m/%d/", [])
+    assert strategy is not None
+    assert partition_expired(strategy, ["2019"], cutoff) is True
+    assert partition_expired(strategy, ["2020"], cutoff) is None
+    assert partition_expired(strategy, ["2020", "05"], cutoff) is None
+    assert partition_expired(strategy, ["2020", "05", "14"], cutoff) is True
+    assert partition_expired(strategy, ["2020", "05", "15"], cutoff) is False
+    assert partition_expired(strategy, ["2021"], cutoff) is False
+
+    composite = build_partition_strategy(
+        None,
+        [
+            PartitionSettings(strategy="field", field="tenant"),
+            PartitionSettings(strategy="date", dateformat="%Y/%m/"),
+        ],
+    )
+    assert composite is not None
+    assert partition_expired(composite, ["acme"], cutoff) is None
+    assert partition_expired(composite, ["acme", "2020", "04"], cutoff) is True
+    assert partition_expired(composite, ["acme", "2020", "05"], cutoff) is None
+
+
+@pytest.mark.asyncio
+async def test_purge(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(
+            partition_dateformat="%Y/%m/%d/",
+            shards=2,
+            index=IndexSettings(),
+            manifests=ManifestSettings(),
+        )
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    for i, ts in enumerate([utc(2020, 5, 1), utc(2020, 5, 2), utc(2020, 6, 1)]):
+        await object_storage.store(key=f"item{i}", value=RetentionData(id=f"item{i}", ts=ts))
+    await object_storage.store_file(
+        file_name="file0.txt", value=b"data", partition_values={"ts": utc(2020, 5, 1)}
+    )
+    # item0 stored again in a live partition: its index entry is kept
+    await object_storage.store(key="item0", value=RetentionData(id="item0", ts=utc(2020, 6, 1)))
+    await object_storage.seal_partition("2020/05/01")
+
+    dry_run = await object_storage.purge(utc(2020, 5, 15), dry_run=True)
+    assert dry_run.partitions == ["2020/05/01", "2020/05/02"]
+    assert dry_run.items == 3 and dry_run.size > 0 and dry_run.dry_run
+    assert len(await object_storage.list_objects(recursive=True)) == 4
+
+    result = await object_storage.purge(utc(2020, 5, 15), concurrency=4)
+    assert result == PurgeResult(
+        cutoff=utc(2020, 5, 15),
+        partitions=["2020/05/01", "2020/05/02"],
+        items=3,
+        size=dry_run.size,
+        failed=0,
+        dry_run=False,
+    )
+    assert sorted(item.item_id for item in await object_storage.list_objects(recursive=True)) == [
+        "item0",
+        "item2",
+    ]
+    assert [
+        (item.item_id, item.partition_key)
+        for item in await object_storage.list_files(recursive=True)
+    ] == [("item0.json", "2020/06/01"), ("item2.json", "2020/06/01")]
+    assert await object_storage.locate("item0") == ItemLocator("item0", "2020/06/01")
+    assert await object_storage.locate("item1") is None
+
+    # Remaining data is older than a day
+    assert (await object_storage.purge(timedelta(days=1))).partitions == ["2020"]
+    assert await object_storage.list_objects(recursive=True) == []
+
+
+@pytest.mark.asyncio
+async def test_purge_requires_date_partition(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(partitioning=[PartitionSettings(strategy="hash", buckets=4)])
+    ).connect()
+    with pytest.raises(ValueError):
+        await object_storage.purge(timedelta(days=30))
@@ -2,8 +2,9 @@
 hopeit.aws.s3 tests
 """
 
+import hashlib
 import io
-from time import sleep
+from datetime import datetime, timedelta, timezone
 from typing import Optional
 
 import pytest
@@ -14,18 +15,9 @@ from hopeit.aws.s3 import (
     ObjectStorage,
     ObjectStorageSettings,
 )
+from hopeit.aws.s3.partition import get_shard_key, get_shard_keys
 from hopeit.dataobjects import dataclass, dataobject
-from moto.server import ThreadedMotoServer
-
-
-# Fixture to start and stop the Moto server
-@pytest.fixture(scope="session")
-def moto_server():
-    server = ThreadedMotoServer(port=9002)
-    server.start()
-    sleep(1)
-    yield server
-    server.stop()
+from hopeit.dataobjects.payload import Payload
 
 
 @dataobject
@@ -593,3 +585,115 @@ async def test_list_files_with_partition(prefix, moto_server):
     await object_storage.delete_files("sub_dir/test03.bin", partition_key=partition_key)
     await object_storage.delete_files("sub_dir/test04.bin", partition_key=partition_key)
     await object_storage.delete_files("sub_dir/test01.tmp", partition_key=partition_key)
+
+
+def test_shard_keys():
+    assert get_shard_keys(16) == [f"{i:x}/" for i in range(16)]
+    assert get_shard_keys(256)[255] == "ff/"
+    assert get_shard_key("test.json", 16) == get_shard_key("test.json", 16)
+    assert get_shard_key("test.json", 16) in get_shard_keys(16)
+    assert len({get_shard_key(f"key{i}.json", 4) for i in range(100)}) == 4
+
+
+@pytest.mark.parametrize("prefix", ["sharded/", "sharded_no_slash"])
+@pytest.mark.asyncio
+async def test_sharded_objects_and_files(prefix, moto_server):
+    """Objects and files stored in hash-derived shard directories"""
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        partition_dateformat="%Y/%m/%d/%H/",
+        shards=4,
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    raw_storage = await ObjectStorage.with_settings(
+        ObjectStorageSettings(
+            bucket="test", prefix=prefix, connection_config=settings.connection_config
+        )
+    ).connect()
+
+    keys = [f"shard_test{i:02}" for i in range(8)]
+    partition_key = ""
+    for key in keys:
+        location = await object_storage.store(key=key, value=expected_aws_mock_data)
+        partition_key = object_storage.partition_key(location)
+        assert location == f"{partition_key}/{key}.json"
+    location = await object_storage.store_file(file_name="shard_test.bin", value=b"data")
+    assert location == f"{partition_key}/shard_test.bin"
+
+    raw_items = await raw_storage.list_files(recursive=True)
+    raw_keys = {item.item_id for item in raw_items}
+    for key in keys:
+        shard = get_shard_key(f"{key}.json", 4)
+        assert f"{shard}{partition_key}/{key}.json" in raw_keys
+    assert len({item.item_id.split("/", 1)[0] for item in raw_items}) > 1
+
+    obj = await object_storage.get(key=keys[0], datatype=AwsMockData, partition_key=partition_key)
+    assert obj == expected_aws_mock_data
+    assert (
+        await object_storage.get_file(file_name="shard_test.bin", partition_key=partition_key)
+        == b"data"
+    )
+
+    items = await object_storage.list_objects(recursive=True)
+    assert items == [ItemLocator(item_id=key, partition_key=partition_key) for key in keys]
+    items = await object_storage.list_objects(f"{partition_key}/shard_test0[0-3]")
+    assert items == [ItemLocator(item_id=key, partition_key=partition_key) for key in keys[:4]]
+    files = await object_storage.list_files(f"{partition_key}/*.bin")
+    assert files == [ItemLocator(item_id="shard_test.bin", partition_key=partition_key)]
+
+    await object_storage.delete(*keys, partition_key=partition_key)
+    await object_storage.delete_files("shard_test.bin", partition_key=partition_key)
+    assert await object_storage.list_files(recursive=True) == []
+
+
+@pytest.mark.asyncio
+async def test_list_metadata_and_filters(moto_server):
+    """Listings return size, etag and last modified, and filter by them"""
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix="metadata",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    start = datetime.now(tz=timezone.utc).replace(microsecond=0) - timedelta(seconds=1)
+    for size in (1, 10, 100):
+        await object_storage.store_file(file_name=f"file{size:03}.bin", value=b"x" * size)
+    await object_storage.store(key="object", value=expected_aws_mock_data)
+
+    files = await object_storage.list_files("*.bin")
+    assert files == [ItemLocator(item_id=f"file{size:03}.bin") for size in (1, 10, 100)]
+    assert [item.size for item in files] == [1, 10, 100]
+    assert files[0].etag == hashlib.md5(b"x").hexdigest()
+    assert all(item.last_modified and item.last_modified >= start for item in files)
+
+    assert await object_storage.list_files("*.bin", min_size=10) == files[1:]
+    assert await object_storage.list_files("*.bin", max_size=10) == files[:2]
+    assert await object_storage.list_files("*.bin", min_size=5, max_size=50) == files[1:2]
+    assert await object_storage.list_files(modified_since=start) == [
+        *files,
+        ItemLocator(item_id="object.json"),
+    ]
+    assert await object_storage.list_files(modified_since=start + timedelta(days=1)) == []
+
+    objects = await object_storage.list_objects(min_size=1)
+    assert objects == [ItemLocator(item_id="object")]
+    assert objects[0].size == len(Payload.to_json(expected_aws_mock_data))
+    assert await object_storage.list_objects(max_size=1) == []
+
+    await object_storage.delete_files(*(item.item_id for item in files))
+    await object_storage.delete("object")
@@ -0,0 +1,176 @@
+"""
+hopeit.aws.s3 segment files tests
+"""
+
+import gzip
+from datetime import datetime, timezone
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    ObjectStorage,
+    ObjectStorageSettings,
+    SegmentInfo,
+    SegmentSettings,
+)
+from hopeit.aws.s3.segments import (
+    SegmentEntry,
+    decode_footer,
+    decode_index,
+    decode_record,
+    encode_record,
+    encode_segment,
+)
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject(event_ts="ts")
+@dataclass
+class SegmentData:
+    id: str
+    ts: datetime
+    value: str
+
+
+def data(i: int, day: int = 1) -> SegmentData:
+    return SegmentData(id=f"item{i}", ts=datetime(2020, 5, day, tzinfo=timezone.utc), value="x" * i)
+
+
+def test_encode_decode_segment():
+    records = [(f"item{i}", encode_record(data(i))) for i in range(3)]
+    segment, entries = encode_segment(records)
+    index_offset, index_length = decode_footer(segment)
+    assert index_offset == sum(len(record) for _, record in records)
+    assert decode_index(segment[index_offset : index_offset + index_length]) == entries
+    assert entries[1] == SegmentEntry("item1", len(records[0][1]), len(records[1][1]))
+    for i, entry in enumerate(entries):
+        record = segment[entry.offset : entry.offset + entry.length]
+        assert decode_record(record, SegmentData) == data(i)
+
+    # Records section is a valid gzip stream of NDJSON
+    lines = gzip.decompress(segment[:index_offset]).decode().splitlines()
+    assert len(lines) == 3
+
+    with pytest.raises(ValueError):
+        decode_footer(segment[:-1])
+    with pytest.raises(ValueError):
+        decode_footer(b"")
+
+
+def storage_settings(prefix: str, **kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix=prefix,
+        partition_dateformat="%Y/%m/%d/",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+@pytest.mark.parametrize("shards", [0, 4])
+@pytest.mark.asyncio
+async def test_segment_writer(shards, moto_server):
+    settings = storage_settings(
+        f"segments-{shards}", shards=shards, segments=SegmentSettings(max_items=5)
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    flushed = []
+    async with object_storage.segment_writer() as writer:
+        for i in range(12):
+            info = await writer.append(key=f"item{i}", value=data(i, day=1 + i % 2))
+            if info is not None:
+                flushed.append(info)
+        assert writer.pending == 2
+    assert [(info.partition_key, info.count) for info in flushed] == [
+        ("2020/05/01", 5),
+        ("2020/05/02", 5),
+    ]
+    assert writer.pending == 0
+
+    segments = await object_storage.list_segments(recursive=True)
+    assert len(segments) == 4
+    assert await object_storage.list_objects(recursive=True) == []
+    assert len(await object_storage.list_segments("2020/05/01/*")) == 2
+
+    info = flushed[0]
+    assert isinstance(info, SegmentInfo)
+    assert info.location == f"2020/05/01/{info.segment_id}.seg"
+
+    # Read from a new instance, without cached indexes
+    reader = await ObjectStorage.with_settings(settings).connect()
+    item = await reader.get_segment_item(
+        info.segment_id, "item4", datatype=SegmentData, partition_key="2020/05/01"
+    )
+    assert item == data(4)
+    assert (
+        await reader.get_segment_item(
+            info.segment_id, "item5", datatype=SegmentData, partition_key="2020/05/01"
+        )
+        is None
+    )
+    assert (
+        await reader.get_segment_item(
+            "missing", "item4", datatype=SegmentData, partition_key="2020/05/01"
+        )
+        is None
+    )
+
+    items = [
+        item
+        async for item in reader.read_segment(
+            info.segment_id, datatype=SegmentData, partition_key="2020/05/01"
+        )
+    ]
+    assert items == [(f"item{i}", data(i)) for i in (0, 2, 4, 6, 8)]
+
+    for segment in segments:
+        await object_storage.delete_files(
+            segment.item_id + ".seg", partition_key=segment.partition_key
+        )
+
+
+@pytest.mark.asyncio
+async def test_store_segment_large_index(monkeypatch, moto_server):
+    settings = storage_settings("segments-large", segments=SegmentSettings())
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    items = [(f"item{i}", data(i % 50)) for i in range(200)]
+    info = await object_storage.store_segment(items, partition_key="2020/05/01")
+    assert info.count == 200
+    assert info.partition_key == "2020/05/01"
+
+    empty = await object_storage.store_segment([], partition_key="2020/05/01")
+    assert empty.count == 0
+
+    # Index doesn't fit in the tail read with the first request
+    monkeypatch.setattr("hopeit.aws.s3.object_storage.SEGMENT_TAIL_SIZE", 64)
+    reader = await ObjectStorage.with_settings(settings).connect()
+    assert await reader.get_segment_item(
+        info.segment_id, "item149", datatype=SegmentData, partition_key="2020/05/01"
+    ) == data(49)
+    count = 0
+    async for item_id, item in reader.read_segment(
+        info.segment_id, datatype=SegmentData, partition_key="2020/05/01"
+    ):
+        assert (item_id, item) == items[count]
+        count += 1
+    assert count == 200
+    assert [
+        item
+        async for item in reader.read_segment(
+            empty.segment_id, datatype=SegmentData, partition_key="2020/05/01"
+        )
+    ] == []
+
+    for segment in (info, empty):
+        await object_storage.delete_files(
+            segment.segment_id + ".seg", partition_key=segment.partition_key
+        )
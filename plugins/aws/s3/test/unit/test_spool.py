@@ -0,0 +1,172 @@
+"""
+hopeit.aws.s3 durable local spool tests
+"""
+
+import asyncio
+from time import sleep
+from typing import List, Optional, Sequence
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+    SpoolSettings,
+    WriteBehindSettings,
+)
+from hopeit.aws.s3.spool import Spool
+from hopeit.aws.s3.writebehind import PendingWrite
+from hopeit.dataobjects import dataclass, dataobject
+from moto.server import ThreadedMotoServer
+
+
+@dataobject
+@dataclass
+class SpoolData:
+    value: str
+
+
+class MockWriter:
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.fail: set = set()
+
+    async def write_batch(self, writes: Sequence[PendingWrite]) -> List[Optional[BaseException]]:
+        self.batches.append([write.key for write in writes])
+        return [RuntimeError("failed") if write.key in self.fail else None for write in writes]
+
+
+@pytest.mark.asyncio
+async def test_spool_journal(tmp_path):
+    writer = MockWriter()
+    settings = SpoolSettings(path=str(tmp_path), segment_bytes=100, retry_interval=60.0)
+    spool = Spool(settings, "bucket", writer.write_batch)
+    errors = []
+    spool.on_error = lambda key, e: errors.append(key)
+    writer.fail.update({"a", "b", "c"})
+
+    assert await spool.put(PendingWrite("a", b"x" * 10, "a", "2020"))
+    assert await spool.put(PendingWrite("a", b"y" * 20, "a", "2020"))
+    await spool.put(PendingWrite("b", b"z" * 80))
+    await spool.put(PendingWrite("c", b"w" * 10))
+    await spool.put(PendingWrite("d", b"v" * 10))
+    spool.discard("d")
+    assert spool.get("a") == b"y" * 20
+    assert spool.get("d") is None
+    assert await spool.read("b") == b"z" * 80
+    assert await spool.read("d") is None
+    assert spool.size("a") == 20 and spool.size("d") is None
+    assert spool.pending == 3 and spool.pending_bytes == 110
+    assert not await spool.put(PendingWrite("big", b"x" * (settings.max_bytes + 1)))
+
+    assert await spool.flush() == 0
+    assert set(errors) == {"a", "b", "c"}
+    assert await spool.close() == 0
+
+    # Partially written record at the end of the journal is dropped on load
+    journals = sorted(tmp_path.glob("bucket/*.journal"))
+    assert len(journals) == 3
+    with open(journals[-1], "ab") as journal:
+        journal.write(b"HSP1\x00\x00")
+
+    writer.fail.clear()
+    spool = Spool(settings, "bucket", writer.write_batch)
+    assert spool.pending == 3 and spool.pending_bytes == 110
+    assert spool.get("a") == b"y" * 20
+    assert await spool.flush() == 3
+    assert writer.batches[-1] == ["a", "b", "c"]
+    assert await spool.close() == 0
+    assert list(tmp_path.glob("bucket/*.journal")) == []
+
+    spool = Spool(settings, "bucket", writer.write_batch)
+    assert spool.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_spool_background_upload(tmp_path):
+    writer = MockWriter()
+    spool = Spool(
+        SpoolSettings(path=str(tmp_path), retry_interval=0.05, max_retry_interval=0.1),
+        "bucket",
+        writer.write_batch,
+    )
+    writer.fail.add("a")
+    await spool.put(PendingWrite("a", b"x" * 10))
+    await asyncio.sleep(0.02)
+    assert writer.batches == [["a"]]
+    assert spool.pending == 1
+
+    writer.fail.clear()
+    await asyncio.sleep(0.2)
+    assert writer.batches == [["a"], ["a"]]
+    assert spool.pending == 0
+    assert await spool.close() == 0
+
+
+def storage_settings(tmp_path, endpoint_url: str) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test-spool",
+        prefix="spool",
+        index=IndexSettings(),
+        spool=SpoolSettings(path=str(tmp_path), retry_interval=60.0),
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url=endpoint_url,
+            region_name="eu-central-1",
+            max_attempts=1,
+        ),
+    )
+
+
+def test_spool_write_behind_exclusive(tmp_path):
+    with pytest.raises(ValueError):
+        ObjectStorage(
+            bucket="test",
+            write_behind=WriteBehindSettings(),
+            spool=SpoolSettings(path=str(tmp_path)),
+        )
+
+
+@pytest.mark.asyncio
+async def test_spool_store_unreachable(tmp_path):
+    settings = storage_settings(tmp_path, "http://localhost:9003")
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    errors: list = []
+    object_storage.set_write_behind_callbacks(on_error=lambda key, e: errors.append(key))
+
+    # S3 is not reachable: writes are kept in the local journal
+    await object_storage.store(key="item1", value=SpoolData(value="1"))
+    await object_storage.store_file(file_name="file1.txt", value=b"data")
+    assert await object_storage.get("item1", datatype=SpoolData) == SpoolData(value="1")
+    assert await object_storage.flush() == 0
+    assert set(errors) == {"spool/item1.json", "spool/file1.txt"}
+    assert await object_storage.close() == 0
+    assert object_storage.pending_writes == 2
+
+    server = ThreadedMotoServer(port=9003)
+    server.start()
+    sleep(1)
+    try:
+        reader = await ObjectStorage.with_settings(
+            ObjectStorageSettings(
+                bucket=settings.bucket,
+                prefix=settings.prefix,
+                index=IndexSettings(),
+                connection_config=settings.connection_config,
+            )
+        ).connect()
+        await reader.create_bucket(exist_ok=True)
+
+        # Pending writes are uploaded by a new instance after restart
+        object_storage = await ObjectStorage.with_settings(settings).connect()
+        assert object_storage.pending_writes == 2
+        await object_storage.close()
+        assert object_storage.pending_writes == 0
+        assert list(tmp_path.glob("**/*.journal")) == []
+
+        assert await reader.get("item1", datatype=SpoolData) == SpoolData(value="1")
+        assert await reader.get_file("file1.txt") == b"data"
+    finally:
+        server.stop()
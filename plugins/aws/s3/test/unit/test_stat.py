@@ -0,0 +1,102 @@
+"""
+hopeit.aws.s3 exists and stat tests
+"""
+
+from datetime import datetime
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ItemLocator,
+    ItemStat,
+    ObjectStorage,
+    ObjectStorageSettings,
+    WriteBehindSettings,
+)
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class StatData:
+    value: str
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="stat",
+        partition_dateformat="%Y/%m/%d/",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+@pytest.mark.asyncio
+async def test_exists_and_stat(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(index=IndexSettings())
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    location = await object_storage.store(key="item1", value=StatData(value="1"))
+    partition_key = object_storage.partition_key(location)
+    file_location = await object_storage.store_file(file_name="file1.txt", value=b"data")
+
+    assert await object_storage.exists("item1")
+    assert await object_storage.exists("item1", partition_key=partition_key)
+    assert not await object_storage.exists("missing")
+    assert not await object_storage.exists("item1", partition_key="2000/01/01")
+
+    stat = await object_storage.stat("item1")
+    assert isinstance(stat, ItemStat)
+    assert stat.item_id == "item1"
+    assert stat.partition_key == partition_key
+    assert stat.size == len(b'{"value":"1"}')
+    assert stat.etag is not None
+    assert isinstance(stat.last_modified, datetime)
+
+    file_stat = await object_storage.stat_file(
+        "file1.txt", partition_key=object_storage.partition_key(file_location)
+    )
+    assert file_stat is not None and file_stat.size == 4
+    assert await object_storage.stat_file("file1.txt", partition_key="2000/01/01") is None
+
+    stats = await object_storage.stat_many(
+        [ItemLocator("item1"), ItemLocator("missing"), ItemLocator("item1", partition_key)],
+        concurrency=2,
+    )
+    assert [item.size if item else None for item in stats] == [stat.size, None, stat.size]
+    files = await object_storage.stat_many(
+        [ItemLocator("file1.txt", object_storage.partition_key(file_location))], files=True
+    )
+    assert files == [file_stat]
+
+    await object_storage.delete("item1")
+    await object_storage.delete_files(
+        "file1.txt", partition_key=object_storage.partition_key(file_location)
+    )
+
+
+@pytest.mark.asyncio
+async def test_stat_pending_write(moto_server):
+    object_storage = await ObjectStorage.with_settings(
+        storage_settings(write_behind=WriteBehindSettings(flush_interval=60.0))
+    ).connect()
+    await object_storage.create_bucket(exist_ok=True)
+
+    location = await object_storage.store(key="item2", value=StatData(value="2"))
+    partition_key = object_storage.partition_key(location)
+    stat = await object_storage.stat("item2", partition_key=partition_key)
+    assert stat == ItemStat(item_id="item2", partition_key=partition_key, size=13)
+
+    await object_storage.close()
+    stat = await object_storage.stat("item2", partition_key=partition_key)
+    assert stat is not None and stat.etag is not None
+    await object_storage.delete("item2", partition_key=partition_key)
@@ -0,0 +1,180 @@
+"""
+hopeit.aws.s3 streaming tests
+"""
+
+import asyncio
+import json
+import random
+from typing import Optional
+from unittest.mock import MagicMock
+
+import pytest
+from hopeit.app.context import PostprocessHook
+from hopeit.aws.s3 import ItemLocator
+from hopeit.aws.s3.streaming import (
+    IngestResult,
+    get_objects,
+    read_ndjson,
+    store_ndjson,
+    stream_ndjson,
+)
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class StreamedData:
+    value: str
+
+
+class MockObjectStorage:
+    def __init__(self):
+        self.running = 0
+        self.max_running = 0
+
+    async def get(
+        self, key: str, datatype, partition_key: Optional[str] = None
+    ) -> Optional[StreamedData]:
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        await asyncio.sleep(random.random() / 100)
+        self.running -= 1
+        if key == "missing":
+            return None
+        return datatype(value=f"{partition_key}/{key}")
+
+    async def store(self, *, key: str, value: StreamedData) -> str:
+        self.running += 1
+        self.max_running = max(self.running, self.max_running)
+        await asyncio.sleep(random.random() / 100)
+        self.running -= 1
+        if key == "fail":
+            raise RuntimeError("store failed")
+        return f"2020/05/01/{key}.json"
+
+
+def locators(n: int):
+    return [ItemLocator(item_id=f"item{i}", partition_key="2020/05/01") for i in range(n)]
+
+
+@pytest.mark.asyncio
+async def test_get_objects_ordered():
+    storage = MockObjectStorage()
+    items = locators(50)
+    results = [
+        (item, value)
+        async for item, value in get_objects(
+            storage,  # type: ignore[arg-type]
+            items,
+            StreamedData,
+            concurrency=4,
+        )
+    ]
+    assert [item for item, _ in results] == items
+    assert [value for _, value in results] == [
+        StreamedData(value=f"2020/05/01/item{i}") for i in range(50)
+    ]
+    assert storage.max_running == 4
+
+
+@pytest.mark.asyncio
+async def test_get_objects_unordered():
+    storage = MockObjectStorage()
+
+    async def items():
+        for item in locators(20):
+            yield item
+
+    results = [
+        item
+        async for item, _ in get_objects(
+            storage,  # type: ignore[arg-type]
+            items(),
+            StreamedData,
+            concurrency=3,
+            ordered=False,
+        )
+    ]
+    assert sorted(results, key=lambda x: int(x.item_id[4:])) == locators(20)
+    assert storage.max_running == 3
+
+    with pytest.raises(ValueError):
+        async for _ in get_objects(storage, [], StreamedData, concurrency=0):  # type: ignore
+            pass
+
+
+@pytest.mark.asyncio
+async def test_stream_ndjson():
+    storage = MockObjectStorage()
+    response = PostprocessHook()
+    context = MagicMock(track_ids={})
+    items = [*locators(3), ItemLocator(item_id="missing")]
+    count = await stream_ndjson(
+        storage,  # type: ignore[arg-type]
+        items,
+        StreamedData,
+        context,
+        response,
+        concurrency=2,
+    )
+    assert count == 3
+    assert response.content_type == "application/x-ndjson"
+    assert response.headers == {
+        "Content-Disposition": 'inline; filename="objects.ndjson"',
+        "Content-Type": "application/x-ndjson",
+    }
+    assert response.stream_response is not None
+    lines = response.stream_response.resp.data.decode().splitlines()  # type: ignore
+    assert [json.loads(line) for line in lines] == [
+        {"value": f"2020/05/01/item{i}"} for i in range(3)
+    ]
+
+
+async def chunked(data: bytes, chunk_size: int):
+    for i in range(0, len(data), chunk_size):
+        yield data[i : i + chunk_size]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7, 1024])
+@pytest.mark.asyncio
+async def test_read_ndjson(chunk_size):
+    data = b'{"value": "a"}\n\n{"value": 1}\n{"value": "' + b"x" * 40 + b'"}\n{"value": "b"}'
+    results = [
+        (line, value)
+        async for line, value in read_ndjson(
+            chunked(data, chunk_size), StreamedData, max_line_size=32
+        )
+    ]
+    assert [line for line, _ in results] == [1, 3, 4, 5]
+    assert results[0][1] == StreamedData(value="a")
+    assert isinstance(results[1][1], ValueError)
+    assert isinstance(results[2][1], ValueError)
+    assert "exceeds 32 bytes" in str(results[2][1])
+    assert results[3][1] == StreamedData(value="b")
+
+
+@pytest.mark.asyncio
+async def test_store_ndjson():
+    storage = MockObjectStorage()
+    lines = [f'{{"value": "item{i}"}}' for i in range(30)]
+    lines[5] = '{"value": "Fail"}'
+    lines[10] = "invalid"
+    data = ("\n".join(lines) + "\n").encode()
+    results = [
+        result
+        async for result in store_ndjson(
+            storage,  # type: ignore[arg-type]
+            chunked(data, 16),
+            StreamedData,
+            key=lambda x: x.value,
+            transform=lambda x: StreamedData(value=x.value.lower()),
+            concurrency=4,
+        )
+    ]
+    assert [result.line for result in results] == list(range(1, 31))
+    assert results[0] == IngestResult(line=1, key="item0", location="2020/05/01/item0.json")
+    assert results[29].key == "item29"
+    assert results[5] == IngestResult(line=6, key="fail", error="RuntimeError: store failed")
+    assert results[10].key is None and results[10].error
+    assert sum(1 for result in results if result.error) == 2
+    assert storage.max_running == 4
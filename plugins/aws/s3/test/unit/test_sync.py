@@ -0,0 +1,158 @@
+"""
+hopeit.aws.s3 local sync tests
+"""
+
+import os
+from datetime import datetime, timezone
+
+import pytest
+from hopeit.aws.s3 import ConnectionConfig, ObjectStorage, ObjectStorageSettings, SyncResult
+from hopeit.aws.s3.sync import ThreadedFile, set_mtime
+
+
+def storage_settings(**kwargs) -> ObjectStorageSettings:
+    return ObjectStorageSettings(
+        bucket="test",
+        prefix="sync",
+        partition_dateformat="%Y/%m/%d/",
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+        **kwargs,
+    )
+
+
+def utc(year: int, month: int, day: int) -> datetime:
+    return datetime(year, month, day, tzinfo=timezone.utc)
+
+
+@pytest.mark.asyncio
+async def test_sync_to_local(moto_server, tmp_path):
+    object_storage = await ObjectStorage.with_settings(storage_settings(shards=2)).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    large = os.urandom(9 * 1024 * 1024)
+    await object_storage.store_file(
+        file_name="file1.txt", value=b"data1", partition_values={"ts": utc(2020, 5, 1)}
+    )
+    await object_storage.store_file(
+        file_name="large.bin", value=large, partition_values={"ts": utc(2020, 5, 1)}
+    )
+    await object_storage.store_file(
+        file_name="file2.txt", value=b"data2", partition_values={"ts": utc(2020, 6, 1)}
+    )
+
+    dry_run = await object_storage.sync_to_local(tmp_path, dry_run=True)
+    assert dry_run.transferred == [
+        "2020/05/01/file1.txt",
+        "2020/05/01/large.bin",
+        "2020/06/01/file2.txt",
+    ]
+    assert dry_run.size == len(large) + 10 and dry_run.dry_run
+    assert not (tmp_path / "2020").exists()
+
+    result = await object_storage.sync_to_local(tmp_path, concurrency=2)
+    assert result.transferred == dry_run.transferred and result.size == dry_run.size
+    assert (tmp_path / "2020/05/01/file1.txt").read_bytes() == b"data1"
+    assert (tmp_path / "2020/05/01/large.bin").read_bytes() == large
+    assert (tmp_path / "2020/06/01/file2.txt").read_bytes() == b"data2"
+
+    # Only changed files are downloaded
+    assert await object_storage.sync_to_local(tmp_path) == SyncResult(unchanged=3)
+    await object_storage.store_file(
+        file_name="file1.txt", value=b"data1-updated", partition_values={"ts": utc(2020, 5, 1)}
+    )
+    (tmp_path / "2020/05/01/extra.txt").write_bytes(b"extra")
+    (tmp_path / "2020/06/01/extra.txt").write_bytes(b"extra")
+    result = await object_storage.sync_to_local(tmp_path, partition_key="2020/05", delete=True)
+    assert result == SyncResult(
+        transferred=["2020/05/01/file1.txt"],
+        deleted=["2020/05/01/extra.txt"],
+        unchanged=1,
+        size=13,
+    )
+    assert (tmp_path / "2020/05/01/file1.txt").read_bytes() == b"data1-updated"
+    assert not (tmp_path / "2020/05/01/extra.txt").exists()
+    assert (tmp_path / "2020/06/01/extra.txt").exists()
+
+    # Same content with different modification time is not downloaded using checksum
+    os.utime(tmp_path / "2020/06/01/file2.txt", (0, 0))
+    result = await object_storage.sync_to_local(tmp_path, partition_key="2020/06", checksum=True)
+    assert result == SyncResult(unchanged=1)
+    assert await object_storage.sync_to_local(tmp_path, partition_key="2020/06") == SyncResult(
+        unchanged=1
+    )
+
+    await object_storage.delete_files("file1.txt", "large.bin", partition_key="2020/05/01")
+    await object_storage.delete_files("file2.txt", partition_key="2020/06/01")
+
+
+@pytest.mark.asyncio
+async def test_sync_from_local(moto_server, tmp_path):
+    object_storage = await ObjectStorage.with_settings(storage_settings()).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    (tmp_path / "2020/05/01").mkdir(parents=True)
+    (tmp_path / "2020/05/02").mkdir(parents=True)
+    (tmp_path / "2020/05/01/file1.txt").write_bytes(b"data1")
+    (tmp_path / "2020/05/01/file2.txt").write_bytes(b"data2")
+    (tmp_path / "2020/05/02/file3.txt").write_bytes(b"data3")
+
+    dry_run = await object_storage.sync_from_local(tmp_path, dry_run=True)
+    assert dry_run == SyncResult(
+        transferred=["2020/05/01/file1.txt", "2020/05/01/file2.txt", "2020/05/02/file3.txt"],
+        size=15,
+        dry_run=True,
+    )
+    assert await object_storage.list_files(recursive=True) == []
+
+    result = await object_storage.sync_from_local(tmp_path)
+    assert result.transferred == dry_run.transferred
+    assert await object_storage.get_file("file3.txt", partition_key="2020/05/02") == b"data3"
+    assert await object_storage.sync_from_local(tmp_path) == SyncResult(unchanged=3)
+
+    # Modified and deleted files
+    (tmp_path / "2020/05/01/file1.txt").write_bytes(b"data1-updated")
+    os.remove(tmp_path / "2020/05/01/file2.txt")
+    dry_run = await object_storage.sync_from_local(tmp_path, delete=True, dry_run=True)
+    assert dry_run.deleted == ["2020/05/01/file2.txt"]
+    assert await object_storage.get_file("file2.txt", partition_key="2020/05/01") == b"data2"
+
+    result = await object_storage.sync_from_local(tmp_path, partition_key="2020/05/01", delete=True)
+    assert result == SyncResult(
+        transferred=["2020/05/01/file1.txt"], deleted=["2020/05/01/file2.txt"], size=13
+    )
+    assert (
+        await object_storage.get_file("file1.txt", partition_key="2020/05/01") == b"data1-updated"
+    )
+    assert await object_storage.get_file("file2.txt", partition_key="2020/05/01") is None
+
+    # Newer modification time with same content is not uploaded using checksum
+    future = datetime.now().timestamp() + 3600
+    os.utime(tmp_path / "2020/05/02/file3.txt", (future, future))
+    assert (await object_storage.sync_from_local(tmp_path, dry_run=True)).transferred == [
+        "2020/05/02/file3.txt"
+    ]
+    assert await object_storage.sync_from_local(tmp_path, checksum=True) == SyncResult(unchanged=2)
+
+    await object_storage.delete_files("file1.txt", partition_key="2020/05/01")
+    await object_storage.delete_files("file3.txt", partition_key="2020/05/02")
+
+
+@pytest.mark.asyncio
+async def test_threaded_file(tmp_path):
+    path = tmp_path / "file.bin"
+    file = await ThreadedFile.open(path, "wb")
+    assert await file.write(b"0123456789") == 10
+    assert await file.seek(2) == 2
+    await file.write(b"xx")
+    await file.close()
+
+    file = await ThreadedFile.open(path, "rb")
+    assert await file.read(4) == b"01xx"
+    assert await file.read() == b"456789"
+    await file.close()
+
+    set_mtime(path, utc(2020, 5, 1))
+    assert os.stat(path).st_mtime == utc(2020, 5, 1).timestamp()
@@ -0,0 +1,162 @@
+"""
+hopeit.aws.s3 throttling tests
+"""
+
+import asyncio
+import io
+import time
+from typing import Any
+
+import pytest
+from botocore.exceptions import ClientError
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    ItemLocator,
+    ObjectStorage,
+    ObjectStorageSettings,
+    ThrottlingSettings,
+    throttling,
+)
+from hopeit.aws.s3.throttling import RateLimiter, get_rate_limiter, is_throttling_error
+
+
+def client_error(code: str, status: int, operation_name: str = "GetObject") -> ClientError:
+    response: Any = {"Error": {"Code": code}, "ResponseMetadata": {"HTTPStatusCode": status}}
+    return ClientError(response, operation_name)
+
+
+def slow_down_error() -> ClientError:
+    return client_error("SlowDown", 503, "PutObject")
+
+
+def test_is_throttling_error():
+    assert is_throttling_error(slow_down_error())
+    assert is_throttling_error(client_error("InternalError", 503))
+    assert not is_throttling_error(client_error("NoSuchKey", 404))
+    assert not is_throttling_error(ValueError("SlowDown"))
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_backoff_and_recovery():
+    settings = ThrottlingSettings(
+        prefix_rate=100.0,
+        bucket_rate=1000.0,
+        burst=1,
+        min_rate=10.0,
+        max_rate=101.0,
+        backoff_base=0.01,
+        backoff_max=0.05,
+    )
+    rate_limiter = RateLimiter("test", settings)
+
+    rate_limiter.on_needs_retry(
+        response=(None, slow_down_error().response),
+        request_dict={"url_path": "/test/2020/05/01/key.json?x-id=PutObject"},
+    )
+
+    bucket_limit, prefix_limit = rate_limiter._limits_for("2020/05/01/other.json")
+    assert prefix_limit.rate == 50.0
+    assert prefix_limit.throttle_count == 1
+    assert bucket_limit.rate == 500.0
+
+    other_limit = rate_limiter._limits_for("2020/05/02/key.json")[1]
+    assert other_limit is not prefix_limit
+    assert other_limit.rate == 100.0
+
+    start = time.monotonic()
+    async with rate_limiter.limit("2020/05/01/key.json"):
+        pass
+    assert time.monotonic() - start <= 1.0
+    assert prefix_limit.rate == 51.0
+    assert prefix_limit.throttle_count == 0
+
+    for _ in range(100):
+        prefix_limit.succeeded()
+    assert prefix_limit.rate == settings.max_rate
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_ignores_other_errors():
+    rate_limiter = RateLimiter("test", ThrottlingSettings(prefix_rate=100.0))
+    with pytest.raises(ClientError):
+        async with rate_limiter.limit("key.json"):
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+    rate_limiter.on_needs_retry(
+        response=(None, {"Error": {"Code": "NoSuchKey"}}),
+        request_dict={"url_path": "/test/key.json"},
+    )
+    rate_limiter.on_needs_retry(response=None, request_dict={"url_path": "/test/key.json"})
+    assert rate_limiter._limits_for("key.json")[0].rate == 100.0
+
+
+@pytest.mark.asyncio
+async def test_token_bucket_limits_rate():
+    rate_limiter = RateLimiter("test", ThrottlingSettings(prefix_rate=50.0, burst=1))
+    start = time.monotonic()
+    for _ in range(6):
+        async with rate_limiter.limit("prefix/key"):
+            pass
+    assert time.monotonic() - start >= 0.09
+
+
+def test_get_rate_limiter_shared_per_bucket_and_settings(monkeypatch):
+    monkeypatch.setattr(throttling, "_rate_limiters", {})
+    settings = ThrottlingSettings(prefix_rate=10.0)
+    other_settings = ThrottlingSettings(prefix_rate=20.0)
+    rate_limiter = get_rate_limiter("bucket-a", settings)
+    assert get_rate_limiter("bucket-a", ThrottlingSettings(prefix_rate=10.0)) is rate_limiter
+    assert get_rate_limiter("bucket-b", settings) is not rate_limiter
+    assert get_rate_limiter("bucket-a", other_settings) is not rate_limiter
+    assert get_rate_limiter("bucket-a", settings) is rate_limiter
+
+
+def test_rate_limiter_across_event_loops():
+    rate_limiter = RateLimiter("test", ThrottlingSettings(prefix_rate=100.0, burst=1))
+
+    async def contended_requests():
+        async def request():
+            async with rate_limiter.limit("prefix/key"):
+                await asyncio.sleep(0)
+
+        await asyncio.gather(*(request() for _ in range(3)))
+
+    asyncio.run(contended_requests())
+    asyncio.run(contended_requests())
+
+
+def test_invalid_retry_mode():
+    with pytest.raises(ValueError):
+        ConnectionConfig(retry_mode="aggressive")
+    assert ConnectionConfig(retry_mode="standard").retry_mode == "standard"
+
+
+@pytest.mark.asyncio
+async def test_throttled_object_storage(moto_server):
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix="throttled",
+        throttling=ThrottlingSettings(prefix_rate=1000.0, bucket_rate=1000.0),
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+            retry_mode="adaptive",
+            max_attempts=5,
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    assert "retry_mode" not in object_storage._conn_config
+    assert object_storage._rate_limiter is not None
+    assert object_storage._conn_config["config"].retries == {
+        "mode": "adaptive",
+        "total_max_attempts": 5,
+    }
+    await object_storage.create_bucket(exist_ok=True)
+
+    location = await object_storage.store_file(file_name="test.bin", value=io.BytesIO(b"data"))
+    assert location == "test.bin"
+    assert await object_storage.get_file(file_name="test.bin") == b"data"
+    assert await object_storage.list_files("*.bin") == [ItemLocator(item_id="test.bin")]
+    await object_storage.delete_files("test.bin")
+    assert await object_storage.get_file(file_name="test.bin") is None
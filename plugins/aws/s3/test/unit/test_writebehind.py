@@ -0,0 +1,245 @@
+"""
+hopeit.aws.s3 write-behind tests
+"""
+
+import asyncio
+from typing import List, Optional, Sequence
+
+import pytest
+from hopeit.aws.s3 import (
+    ConnectionConfig,
+    IndexSettings,
+    ObjectStorage,
+    ObjectStorageSettings,
+    WriteBehindSettings,
+)
+from hopeit.aws.s3.writebehind import PendingWrite, WriteBehindBuffer
+from hopeit.dataobjects import dataclass, dataobject
+
+
+@dataobject
+@dataclass
+class WriteBehindData:
+    value: str
+
+
+class MockWriter:
+    def __init__(self):
+        self.batches: List[List[str]] = []
+        self.fail: set = set()
+        self.release = asyncio.Event()
+        self.release.set()
+
+    async def write_batch(self, writes: Sequence[PendingWrite]) -> List[Optional[BaseException]]:
+        await self.release.wait()
+        self.batches.append([write.key for write in writes])
+        return [RuntimeError("failed") if write.key in self.fail else None for write in writes]
+
+
+@pytest.mark.asyncio
+async def test_write_behind_buffer():
+    writer = MockWriter()
+    buffer = WriteBehindBuffer(
+        WriteBehindSettings(max_bytes=100, flush_bytes=50, flush_interval=60.0),
+        writer.write_batch,
+    )
+    errors = []
+    buffer.on_error = lambda key, e: errors.append((key, str(e)))
+
+    assert await buffer.put(PendingWrite("a", b"x" * 10))
+    assert await buffer.put(PendingWrite("a", b"y" * 20))
+    assert buffer.get("a") == b"y" * 20
+    assert await buffer.read("a") == b"y" * 20
+    assert buffer.size("a") == 20 and buffer.size("b") is None
+    assert buffer.pending == 1 and buffer.pending_bytes == 20
+    assert not await buffer.put(PendingWrite("big", b"x" * 101))
+
+    await buffer.put(PendingWrite("b", b"x" * 10))
+    buffer.discard("b")
+    assert buffer.get("b") is None
+    assert buffer.pending_bytes == 20
+
+    writer.fail.add("c")
+    await buffer.put(PendingWrite("c", b"x" * 10))
+    assert await buffer.flush() == 1
+    assert writer.batches == [["a", "c"]]
+    assert errors == [("c", "failed")]
+    assert buffer.get("a") is None
+    assert buffer.get("c") == b"x" * 10
+
+    writer.fail.clear()
+    assert await buffer.close() == 1
+    assert buffer.pending == 0
+
+
+@pytest.mark.asyncio
+async def test_write_behind_flush_interval():
+    writer = MockWriter()
+    buffer = WriteBehindBuffer(
+        WriteBehindSettings(max_bytes=100, flush_bytes=30, flush_interval=0.05),
+        writer.write_batch,
+    )
+    await buffer.put(PendingWrite("a", b"x" * 10))
+    assert buffer.pending == 1
+    await asyncio.sleep(0.2)
+    assert writer.batches == [["a"]]
+    assert buffer.pending == 0
+    assert await buffer.close() == 0
+
+
+@pytest.mark.asyncio
+async def test_write_behind_flush_bytes_and_backpressure():
+    writer = MockWriter()
+    buffer = WriteBehindBuffer(
+        WriteBehindSettings(max_bytes=100, flush_bytes=30, flush_interval=60.0),
+        writer.write_batch,
+    )
+    backpressure: List[int] = []
+    buffer.on_backpressure = backpressure.append
+
+    await buffer.put(PendingWrite("b", b"x" * 10))
+    await asyncio.sleep(0.05)
+    assert buffer.pending == 1
+    await buffer.put(PendingWrite("c", b"x" * 20))
+    await asyncio.sleep(0.05)
+    assert writer.batches == [["b", "c"]]
+    assert buffer.pending == 0
+
+    # Writers wait while buffer is full
+    writer.release.clear()
+    for key in ("d", "e", "f", "g"):
+        await buffer.put(PendingWrite(key, b"x" * 25))
+    blocked = asyncio.create_task(buffer.put(PendingWrite("h", b"x" * 25)))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+    assert backpressure == [100]
+    writer.release.set()
+    assert await asyncio.wait_for(blocked, timeout=1.0)
+    assert buffer.get("h") == b"x" * 25
+    assert await buffer.close() == 1
+
+
+@pytest.mark.asyncio
+async def test_write_behind_wait_in_flight():
+    writer = MockWriter()
+    buffer = WriteBehindBuffer(
+        WriteBehindSettings(max_bytes=100, flush_bytes=50, flush_interval=60.0),
+        writer.write_batch,
+    )
+    await buffer.put(PendingWrite("a", b"x" * 10))
+    await buffer.wait_in_flight("a")
+
+    writer.release.clear()
+    flush = asyncio.create_task(buffer.flush())
+    await asyncio.sleep(0.05)
+    buffer.discard("a")
+    waiting = asyncio.create_task(buffer.wait_in_flight("a"))
+    await asyncio.sleep(0.05)
+    assert not waiting.done()
+    writer.release.set()
+    await asyncio.wait_for(waiting, timeout=1.0)
+    assert writer.batches == [["a"]]
+    assert await flush == 1
+    assert await buffer.close() == 0
+
+
+@pytest.mark.asyncio
+async def test_write_behind_store(moto_server):
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix="write-behind",
+        partition_dateformat="%Y/%m/%d/",
+        index=IndexSettings(),
+        write_behind=WriteBehindSettings(flush_interval=60.0),
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    errors: list = []
+    object_storage.set_write_behind_callbacks(on_error=lambda key, e: errors.append(key))
+
+    location = await object_storage.store(key="item1", value=WriteBehindData(value="1"))
+    file_location = await object_storage.store_file(file_name="file1.txt", value=b"data")
+    await object_storage.store(key="item2", value=WriteBehindData(value="2"))
+    await object_storage.delete("item2")
+    assert object_storage.pending_writes == 2
+
+    # Pending writes are visible on the same instance
+    partition_key = object_storage.partition_key(location)
+    assert await object_storage.get("item1", datatype=WriteBehindData) == WriteBehindData(value="1")
+    assert (
+        await object_storage.get_file(
+            "file1.txt", partition_key=object_storage.partition_key(file_location)
+        )
+        == b"data"
+    )
+    assert [
+        chunk
+        async for chunk in object_storage.get_file_chunked(
+            "file1.txt", partition_key=object_storage.partition_key(file_location)
+        )
+    ] == [(b"data", 4)]
+    assert await object_storage.get("item2", datatype=WriteBehindData) is None
+
+    other_storage = await ObjectStorage.with_settings(settings).connect()
+    assert await other_storage.get("item1", datatype=WriteBehindData) is None
+
+    assert await object_storage.close() == 2
+    assert object_storage.pending_writes == 0
+    assert errors == []
+
+    other_storage = await ObjectStorage.with_settings(settings).connect()
+    assert await other_storage.get("item1", datatype=WriteBehindData) == WriteBehindData(value="1")
+    assert await other_storage.list_objects(recursive=True) == [await other_storage.locate("item1")]
+
+    await object_storage.delete("item1", partition_key=partition_key)
+    await object_storage.delete_files(
+        "file1.txt", partition_key=object_storage.partition_key(file_location)
+    )
+    assert await object_storage.close() == 0
+
+
+@pytest.mark.asyncio
+async def test_write_behind_delete_during_flush(moto_server):
+    settings = ObjectStorageSettings(
+        bucket="test",
+        prefix="write-behind-delete",
+        write_behind=WriteBehindSettings(flush_interval=60.0),
+        connection_config=ConnectionConfig(
+            aws_access_key_id="hopeit",
+            aws_secret_access_key="Hopeit#Engine#2020",
+            endpoint_url="http://localhost:9002",
+            region_name="eu-central-1",
+        ),
+    )
+    object_storage = await ObjectStorage.with_settings(settings).connect()
+    await object_storage.create_bucket(exist_ok=True)
+    buffer = object_storage._write_behind
+    assert isinstance(buffer, WriteBehindBuffer)
+    write_batch = buffer._write_batch
+    started = asyncio.Event()
+
+    async def slow_write_batch(writes: Sequence[PendingWrite]) -> List[Optional[BaseException]]:
+        started.set()
+        await asyncio.sleep(0.2)
+        return await write_batch(writes)
+
+    buffer._write_batch = slow_write_batch  # type: ignore[method-assign]
+
+    await object_storage.store(key="item1", value=WriteBehindData(value="1"))
+    await object_storage.store_file(file_name="file1.txt", value=b"data")
+    flush = asyncio.create_task(object_storage.flush())
+    await started.wait()
+    await object_storage.delete("item1")
+    await object_storage.delete_files("file1.txt")
+    assert await flush == 2
+
+    other_storage = await ObjectStorage.with_settings(settings).connect()
+    assert await other_storage.get("item1", datatype=WriteBehindData) is None
+    assert await other_storage.get_file("file1.txt") is None
+    assert await object_storage.close() == 0